@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark edge matching in SystemState on a synthetic large flow.
+
+The synthetic flow is a chain of tasks (Task0 -> Task1 -> ... -> TaskN), so waiting edges accumulate as the flow
+proceeds while there is only one active node at a time. As SystemState inspects only edges affected by finished
+nodes, time per dispatcher wakeup should stay roughly constant regardless of number of edges in the flow.
+
+Run using `make benchmark`.
+"""
+
+import time
+
+from celery.result import AsyncResult
+from selinon_test_case import SelinonTestCase
+from selinon.system_state import SystemState
+
+
+def _cond_true(db, node_args):  # pylint: disable=unused-argument
+    return True
+
+
+def _construct_edge_table(edges_count):
+    """Construct edge table for the synthetic flow with edges_count edges."""
+    edges = [{'from': [], 'to': ['Task0'], 'condition': _cond_true}]
+    for i in range(edges_count):
+        edges.append({'from': ['Task%d' % i], 'to': ['Task%d' % (i + 1)], 'condition': _cond_true})
+
+    return {'flow1': edges}
+
+
+def run_benchmark(edges_count):
+    """Drive the synthetic flow until all edges fire, return average time spent in one dispatcher wakeup."""
+    test_case = SelinonTestCase()
+    test_case.setup_method(None)
+    test_case.init(_construct_edge_table(edges_count))
+
+    system_state = SystemState(id(test_case), 'flow1')
+    system_state.update()
+    state_dict = system_state.to_dict()
+
+    elapsed = 0.0
+    for i in range(edges_count):
+        AsyncResult.set_finished(test_case.get_task('Task%d' % i).task_id)
+
+        start = time.perf_counter()
+        system_state = SystemState(id(test_case), 'flow1', state=state_dict)
+        system_state.update()
+        elapsed += time.perf_counter() - start
+
+        state_dict = system_state.to_dict()
+
+    test_case.teardown_method(None)
+    return elapsed / edges_count
+
+
+def main():
+    """Run benchmark for different sizes of the synthetic flow."""
+    print("Edge matching in SystemState on a chain of tasks")
+    for edges_count in (10, 100, 300, 1000):
+        print("%6d edges: %8.3f ms per wakeup" % (edges_count, run_benchmark(edges_count) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark copying of message arguments done by executor before a task is run.
+
+Arguments resemble a dispatcher message of a flow with large flow arguments and a lot of finished nodes. Arguments
+are copied using deep copy (as done before) and using lazy copy, the task accesses and modifies a small part of
+arguments afterwards.
+
+Run using `make benchmark`.
+"""
+
+import copy
+import time
+
+from selinon.executor.lazy_copy import lazy_copy
+
+_ITERATIONS = 100
+
+
+def _create_kwargs(size):
+    """Create arguments of a dispatcher message, size states number of items in flow arguments and flow state."""
+    return {
+        'flow_name': 'flow1',
+        'node_args': {'item%d' % idx: {'name': 'item%d' % idx, 'tags': ['a', 'b'], 'count': idx}
+                      for idx in range(size)},
+        'parent': None,
+        'retried_count': 0,
+        'retry': 2,
+        'state': {
+            'active_nodes': [{'name': 'Task1', 'id': 'id-active'}],
+            'finished_nodes': {'Task%d' % idx: ['id-%d' % idx] for idx in range(size)},
+            'failed_nodes': {},
+            'waiting_edges': [0, 1, 2]
+        },
+        'selective': False,
+        'migration_version': 0
+    }
+
+
+def _run_task(kwargs):
+    """Simulate a task that accesses and modifies a few of its arguments."""
+    kwargs['node_args']['item0']['tags'].append('c')
+    kwargs['state']['waiting_edges'].append(3)
+    return kwargs['node_args'].get('item1')
+
+
+def run_benchmark(size, lazy):
+    """Copy arguments and run task on them, return average time spent per message."""
+    kwargs = _create_kwargs(size)
+
+    start = time.perf_counter()
+    for _ in range(_ITERATIONS):
+        if lazy:
+            task_kwargs = {key: lazy_copy(value) for key, value in kwargs.items()}
+        else:
+            task_kwargs = copy.deepcopy(kwargs)
+        _run_task(task_kwargs)
+    elapsed = time.perf_counter() - start
+
+    assert kwargs == _create_kwargs(size)  # nosec
+    return elapsed / _ITERATIONS
+
+
+def main():
+    """Run benchmark for different sizes of arguments."""
+    print("Copy of message arguments before task run")
+    for size in (10, 1000, 10000):
+        print("%6d items, deep copy: %8.3f ms, lazy copy: %8.3f ms"
+              % (size, run_benchmark(size, lazy=False) * 1000, run_benchmark(size, lazy=True) * 1000))
+
+
+if __name__ == '__main__':
+    main()
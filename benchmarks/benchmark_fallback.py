@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark fallback resolution in SystemState when many nodes fail at once.
+
+The synthetic flow starts N tasks in parallel and all of them fail. Fallbacks are defined only for a few pairs of
+tasks, so only combinations of failed nodes present in the failure graph need to be inspected. Time spent in
+dispatcher should grow with number of failed nodes and size of the failure graph, not with 2^N.
+
+Run using `make benchmark`.
+"""
+
+import time
+
+from selinon_test_case import SelinonTestCase
+from selinon.system_state import SystemState
+
+
+def _cond_true(db, node_args):  # pylint: disable=unused-argument
+    return True
+
+
+def _construct_failures(node_names):
+    """Construct failure graph with a fallback for each pair of consecutive tasks (Task0+Task1, Task2+Task3, ...)."""
+    failures = {}
+
+    for first, second in zip(node_names[::2], node_names[1::2]):
+        pair = {'next': {}, 'fallback': [True], 'conditions': [_cond_true], 'condition_strs': ['cond_true']}
+        failures[first] = {'next': {second: pair}, 'fallback': [], 'conditions': [], 'condition_strs': []}
+        failures[second] = {'next': {first: pair}, 'fallback': [], 'conditions': [], 'condition_strs': []}
+
+    return {'flow1': failures}
+
+
+def run_benchmark(failed_count):
+    """Fail failed_count tasks in the synthetic flow, return time spent in dispatcher resolving fallbacks."""
+    node_names = ['Task%d' % i for i in range(failed_count)]
+
+    test_case = SelinonTestCase()
+    test_case.setup_method(None)
+    test_case.init({'flow1': [{'from': [], 'to': node_names, 'condition': _cond_true}]},
+                   failures=_construct_failures(node_names))
+
+    system_state = SystemState(id(test_case), 'flow1')
+    system_state.update()
+    state_dict = system_state.to_dict()
+
+    for node_name in node_names:
+        test_case.set_failed(test_case.get_task(node_name), ValueError("Some exception raised"))
+
+    start = time.perf_counter()
+    system_state = SystemState(id(test_case), 'flow1', state=state_dict)
+    system_state.update()
+    elapsed = time.perf_counter() - start
+
+    test_case.teardown_method(None)
+    return elapsed
+
+
+def main():
+    """Run benchmark for different number of failed nodes."""
+    print("Fallback resolution in SystemState with many simultaneous failures")
+    for failed_count in (10, 20, 30, 100):
+        print("%6d failed nodes: %8.3f ms" % (failed_count, run_benchmark(failed_count) * 1000))
+
+
+if __name__ == '__main__':
+    main()
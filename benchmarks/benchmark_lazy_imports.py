@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark worker startup time and resident memory with eager and lazy imports in generated configuration.
+
+A synthetic application with N tasks, each in its own module, is generated to a temporary directory. Each module
+builds a lookup table on import to simulate real-world task modules and their dependencies. Configuration is
+generated once with eager imports and once with lazy imports, and loaded in a fresh interpreter - lazy mode is
+measured also with a few tasks resolved, as done by a worker that serves only a few queues.
+
+Run using `make benchmark`.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from selinon.global_config import GlobalConfig
+from selinon.system import System
+
+_TASK_MODULE = '''
+from selinon import SelinonTask
+
+TABLE = {'key%%d' %% i: str(i) * 16 for i in range(2000)}
+
+
+class Task%d(SelinonTask):
+    def run(self, node_args):
+        return TABLE.get(node_args)
+'''
+
+_LOAD_CONFIG = '''
+import resource
+import runpy
+import sys
+import time
+
+start = time.perf_counter()
+from selinon import Config
+Config._set_config(runpy.run_path(sys.argv[1]))
+for task_name in sys.argv[2:]:
+    Config.task_classes[task_name]
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def _generate_app(app_dir, task_count):
+    """Generate application with task_count tasks, return paths to nodes and flow definition files."""
+    package_dir = os.path.join(app_dir, 'benchapp')
+    os.mkdir(package_dir)
+    open(os.path.join(package_dir, '__init__.py'), 'w').close()
+
+    for idx in range(task_count):
+        with open(os.path.join(package_dir, 'task%d.py' % idx), 'w') as task_file:
+            task_file.write(_TASK_MODULE % idx)
+
+    nodes_file = os.path.join(app_dir, 'nodes.yaml')
+    with open(nodes_file, 'w') as nodes:
+        nodes.write('tasks:\n')
+        for idx in range(task_count):
+            nodes.write('  - name: Task%d\n    import: benchapp.task%d\n    queue: queue%d\n' % (idx, idx, idx))
+        nodes.write('flows:\n  - flow1\n')
+
+    flow_file = os.path.join(app_dir, 'flow1.yaml')
+    with open(flow_file, 'w') as flow:
+        flow.write('flow-definitions:\n  - name: flow1\n    edges:\n      - from:\n        to:\n')
+        for idx in range(task_count):
+            flow.write('          - Task%d\n' % idx)
+
+    return nodes_file, flow_file
+
+
+def _load_config(app_dir, config_file, resolved_tasks):
+    """Load generated configuration in a fresh interpreter, return startup time and maximum RSS in kB."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([app_dir] + sys.path))
+    output = subprocess.check_output([sys.executable, '-c', _LOAD_CONFIG, config_file] + resolved_tasks, env=env)
+    elapsed, max_rss = output.split()
+    return float(elapsed), int(max_rss)
+
+
+def run_benchmark(task_count, resolved_count=10):
+    """Generate configuration for task_count tasks in both modes and compare loading them."""
+    app_dir = tempfile.mkdtemp(prefix='selinon_benchmark_')
+    try:
+        nodes_file, flow_file = _generate_app(app_dir, task_count)
+        system = System.from_files(nodes_file, [flow_file])
+
+        results = []
+        for lazy_imports in (False, True):
+            config_file = os.path.join(app_dir, 'config_%s.py' % ('lazy' if lazy_imports else 'eager'))
+            GlobalConfig.lazy_imports = lazy_imports
+            system.dump2file(config_file)
+
+            results.append(('eager' if not lazy_imports else 'lazy', _load_config(app_dir, config_file, [])))
+            if lazy_imports:
+                resolved_tasks = ['Task%d' % idx for idx in range(resolved_count)]
+                results.append(('lazy, %d resolved' % resolved_count,
+                                 _load_config(app_dir, config_file, resolved_tasks)))
+
+        return results
+    finally:
+        GlobalConfig.lazy_imports = False
+        shutil.rmtree(app_dir)
+
+
+def main():
+    """Run benchmark for different number of tasks."""
+    print("Worker startup time and maximum RSS with eager and lazy imports in generated configuration")
+    for task_count in (10, 100, 500):
+        for mode, (elapsed, max_rss) in run_benchmark(task_count):
+            print("%6d tasks, %-18s %8.3f ms %8.1f MB" % (task_count, mode + ':', elapsed * 1000, max_rss / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark migration of dispatcher messages that are many migration versions behind.
+
+A synthetic migration directory with N migration files is generated, each migration reorders edges of one of 20
+flows. A message of a flow is migrated from migration version 0 - once with parsed migrations dropped before each
+migration (as done before migrations were cached) and once with parsed and composed migrations reused.
+
+Run using `make benchmark`.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from selinon.migrations import MigrationChain
+from selinon.migrations import Migrator
+
+_FLOW_COUNT = 20
+_ITERATIONS = 100
+
+
+def _generate_migrations(migration_dir, migration_count):
+    """Generate migration files that swap the first two edges of a flow."""
+    for version in range(1, migration_count + 1):
+        migration = {
+            'migration': {
+                'flow%d' % (version % _FLOW_COUNT): {
+                    'translation': {'0': 1, '1': 0},
+                    'tainted_edges': {},
+                    'tainting_nodes': {}
+                }
+            },
+            'tainted_flow_strategy': 'IGNORE'
+        }
+
+        with open(os.path.join(migration_dir, '%d.json' % version), 'w') as migration_file:
+            json.dump(migration, migration_file)
+
+
+def run_benchmark(migration_count, cached):
+    """Migrate a message migration_count versions behind, return average time spent per migration."""
+    migration_dir = tempfile.mkdtemp(prefix='selinon_benchmark_')
+    try:
+        _generate_migrations(migration_dir, migration_count)
+        state = {'active_nodes': [{'name': 'Task1', 'id': 'id1'}], 'finished_nodes': {}, 'waiting_edges': [0, 1]}
+
+        # the first migration always parses migration files
+        Migrator(migration_dir).perform_migration('flow1', dict(state), 0)
+
+        start = time.perf_counter()
+        for _ in range(_ITERATIONS):
+            if not cached:
+                MigrationChain.clear_cache()
+            Migrator(migration_dir).perform_migration('flow1', dict(state), 0)
+        elapsed = time.perf_counter() - start
+    finally:
+        MigrationChain.clear_cache()
+        shutil.rmtree(migration_dir)
+
+    return elapsed / _ITERATIONS
+
+
+def main():
+    """Run benchmark for different number of migration files."""
+    print("Migration of dispatcher message from migration version 0 to the latest one")
+    for migration_count in (10, 50, 200):
+        print("%6d migrations, not cached: %8.3f ms, cached: %8.3f ms"
+              % (migration_count, run_benchmark(migration_count, cached=False) * 1000,
+                 run_benchmark(migration_count, cached=True) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark executor's pool of queues with a lot of queues, as used with per-task queue configuration.
+
+Messages are pushed to Q queues with random countdowns (some of them scheduled for the same time) and popped until
+the pool is empty, new messages are pushed while popping to keep the number of queues steady.
+
+Run using `make benchmark`.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+import random
+import time
+
+from selinon.executor.queue_pool import QueuePool
+
+_MESSAGE_COUNT = 20000
+
+
+def run_benchmark(queue_count):
+    """Push and pop messages using queue_count queues, return average time spent per pop."""
+    rand = random.Random(42)
+    now = datetime.now()
+    queue_pool = QueuePool()
+
+    for idx in range(queue_count):
+        queue_pool.push('queue%d' % idx, now + timedelta(seconds=rand.randint(0, 100)), idx)
+
+    start = time.perf_counter()
+    for idx in range(_MESSAGE_COUNT):
+        message_time, _ = queue_pool.pop()
+        queue_pool.push('queue%d' % rand.randrange(queue_count),
+                        message_time + timedelta(seconds=rand.randint(0, 100)),
+                        idx)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / _MESSAGE_COUNT
+
+
+def main():
+    """Run benchmark for different number of queues."""
+    print("Pop of the next message from executor's queue pool")
+    for queue_count in (10, 100, 1000, 5000):
+        print("%6d queues: %8.3f us" % (queue_count, run_benchmark(queue_count) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
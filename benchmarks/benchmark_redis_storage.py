@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark encoding options of Redis storage adapter.
+
+Redis connection is replaced with an in-memory fake so the benchmark measures time spent in the adapter (serialization
+and compression) together with number of bytes that would be transferred to and from Redis. Task results are generated
+so they look like results of real-world tasks - nested documents with strings, numbers and repeated keys.
+
+Requires redis, optionally msgpack and lz4 packages. Run using `make benchmark`.
+"""
+
+import random
+import time
+
+from redis_mock import RedisMock
+from selinon.storages.redis import Redis
+
+_CONFIGURATIONS = (
+    ('json', {}),
+    ('json+zlib', {'compression': 'zlib'}),
+    ('json+lz4', {'compression': 'lz4'}),
+    ('msgpack', {'serializer': 'msgpack'}),
+    ('msgpack+zlib', {'serializer': 'msgpack', 'compression': 'zlib'}),
+    ('msgpack+zlib+hash', {'serializer': 'msgpack', 'compression': 'zlib', 'hash_fields': True}),
+)
+
+# Flow arguments are part of metadata stored with each result
+_NODE_ARGS = {'ecosystem': 'pypi', 'name': 'selinon', 'version': '1.0.0',
+              'digest': '%01024x' % random.Random(0).getrandbits(4096)}
+
+
+def _generate_result(item_count):
+    """Generate a task result with item_count entries."""
+    rand = random.Random(item_count)
+    return {
+        'status': 'success',
+        'summary': {'count': item_count, 'score': rand.random()},
+        'details': [{
+            'name': 'package-%d' % rand.randint(0, 10000),
+            'version': '%d.%d.%d' % (rand.randint(0, 10), rand.randint(0, 10), rand.randint(0, 100)),
+            'licenses': rand.sample(['MIT', 'BSD', 'GPLv3', 'Apache-2.0', 'LGPL'], 2),
+            'downloads': rand.randint(0, 1000000),
+            'description': ' '.join(rand.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet']) for _ in range(20))
+        } for _ in range(item_count)]
+    }
+
+
+def run_benchmark(configuration, result, rounds):
+    """Store and retrieve result rounds times, return time spent and bytes transferred."""
+    try:
+        storage = Redis(**configuration)
+    except ImportError:
+        return None
+
+    storage.conn = RedisMock()
+
+    start = time.perf_counter()
+    for idx in range(rounds):
+        storage.store(_NODE_ARGS, 'flow1', 'Task1', '<id%d>' % idx, result)
+    store_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for idx in range(rounds):
+        storage.retrieve('flow1', 'Task1', '<id%d>' % idx)
+    retrieve_elapsed = time.perf_counter() - start
+
+    return store_elapsed / rounds, retrieve_elapsed / rounds, \
+        storage.conn.bytes_sent // rounds, storage.conn.bytes_received // rounds
+
+
+def main():
+    """Run benchmark for different payload sizes."""
+    print("Redis storage adapter encoding options (per record)")
+    for item_count, rounds in ((1, 2000), (100, 200), (10000, 5)):
+        result = _generate_result(item_count)
+        print("\nResult with %d items:" % item_count)
+        print("  %-20s %12s %12s %12s %12s" % ('configuration', 'store', 'retrieve', 'bytes sent', 'bytes recv'))
+        for name, configuration in _CONFIGURATIONS:
+            stats = run_benchmark(configuration, result, rounds)
+            if stats is None:
+                print("  %-20s not available" % name)
+                continue
+            print("  %-20s %9.3f ms %9.3f ms %12d %12d" % (name, stats[0] * 1000, stats[1] * 1000, stats[2], stats[3]))
+
+
+if __name__ == '__main__':
+    main()
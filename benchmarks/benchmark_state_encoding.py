@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark size of dispatcher retry messages and time needed to parse them with compact state encoding.
+
+The synthetic state corresponds to a flow that spawned N tasks using foreach - half of them finished, half of them
+are still active.
+
+Run using `make benchmark`.
+"""
+
+import json
+import time
+import uuid
+
+from selinon import CompactStateEncoder
+
+
+def _construct_state(node_count):
+    """Construct state of a foreach flow with node_count nodes."""
+    return {
+        'active_nodes': [{'name': 'AnalyzeTask', 'id': str(uuid.uuid4())} for _ in range(node_count // 2)],
+        'finished_nodes': {
+            'InitTask': [str(uuid.uuid4())],
+            'AnalyzeTask': [str(uuid.uuid4()) for _ in range(node_count // 2)]
+        },
+        'failed_nodes': {},
+        'waiting_edges': [1, 2]
+    }
+
+
+def run_benchmark(state, encoder, rounds=10):
+    """Serialize and parse state as done in dispatcher retry, return message size and time spent on parsing."""
+    message = json.dumps(encoder.encode(state) if encoder else state)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        CompactStateEncoder.decode(json.loads(message))
+    elapsed = (time.perf_counter() - start) / rounds
+
+    return len(message), elapsed
+
+
+def main():
+    """Run benchmark for different flow sizes."""
+    print("Dispatcher state encoding - message size and parse time")
+    for node_count in (100, 10000, 100000):
+        state = _construct_state(node_count)
+        print("\n%d nodes:" % node_count)
+        for name, encoder in (('plain', None),
+                              ('compact', CompactStateEncoder()),
+                              ('compact+zlib', CompactStateEncoder(compression_threshold=0))):
+            size, elapsed = run_benchmark(state, encoder)
+            print("  %-14s %10d bytes %9.3f ms" % (name, size, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Benchmark dispatcher throughput with different tracing configurations.
+
+The synthetic flow is a chain of tasks (Task0 -> Task1 -> ... -> TaskN) as in benchmark_edge_index.py. Traced events
+are written to a logger without handlers or to /dev/null, so the benchmark measures time spent in constructing and
+serializing trace messages, not time spent in I/O.
+
+Run using `make benchmark`.
+"""
+
+import contextlib
+import logging
+import os
+import time
+
+from celery.result import AsyncResult
+from selinon_test_case import SelinonTestCase
+from selinon.system_state import SystemState
+from selinon.trace import Trace
+
+_EDGES_COUNT = 300
+_ROUNDS = 5
+
+
+def _cond_true(db, node_args):  # pylint: disable=unused-argument
+    return True
+
+
+def _construct_edge_table(edges_count):
+    """Construct edge table for the synthetic flow with edges_count edges."""
+    edges = [{'from': [], 'to': ['Task0'], 'condition': _cond_true}]
+    for i in range(edges_count):
+        edges.append({'from': ['Task%d' % i], 'to': ['Task%d' % (i + 1)], 'condition': _cond_true})
+
+    return {'flow1': edges}
+
+
+def _get_logger():
+    """Get a logger that drops all messages, but still lets them be formatted."""
+    logger = logging.getLogger('selinon.benchmark')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def _setup_off():
+    """No tracing."""
+    pass
+
+
+def _setup_failures():
+    """Logging subscribed only to warning events."""
+    Trace.trace_by_logging(_get_logger(), events=Trace.WARN_EVENTS)
+
+
+def _setup_logging():
+    """Logging of all events."""
+    Trace.trace_by_logging(_get_logger())
+
+
+def _setup_json():
+    """JSON tracing of all events."""
+    Trace.trace_by_json()
+
+
+def _setup_json_buffered():
+    """JSON tracing of all events in a background thread."""
+    Trace.trace_by_json(buffered={'output': os.devnull, 'batch_size': 500})
+
+
+def _setup_spans():
+    """Span-based tracing."""
+    Trace.trace_by_spans(output=os.devnull)
+
+
+_CONFIGURATIONS = (
+    ('off', _setup_off),
+    ('logging, warnings', _setup_failures),
+    ('logging', _setup_logging),
+    ('json', _setup_json),
+    ('json, buffered', _setup_json_buffered),
+    ('spans', _setup_spans),
+)
+
+
+def run_benchmark(setup_tracing, edges_count):
+    """Drive the synthetic flow until all edges fire, return number of dispatcher wakeups per second."""
+    test_case = SelinonTestCase()
+    test_case.setup_method(None)
+    test_case.init(_construct_edge_table(edges_count))
+    Trace._logger = None
+    setup_tracing()
+
+    elapsed = 0.0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        system_state = SystemState(id(test_case), 'flow1')
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        for i in range(edges_count):
+            AsyncResult.set_finished(test_case.get_task('Task%d' % i).task_id)
+
+            start = time.perf_counter()
+            system_state = SystemState(id(test_case), 'flow1', state=state_dict)
+            system_state.update()
+            elapsed += time.perf_counter() - start
+
+            state_dict = system_state.to_dict()
+
+    test_case.teardown_method(None)
+    for trace_func, _ in Trace._trace_functions:
+        if hasattr(trace_func, 'close'):
+            trace_func.close()
+    Trace._trace_functions = []
+    Trace._span_exporter = None
+    return edges_count / elapsed
+
+
+def main():
+    """Run benchmark for all tracing configurations."""
+    print("Dispatcher throughput with tracing on a chain of %d tasks (best of %d rounds)" % (_EDGES_COUNT, _ROUNDS))
+    # warm up
+    run_benchmark(_setup_off, _EDGES_COUNT)
+    for name, setup_tracing in _CONFIGURATIONS:
+        throughput = max(run_benchmark(setup_tracing, _EDGES_COUNT) for _ in range(_ROUNDS))
+        print("  %-20s %10.0f wakeups/s" % (name, throughput))
+
+
+if __name__ == '__main__':
+    main()
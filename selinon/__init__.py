@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 """Supportive and handling library for Selinon."""
 
+from .buffered_trace import BufferedTracer
 from .cache import Cache
 from .codename import selinon_version_codename
 from .config import Config
 from .data_storage import DataStorage
 from .dispatcher import Dispatcher
+from .dispatcher_notifier import DispatcherNotifier
 from .errors import CacheMissError
 from .errors import ConfigNotInitializedError
 from .errors import ConfigurationError
@@ -19,12 +21,19 @@ from .errors import StorageError
 from .errors import UnknownError
 from .errors import UnknownFlowError
 from .errors import UnknownStorageError
+from .finished_nodes_store import FinishedNodesStore
+from .metrics import MetricsTracer
+from .node_args_store import NodeArgsStore
+from .result_backend_batcher import ResultBackendBatcher
 from .selinon_task import SelinonTask
+from .span import SpanExporter
+from .state_encoding import CompactStateEncoder
 from .storage import Storage
 from .storage_pool import StoragePool
 from .system_state import SystemState
 from .task import Task
 from .trace import Trace
+from .trace_sampler import TraceSampler
 from .utils import run_flow
 from .utils import run_flow_selective
 from .version import selinon_version
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Trace events asynchronously in a background thread.
+
+Built-in JSON and logging trace functions serialize and write each event on the thread that emitted it - the
+dispatcher or the task. BufferedTracer only enqueues events, a background thread serializes them in batches and
+writes them to a stream, a file or to a custom sink:
+
+.. code-block:: python
+
+  from selinon import BufferedTracer
+  from selinon import Trace
+
+  Trace.trace_by_func(BufferedTracer(output='/var/log/selinon/trace.json', batch_size=100, max_queue_size=10000))
+
+The queue of events is bounded, once it is full, events are dropped based on the drop policy. Events are flushed on
+worker shutdown. Note that event details are serialized later in the background thread, trace details passed to
+Trace.log() should not be modified once logged.
+"""
+
+import atexit
+import collections
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+
+from .celery import worker_process_shutdown
+from .celery import worker_shutdown
+from .errors import ConfigurationError
+from .trace import Trace
+
+_logger = logging.getLogger(__name__)
+
+
+class BufferedTracer(object):
+    """A trace function that writes events in batches in a background thread."""
+
+    # Drop events that are being traced if the queue is full
+    DROP_NEWEST = 'drop_newest'
+    # Drop the oldest queued events to make space for events that are being traced
+    DROP_OLDEST = 'drop_oldest'
+    # Block the traced thread until there is space in the queue
+    BLOCK = 'block'
+
+    _DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST, BLOCK)
+
+    def __init__(self, output=None, sink=None, batch_size=100, flush_interval=1.0, max_queue_size=10000,
+                 drop_policy=DROP_NEWEST):
+        # pylint: disable=too-many-arguments
+        """Instantiate buffered tracer.
+
+        :param output: a path to file to append JSON events to, a file-like object or None for stdout
+        :param sink: a callable accepting a list of event reports (dicts), used instead of output if provided
+        :param batch_size: maximum number of events written at once
+        :param flush_interval: maximum number of seconds events are kept in the queue
+        :param max_queue_size: maximum number of events kept in the queue
+        :param drop_policy: what to do with events once the queue is full, one of DROP_NEWEST, DROP_OLDEST, BLOCK
+        """
+        if drop_policy not in self._DROP_POLICIES:
+            raise ConfigurationError("Unknown drop policy %r for buffered tracer, available: %s"
+                                     % (drop_policy, self._DROP_POLICIES))
+
+        if batch_size < 1 or max_queue_size < 1:
+            raise ConfigurationError("Batch size and queue size for buffered tracer have to be positive integers")
+
+        self.output = output
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+        self._reported_dropped = 0
+        self._stream = None
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._enqueued = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self._hooks_registered = False
+
+    def _start(self):
+        """Start background thread, called lazily so the tracer works in forked worker processes."""
+        if self._pid != os.getpid():
+            # We were forked - events queued in the parent process are written by the parent process
+            self._queue.clear()
+            self._enqueued = 0
+            self._written = 0
+            self._stream = None
+            self._pid = os.getpid()
+            self._thread = None
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='selinon-buffered-tracer', daemon=True)
+            self._thread.start()
+
+        if not self._hooks_registered:
+            self._hooks_registered = True
+            atexit.register(self.close)
+            for signal in (worker_process_shutdown, worker_shutdown):
+                if signal is not None:
+                    signal.connect(self._on_worker_shutdown, weak=False)
+
+    def _on_worker_shutdown(self, *args, **kwargs):  # pylint: disable=unused-argument
+        """Flush events on Celery worker shutdown."""
+        self.close()
+
+    def __call__(self, event, msg_dict):
+        """Enqueue event, used as a trace function.
+
+        :param event: event that triggered trace point
+        :param msg_dict: a dict holding additional trace information for event
+        """
+        report = {
+            'event': Trace.event2str(event),
+            'time': str(datetime.datetime.utcnow()),
+            'details': msg_dict,
+            'node': platform.node()
+        }
+
+        with self._cond:
+            if self._closed:
+                return
+
+            if self._pid != os.getpid() or self._thread is None:
+                self._start()
+
+            if len(self._queue) >= self.max_queue_size:
+                if self.drop_policy == self.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif self.drop_policy == self.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._written += 1
+                    self.dropped += 1
+                else:
+                    self._cond.notify_all()
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue_size or self._closed)
+                    if self._closed:
+                        return
+
+            self._queue.append(report)
+            self._enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _get_stream(self):
+        """Get stream to write serialized events to.
+
+        :return: a file-like object
+        """
+        if self._stream is None:
+            if self.output is None:
+                self._stream = sys.stdout
+            elif isinstance(self.output, str):
+                self._stream = open(self.output, 'a')
+            else:
+                self._stream = self.output
+
+        return self._stream
+
+    def _write(self, batch):
+        """Serialize and write a batch of events, errors are only logged.
+
+        :param batch: a list of event reports
+        """
+        try:
+            if self.sink is not None:
+                self.sink(batch)
+            else:
+                stream = self._get_stream()
+                stream.write(''.join(json.dumps(report, sort_keys=True) + '\n' for report in batch))
+                stream.flush()
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("Failed to write %d trace events", len(batch))
+
+        if self.dropped != self._reported_dropped:
+            _logger.warning("Buffered tracer dropped %d trace events, the queue was full",
+                            self.dropped - self._reported_dropped)
+            self._reported_dropped = self.dropped
+
+    def _run(self):
+        """Background thread - write queued events in batches."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._flush_requested
+                                    or self._closed, timeout=self.flush_interval)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not self._queue:
+                    self._flush_requested = False
+                closed = self._closed
+                # Wake up traced threads waiting for space in the queue
+                self._cond.notify_all()
+
+            if batch:
+                self._write(batch)
+
+            with self._cond:
+                self._written += len(batch)
+                self._cond.notify_all()
+
+            if closed and not batch:
+                return
+
+    def flush(self, timeout=None):
+        """Wait until all events queued so far are written.
+
+        :param timeout: maximum number of seconds to wait, None to wait until events are written
+        :return: True if all events were written
+        """
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return not self._queue
+
+            target = self._enqueued
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written >= target, timeout=timeout)
+
+    def close(self, timeout=5.0):
+        """Flush queued events and stop the background thread, events traced afterwards are discarded.
+
+        :param timeout: maximum number of seconds to wait for queued events to be written
+        """
+        with self._cond:
+            if self._closed:
+                return
+
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+
+        if thread is not None:
+            thread.join(timeout)
+
+        if isinstance(self.output, str) and self._stream is not None:
+            self._stream.close()
+            self._stream = None
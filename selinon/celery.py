@@ -37,3 +37,11 @@ except ImportError:
         @staticmethod
         def retry(*args, **kwargs):
             raise _raise_import_exception()
+
+try:
+    from celery.signals import worker_process_shutdown
+    from celery.signals import worker_shutdown
+except ImportError:
+    # Shutdown hooks are optional, atexit handlers are used instead
+    worker_process_shutdown = None
+    worker_shutdown = None
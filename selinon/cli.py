@@ -20,6 +20,8 @@ from selinon import RequestError
 from selinon import selinon_version
 from selinon import selinon_version_codename
 from selinon.executor import Executor
+from selinon.executor.simulation import FixedDuration
+from selinon.executor.simulation import TraceDuration
 from selinon.helpers import git_previous_version
 from selinon.helpers import git_previous_version_file
 from selinon.migrations import Migrator
@@ -31,6 +33,7 @@ _logger = logging.getLogger(os.path.basename(__file__))
 
 _DEFAULT_NODE_ARGS = None
 _DEFAULT_CONCURRENCY = 1
+_DEFAULT_POOL = Executor.DEFAULT_POOL
 _DEFAULT_TAINTED_FLOW_STRATEGY = 'IGNORE'
 _DEFAULT_PLOT_OUTPUT_DIR = '.'
 _DEFAULT_PLOT_FORMAT = 'svg'
@@ -127,10 +130,13 @@ def cli(ctx=None, verbose=0, no_color=True):
               help="Specify arguments that should be passed to the flow by a file.")
 @click.option('-j', '--node-args-json', is_flag=True,
               help="Flow arguments are JSON, parse string representation into a dict.")
-@click.option('-c', '--concurrency', metavar='PROCESS_COUNT', type=click.IntRange(1, None),
+@click.option('-c', '--concurrency', metavar='WORKER_COUNT', type=click.IntRange(1, None),
               default=_DEFAULT_CONCURRENCY,
-              help="Worker count - number of processes that serve tasks in parallel "
+              help="Worker count - number of threads or processes that serve tasks in parallel "
                    "(default: %d)." % _DEFAULT_CONCURRENCY)
+@click.option('-P', '--pool', type=click.Choice((Executor.POOL_THREADS, Executor.POOL_PROCESSES)),
+              default=_DEFAULT_POOL,
+              help="Pool of workers used when concurrency is higher than one (default: %s)." % _DEFAULT_POOL)
 @click.option('-s', '--sleep-time', metavar='SLEEP_TIME', type=click.FLOAT, default=_DEFAULT_SLEEP_TIME,
               callback=_validate_sleep_time,
               help="Accuracy for worker sleeping when a task is scheduled to future "
@@ -141,6 +147,18 @@ def cli(ctx=None, verbose=0, no_color=True):
               help="Do not remove generated config.py file after run.")
 @click.option('--hide-progressbar', is_flag=True,
               help="Hide progressbar during execution.")
+@click.option('--notify-dispatcher', is_flag=True,
+              help="Wake up dispatcher as soon as a task in the flow finishes, use sampling strategy only as a "
+                   "fallback.")
+@click.option('--strict-arguments', is_flag=True,
+              help="Do not copy arguments of messages before running tasks, fail if arguments of a message were "
+                   "modified before the message was consumed instead.")
+@click.option('--simulate', is_flag=True,
+              help="Simulate flows in virtual time instead of waiting, print makespan and message counts after run.")
+@click.option('--simulate-duration', metavar='SECONDS', type=click.FLOAT,
+              help="Duration of each task run in simulation (default: 0).")
+@click.option('--simulate-trace', metavar='FILE', type=click.File('r'),
+              help="Replay durations of task runs in simulation from a trace of a real run (JSON trace points).")
 @click.option('--selective-task-names', metavar="TASK1,TASK2,..",
               help="A comma separated list of tasks to which path should be computed on selective flow run.")
 @click.option('--selective-follow-subflows', is_flag=True,
@@ -149,8 +167,10 @@ def cli(ctx=None, verbose=0, no_color=True):
               help="Run subsequent tasks (based on flow graph) affected by selective flow run.")
 def execute(nodes_definition, flow_definitions, flow_name,
             node_args=_DEFAULT_NODE_ARGS, node_args_file=None, node_args_json=False, concurrency=_DEFAULT_CONCURRENCY,
-            sleep_time=_DEFAULT_SLEEP_TIME, config_py=None, keep_config_py=False, hide_progressbar=False,
-            selective_task_names=None, selective_follow_subflows=False, selective_run_subsequent=False):
+            pool=_DEFAULT_POOL, sleep_time=_DEFAULT_SLEEP_TIME, config_py=None, keep_config_py=False,
+            hide_progressbar=False, notify_dispatcher=False, strict_arguments=False, simulate=False,
+            simulate_duration=None, simulate_trace=None, selective_task_names=None,
+            selective_follow_subflows=False, selective_run_subsequent=False):
     """Execute flows based on YAML configuration in a CLI."""
     if node_args and node_args_file:
         raise RequestError("Node arguments could be specified by command line argument or a file, but not from both")
@@ -166,10 +186,21 @@ def execute(nodes_definition, flow_definitions, flow_name,
         except Exception as e:
             raise RequestError("Unable to parse JSON arguments: %s" % str(e)) from e
 
+    duration_model = None
+    if simulate:
+        if simulate_trace:
+            duration_model = TraceDuration.from_trace(simulate_trace, default=simulate_duration or 0.0)
+        else:
+            duration_model = FixedDuration(default=simulate_duration or 0.0)
+    elif simulate_duration is not None or simulate_trace:
+        raise RequestError("Options --simulate-duration and --simulate-trace require --simulate set")
+
     executor = Executor(nodes_definition, flow_definitions,
                         concurrency=concurrency, sleep_time=sleep_time,
                         config_py=config_py, keep_config_py=keep_config_py,
-                        show_progressbar=not hide_progressbar)
+                        show_progressbar=not hide_progressbar,
+                        notify_dispatcher=notify_dispatcher, pool=pool, strict_arguments=strict_arguments,
+                        duration_model=duration_model)
 
     if selective_task_names:
         executor.run_flow_selective(
@@ -187,6 +218,9 @@ def execute(nodes_definition, flow_definitions, flow_name,
 
         executor.run(flow_name, node_args)
 
+    if executor.simulation_stats:
+        print(json.dumps(executor.simulation_stats.to_dict(), indent=2, sort_keys=True))
+
 
 @cli.command()
 @click.option('-n', '--nodes-definition', metavar='NODES.yml',
@@ -12,6 +12,8 @@ import os
 import runpy
 import tempfile
 
+from .caches import LRU
+from .config_cache import ConfigCache
 from .errors import ConfigNotInitializedError
 from .errors import ConfigurationError
 from .errors import UnknownStorageError
@@ -37,10 +39,22 @@ class Config(object):
     _logger = logging.getLogger(__name__)
 
     celery_app = None
+    result_backend_batcher = None
+    dispatcher_notifier = None
+    node_args_store = None
+    state_encoder = None
+    finished_nodes_store = None
+    output_schema_sample_rate = None
 
     flows = None
     task_classes = None
     edge_table = None
+    node2edge_idx = None
+    # selective runs precomputed in the generated config, read-only
+    selective_runs = None
+    # selective runs computed on demand, see selinon.selective.compute_selective_run()
+    selective_runs_cache = None
+    selective_runs_cache_size = 64
     nowait_nodes = None
     eager_failures = None
     max_retry = None
@@ -65,6 +79,22 @@ class Config(object):
     # Called from generated python code to mark that the configuration was correctly set up
     initialized = False
 
+    @staticmethod
+    def _compute_node2edge_idx(edge_table):
+        """Compute mapping from a node name to indexes of edges waiting for it, see System._dump_node2edge_idx().
+
+        :param edge_table: edge table as stated in the generated configuration
+        :return: node to edge indexes mapping for each flow
+        """
+        result = {}
+        for flow_name, edges in edge_table.items():
+            result[flow_name] = {}
+            for idx_edge, edge in enumerate(edges):
+                for node_name in edge['from']:
+                    result[flow_name].setdefault(node_name, []).append(idx_edge)
+
+        return result
+
     @classmethod
     def _set_config(cls, config_module):
         """Set configuration from Python's module.
@@ -73,10 +103,13 @@ class Config(object):
         """
         cls.task_classes = config_module['task_classes']
         cls.edge_table = config_module['edge_table']
+        # configuration generated by older Selinon versions does not carry precomputed values
+        cls.node2edge_idx = config_module.get('node2edge_idx') or cls._compute_node2edge_idx(cls.edge_table)
+        cls.selective_runs = config_module.get('selective_runs', {})
+        cls.selective_runs_cache = LRU(max_cache_size=cls.selective_runs_cache_size)
         cls.failures = config_module['failures']
         cls.nowait_nodes = config_module['nowait_nodes']
         cls.eager_failures = config_module['eager_failures']
-        cls.flows = list(cls.edge_table.keys())
 
         # misc
         cls.node_args_from_first = config_module['node_args_from_first']
@@ -105,6 +138,8 @@ class Config(object):
         # queues
         cls.dispatcher_queues = config_module['dispatcher_queues']
         cls.task_queues = config_module['task_queues']
+        # dispatcher queues are kept for all flows, edge table holds only flows served by a queue-restricted worker
+        cls.flows = list(cls.dispatcher_queues.keys())
 
         # Dispatcher scheduling strategy
         cls.strategies = config_module['strategies']
@@ -129,15 +164,28 @@ class Config(object):
         cls._set_config(config_module)
 
     @classmethod
-    def set_config_yaml(cls, nodes_definition_file, flow_definition_files, config_py=None, keep_config_py=False):
+    def set_config_yaml(cls, nodes_definition_file, flow_definition_files, config_py=None, keep_config_py=False,
+                        config_cache_dir=None, queues=None):
+        # pylint: disable=too-many-arguments
         """Set dispatcher configuration by path to YAML configuration files.
 
         :param nodes_definition_file: definition of system nodes - YAML configuration
         :param flow_definition_files: list of flow definition files
         :param config_py: a file that should be used for storing generated config.py
         :param keep_config_py: do not remove config_py file after run
+        :param config_cache_dir: a directory with cached generated configuration, if the configuration was already
+                                 generated for the given YAML files, parsing and code generation is skipped;
+                                 config_py and keep_config_py are not used in such case
+        :param queues: a list of queues the worker consumes, if provided only flows and tasks served on these queues
+                       (and nodes they need) are configured, see System.restrict_to_queues()
         """
+        if config_cache_dir:
+            cls._set_config_yaml_cached(nodes_definition_file, flow_definition_files, config_cache_dir, queues)
+            return
+
         system = System.from_files(nodes_definition_file, flow_definition_files)
+        if queues is not None:
+            system = system.restrict_to_queues(queues)
 
         if not config_py:
             tmp_f = tempfile.NamedTemporaryFile(mode="w", delete=False)
@@ -156,6 +204,32 @@ class Config(object):
             cls._logger.debug("Removing generated config.py file '%s'", config_py)
             os.unlink(config_py)
 
+    @classmethod
+    def _set_config_yaml_cached(cls, nodes_definition_file, flow_definition_files, config_cache_dir, queues=None):
+        """Set dispatcher configuration by YAML configuration files, use config cache to avoid code generation.
+
+        :param nodes_definition_file: definition of system nodes - YAML configuration
+        :param flow_definition_files: list of flow definition files
+        :param config_cache_dir: a directory with cached generated configuration
+        :param queues: a list of queues the worker consumes, None for all queues
+        """
+        config_cache = ConfigCache(config_cache_dir)
+        key = config_cache.compute_key(nodes_definition_file, flow_definition_files, queues)
+        code = config_cache.get(key)
+
+        if code is None:
+            cls._logger.debug("Configuration not found in config cache '%s', generating config.py", config_cache_dir)
+            system = System.from_files(nodes_definition_file, flow_definition_files)
+            if queues is not None:
+                system = system.restrict_to_queues(queues)
+            dump = io.StringIO()
+            system.dump2stream(dump)
+            code = config_cache.put(key, dump.getvalue())
+        else:
+            cls._logger.debug("Using configuration from config cache '%s'", code.co_filename)
+
+        cls._set_config(config_cache.run(code))
+
     @classmethod
     def set_config_dict(cls, nodes_definition, flow_definitions):
         """Set configuration using dictionaries, no files are written to filesystem.
@@ -174,12 +248,13 @@ class Config(object):
         cls._set_config(conf)
 
     @classmethod
-    def trace_by_func(cls, trace_func):
+    def trace_by_func(cls, trace_func, events=None):
         """Set tracing function for Dispatcher.
 
         :param trace_func: a function that should be used to trace dispatcher actions
+        :param events: names of events that should be traced, None for all events
         """
-        Trace.trace_by_func(trace_func)
+        Trace.trace_by_func(trace_func, events)
 
     @classmethod
     def trace_by_logging(cls):
@@ -195,9 +270,42 @@ class Config(object):
         Trace.trace_by_sentry(dsn)
 
     @classmethod
-    def trace_by_json(cls):
-        """Trace directly JSON output."""
-        Trace.trace_by_json()
+    def trace_by_metrics(cls, buckets=None):
+        """Aggregate trace events to in-process metrics.
+
+        :param buckets: upper bounds of histogram buckets in seconds, None for default buckets
+        """
+        from .metrics import MetricsTracer
+        Trace.trace_by_metrics(MetricsTracer(buckets=buckets))
+
+    @classmethod
+    def trace_by_spans(cls, output=None):
+        """Record nested timings of dispatcher wakeups and task execution.
+
+        :param output: a path to file to append spans to, None for stdout
+        """
+        Trace.trace_by_spans(output=output)
+
+    @classmethod
+    def set_trace_sampling(cls, sample_rate=1.0, rate_limits=None, always_record=None, flows=None):
+        """Sample and rate limit traced events.
+
+        :param sample_rate: fraction of flows which events are recorded, from 0.0 to 1.0
+        :param rate_limits: a dict mapping event name to maximum number of events recorded per second
+        :param always_record: names of events recorded regardless of sampling and rate limits, None for defaults
+        :param flows: a dict mapping flow name to a dict with sample_rate and rate_limits overriding the defaults
+        """
+        from .trace_sampler import TraceSampler
+        Trace.set_sampler(TraceSampler(sample_rate=sample_rate, rate_limits=rate_limits,
+                                       always_record=always_record, flows=flows))
+
+    @classmethod
+    def trace_by_json(cls, buffered=None):
+        """Trace directly JSON output.
+
+        :param buffered: a dict with BufferedTracer configuration, None to write trace points synchronously
+        """
+        Trace.trace_by_json(buffered=buffered)
 
     @classmethod
     def set_celery_app(cls, celery_app):
@@ -216,7 +324,67 @@ class Config(object):
         celery_app.tasks.register(SelinonTaskEnvelope())
 
     @classmethod
-    def init(cls, celery_app, nodes_definition_file, flow_definition_files, config_py=None, keep_config_py=False):
+    def set_result_backend_batcher(cls, result_backend_batcher):
+        """Set batcher that should be used to retrieve states of active nodes in bulk.
+
+        :param result_backend_batcher: an instance of ResultBackendBatcher, None to query nodes one by one
+        :type result_backend_batcher: selinon.result_backend_batcher.ResultBackendBatcher
+        """
+        cls.result_backend_batcher = result_backend_batcher
+
+    @classmethod
+    def set_dispatcher_notifier(cls, dispatcher_notifier):
+        """Set notifier that should be used to wake up dispatcher once a task in the flow finishes.
+
+        :param dispatcher_notifier: an instance of DispatcherNotifier, None to rely only on sampling strategies
+        :type dispatcher_notifier: selinon.dispatcher_notifier.DispatcherNotifier
+        """
+        cls.dispatcher_notifier = dispatcher_notifier
+
+    @classmethod
+    def set_node_args_store(cls, node_args_store):
+        """Set store that should be used to keep large flow arguments out of messages.
+
+        :param node_args_store: an instance of NodeArgsStore, None to pass flow arguments in messages
+        :type node_args_store: selinon.node_args_store.NodeArgsStore
+        """
+        cls.node_args_store = node_args_store
+
+    @classmethod
+    def set_state_encoder(cls, state_encoder):
+        """Set encoder that should be used to encode dispatcher state passed in dispatcher retry messages.
+
+        :param state_encoder: an instance of CompactStateEncoder, None to pass state as it is
+        :type state_encoder: selinon.state_encoding.CompactStateEncoder
+        """
+        cls.state_encoder = state_encoder
+
+    @classmethod
+    def set_finished_nodes_store(cls, finished_nodes_store):
+        """Set store that should be used to keep finished nodes of huge flows out of the result backend.
+
+        :param finished_nodes_store: an instance of FinishedNodesStore, None to return finished nodes as flow result
+        :type finished_nodes_store: selinon.finished_nodes_store.FinishedNodesStore
+        """
+        cls.finished_nodes_store = finished_nodes_store
+
+    @classmethod
+    def set_output_schema_sample_rate(cls, sample_rate):
+        """Set fraction of task results that should be validated against output schema.
+
+        :param sample_rate: a number from 0.0 (validate no results) to 1.0 (validate all results), None to always
+                            validate results
+        :type sample_rate: float
+        """
+        if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+            raise ConfigurationError("Output schema sample rate has to be in range from 0.0 to 1.0, got %r"
+                                     % sample_rate)
+
+        cls.output_schema_sample_rate = sample_rate
+
+    @classmethod
+    def init(cls, celery_app, nodes_definition_file, flow_definition_files, config_py=None, keep_config_py=False,
+             config_cache_dir=None, queues=None):
         """Initialize Selinon configuration with Celery application.
 
         :param celery_app: celery application to be used
@@ -224,9 +392,12 @@ class Config(object):
         :param flow_definition_files: list of flow definition files
         :param config_py: a file that should be used for storing generated config.py
         :param keep_config_py: do not remove config_py file after run
+        :param config_cache_dir: a directory with cached generated configuration, see selinon.config_cache
+        :param queues: a list of queues the worker consumes, configure only nodes served on these queues
         """
         # pylint: disable=too-many-arguments
-        cls.set_config_yaml(nodes_definition_file, flow_definition_files, config_py, keep_config_py)
+        cls.set_config_yaml(nodes_definition_file, flow_definition_files, config_py, keep_config_py,
+                            config_cache_dir=config_cache_dir, queues=queues)
         cls.set_celery_app(celery_app)
 
     @staticmethod
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Persistent cache of configuration generated from YAML files.
+
+Parsing and checking YAML configuration and generating Python code out of it is done on each worker start. With a lot
+of flows this can take several seconds. ConfigCache keeps the generated code byte-compiled in a directory, so
+subsequent worker starts with the same configuration only load and execute the compiled code:
+
+.. code-block:: python
+
+  from selinon import Config
+
+  Config.init(celery_app, 'nodes.yaml', ['flow1.yaml'], config_cache_dir='/var/cache/selinon')
+
+Cache entries are keyed by a hash of content of YAML files, Selinon version, Python bytecode version, values of
+environment variables referenced in YAML files (e.g. in queue names) and queues the configuration is restricted to.
+The cache directory can be shared by multiple workers, entries are written atomically. Stale entries are not removed
+automatically.
+"""
+
+import builtins
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import re
+import tempfile
+import types
+
+from .version import selinon_version
+
+_logger = logging.getLogger(__name__)
+
+# Environment variables are referenced as {VARIABLE} in YAML configuration, see str.format()
+_ENV_REFERENCE_RE = re.compile(r'\{(\w+)\}')
+
+
+class ConfigCache(object):
+    """Persistent cache of generated, byte-compiled configuration."""
+
+    # Bump on changes in cache format
+    _FORMAT_VERSION = b'1'
+
+    def __init__(self, cache_dir):
+        """Instantiate config cache.
+
+        :param cache_dir: path to directory in which cache entries are stored, created if does not exist
+        """
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def compute_key(cls, nodes_definition_file, flow_definition_files, queues=None):
+        """Compute key of cache entry for the given configuration files.
+
+        :param nodes_definition_file: path to nodes definition file
+        :param flow_definition_files: a list of paths to flow definition files
+        :param queues: a list of queues configuration is restricted to, None if not restricted
+        :return: key of cache entry
+        """
+        if isinstance(flow_definition_files, str):
+            flow_definition_files = (flow_definition_files,)
+
+        digest = hashlib.sha256()
+        digest.update(cls._FORMAT_VERSION + b'\0')
+        digest.update(selinon_version.encode() + b'\0')
+        digest.update(importlib.util.MAGIC_NUMBER + b'\0')
+
+        env_references = set()
+        for path in (nodes_definition_file,) + tuple(flow_definition_files):
+            with open(path, 'rb') as config_file:
+                content = config_file.read()
+
+            digest.update(b'%d\0' % len(content))
+            digest.update(content)
+            env_references.update(_ENV_REFERENCE_RE.findall(content.decode('utf-8', errors='replace')))
+
+        for name in sorted(env_references):
+            value = os.environ.get(name)
+            digest.update(('%s=%s\0' % (name, value) if value is not None else '%s\1' % name).encode())
+
+        if queues is not None:
+            digest.update(('queues=%s\0' % ','.join(sorted(set(queues)))).encode())
+
+        return digest.hexdigest()
+
+    def _entry_path(self, key, suffix):
+        """Get path to a file of cache entry.
+
+        :param key: key of cache entry
+        :param suffix: suffix of file
+        :return: path to file
+        """
+        return os.path.join(self.cache_dir, 'selinon_config_%s%s' % (key, suffix))
+
+    def _write_atomic(self, path, content):
+        """Write content to file so that readers never see a partially written file.
+
+        :param path: path to file
+        :param content: bytes to write
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.selinon_config_')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, key):
+        """Retrieve byte-compiled configuration from cache.
+
+        :param key: key of cache entry
+        :return: code object of generated configuration, None if not present in cache or cache entry is broken
+        """
+        path = self._entry_path(key, '.bin')
+        try:
+            with open(path, 'rb') as cache_file:
+                content = cache_file.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            code = marshal.loads(content)
+        except (EOFError, ValueError, TypeError):
+            code = None
+
+        if not isinstance(code, types.CodeType):
+            _logger.warning("Ignoring broken config cache entry '%s'", path)
+            return None
+
+        return code
+
+    def put(self, key, source):
+        """Byte-compile generated configuration and store it in cache.
+
+        The source is stored next to the compiled code so it can be inspected and tracebacks show the source.
+
+        :param key: key of cache entry
+        :param source: generated Python source code
+        :return: code object of generated configuration
+        """
+        source_path = self._entry_path(key, '.py')
+        code = compile(source, source_path, 'exec')
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write_atomic(source_path, source.encode())
+            self._write_atomic(self._entry_path(key, '.bin'), marshal.dumps(code))
+        except OSError:
+            # Not fatal, configuration will be generated on next start again
+            _logger.exception("Failed to store generated configuration to config cache '%s'", self.cache_dir)
+
+        return code
+
+    @staticmethod
+    def run(code):
+        """Execute byte-compiled configuration.
+
+        :param code: code object of generated configuration
+        :return: a dict with globals of executed configuration, see runpy.run_path()
+        """
+        config_module = {
+            '__name__': '<run_path>',
+            '__file__': code.co_filename,
+            '__builtins__': builtins
+        }
+        # Ignore B102
+        exec(code, config_module)  # pylint: disable=exec-used
+        return config_module
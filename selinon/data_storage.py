@@ -50,6 +50,18 @@ class DataStorage(object, metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def retrieve_many(self, flow_name, task_ids):
+        """Retrieve results of multiple tasks at once.
+
+        The default implementation retrieves results one by one, override this method if storage can retrieve
+        multiple records in one round trip.
+
+        :param flow_name: flow name in which tasks were executed
+        :param task_ids: a list of tuples (task_name, task_id) describing results that are going to be retrieved
+        :return: a dict mapping task id to task result
+        """
+        return {task_id: self.retrieve(flow_name, task_name, task_id) for task_name, task_id in task_ids}
+
     @abc.abstractmethod
     def store(self, node_args, flow_name, task_name, task_id, result):  # pylint: disable=too-many-arguments
         """Store result stored in storage.
@@ -16,7 +16,9 @@ from .errors import MigrationException
 from .errors import MigrationFlowFail
 from .errors import MigrationFlowRetry
 from .errors import MigrationSkew
+from .finished_nodes_store import store_finished_nodes
 from .migrations import Migrator
+from .state_encoding import CompactStateEncoder
 from .system_state import SystemState
 from .trace import Trace
 
@@ -37,10 +39,11 @@ class Dispatcher(Task):
         :param state: flow state that should be captured
         :raises celery.exceptions.Retry: Celery's retry exception, always
         """
+        state = CompactStateEncoder.decode(state) or {}
         reported_state = {
-            'finished_nodes': (state or {}).get('finished_nodes', {}),
-            'failed_nodes': (state or {}).get('failed_nodes', {}),
-            'active_nodes': (state or {}).get('active_nodes', [])
+            'finished_nodes': state.get('finished_nodes', {}),
+            'failed_nodes': state.get('failed_nodes', {}),
+            'active_nodes': state.get('active_nodes', [])
         }
         exc = FlowError(reported_state)
         raise self.retry(max_retries=0, exc=exc)
@@ -74,6 +77,8 @@ class Dispatcher(Task):
             'retry': flow_info['retry'],
             'state': flow_info['state']
         }
+        Trace.add_span_meta(kwargs, flow_info.get('meta'))
+
         countdown = Config.retry_countdown.get(flow_info['flow_name'], 0)
         max_retry = Config.max_retry.get(flow_info['flow_name'], 0)
 
@@ -92,6 +97,8 @@ class Dispatcher(Task):
             queue=queue
         )
 
+    @Trace.spanned('migrate_message', lambda flow_info, **_: {'flow_name': flow_info['flow_name'],
+                                                             'migration_version': flow_info['migration_version']})
     def migrate_message(self, flow_info):
         """Perform migration of state first before proceeding.
 
@@ -149,8 +156,26 @@ class Dispatcher(Task):
             Trace.log(Trace.MIGRATION_SKEW, flow_info, available_migration_version=None)
             raise self.selinon_retry(flow_info, adjust_retried_count=False)
 
+    @staticmethod
+    def subscribe_notifier(flow_info, countdown):
+        """Subscribe dispatcher for notifications about finished nodes, if configured so.
+
+        :param flow_info: information about the current flow
+        :param countdown: countdown after which dispatcher will be retried if no notification comes
+        """
+        if Config.dispatcher_notifier is None:
+            return
+
+        try:
+            Config.dispatcher_notifier.subscribe(flow_info['dispatcher_id'], flow_info['flow_name'], countdown)
+        except Exception:  # pylint: disable=broad-except
+            # Not fatal, we will be retried based on sampling strategy
+            Trace.log(Trace.DISPATCHER_NOTIFIER_ISSUE, flow_info, what=traceback.format_exc())
+
+    @Trace.spanned('dispatcher', lambda self, flow_name, **_: {'flow_name': flow_name,
+                                                               'dispatcher_id': self.request.id})
     def run(self, flow_name, node_args=None, parent=None, retried_count=None, retry=None,
-            state=None, selective=False, migration_version=None):
+            state=None, selective=False, migration_version=None, meta=None):
         # pylint: disable=too-many-arguments,arguments-differ,too-many-locals
         """Dispatcher entry-point - run each time a dispatcher is scheduled.
 
@@ -162,6 +187,7 @@ class Dispatcher(Task):
         :param state: the current system state
         :param selective: selective flow information if run in selective flow
         :param migration_version: migration version that was used for the flow
+        :param meta: message meta, holds trace id and parent span id if span tracing is on
         :raises: FlowError
         """
         retried_count = retried_count or 0
@@ -178,10 +204,14 @@ class Dispatcher(Task):
             'migration_version': migration_version or 0
         }
 
+        if meta:
+            flow_info['meta'] = meta
+
         Trace.log(Trace.DISPATCHER_WAKEUP, flow_info)
 
         # Perform migrations at first place
         self.migrate_message(flow_info)
+        state = flow_info['state']
 
         try:
             system_state = SystemState(self.request.id, flow_name, node_args, retry, state, parent, selective)
@@ -210,16 +240,26 @@ class Dispatcher(Task):
                 'parent': parent,
                 'retried_count': retried_count,
                 'retry': retry,
-                'state': state_dict,
+                'state': Config.state_encoder.encode(state_dict) if Config.state_encoder else state_dict,
                 'selective': system_state.selective,
                 'migration_version': flow_info['migration_version']
             }
+            Trace.add_span_meta(kwargs, meta)
+
             Trace.log(Trace.DISPATCHER_RETRY, flow_info, kwargs)
+            self.subscribe_notifier(flow_info, retry)
             raise self.retry(args=[], kwargs=kwargs, countdown=retry, queue=Config.dispatcher_queues[flow_name])
 
+        try:
+            finished_nodes = store_finished_nodes(flow_name, self.request.id, state_dict['finished_nodes'])
+        except Exception:  # pylint: disable=broad-except
+            # Not fatal, finished nodes are still correct when returned as they are
+            Trace.log(Trace.STORAGE_ISSUE, flow_info, what=traceback.format_exc())
+            finished_nodes = state_dict['finished_nodes']
+
         Trace.log(Trace.FLOW_END, flow_info, state=state_dict)
         return {
-            'finished_nodes': state_dict['finished_nodes'],
+            'finished_nodes': finished_nodes,
             # This is always {} since we have finished, but leave it here because of failure tracking.
             'failed_nodes': state_dict['failed_nodes'],
             # Always an empty array.
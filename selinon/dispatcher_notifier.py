@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Wake up dispatcher as soon as a node in the flow finishes.
+
+By default dispatcher polls flow status - it is retried with countdown computed by sampling strategy. Using a
+dispatcher notifier, task envelope signals the dispatcher handling the flow (based on dispatcher id) once the task
+finishes or fails so the flow can advance right away. Sampling strategy is still used to compute countdown that is
+used as a fallback timeout - e.g. if a notification gets lost.
+
+.. code-block:: python
+
+  from selinon import Config
+
+  Config.set_dispatcher_notifier(MyDispatcherNotifier())
+"""
+
+import abc
+import threading
+
+
+class DispatcherNotifier(metaclass=abc.ABCMeta):
+    """Base class for dispatcher notifiers."""
+
+    @abc.abstractmethod
+    def subscribe(self, dispatcher_id, flow_name, countdown):
+        """Subscribe dispatcher for notifications - called when dispatcher is going to be retried.
+
+        :param dispatcher_id: id of dispatcher that is going to be retried
+        :param flow_name: name of flow that is handled by dispatcher
+        :param countdown: countdown computed by sampling strategy after which dispatcher will be retried anyway
+        """
+
+    @abc.abstractmethod
+    def notify(self, dispatcher_id, flow_name, node_name, node_id):
+        """Notify dispatcher that a node in flow finished or failed.
+
+        :param dispatcher_id: id of dispatcher that handles flow
+        :param flow_name: name of flow in which the node was run
+        :param node_name: name of node that finished or failed
+        :param node_id: id of node that finished or failed
+        """
+
+
+class LocalDispatcherNotifier(DispatcherNotifier):
+    """Dispatcher notifier that wakes up dispatchers in the current process - suitable for executor."""
+
+    def __init__(self, wakeup):
+        """Instantiate local dispatcher notifier.
+
+        :param wakeup: a callable accepting dispatcher id that reschedules the given dispatcher to run right now
+        """
+        self.wakeup = wakeup
+        self._subscribed = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, dispatcher_id, flow_name, countdown):
+        """Subscribe dispatcher for notifications.
+
+        :param dispatcher_id: id of dispatcher that is going to be retried
+        :param flow_name: name of flow that is handled by dispatcher
+        :param countdown: countdown computed by sampling strategy, unused
+        """
+        with self._lock:
+            self._subscribed[dispatcher_id] = flow_name
+
+    def notify(self, dispatcher_id, flow_name, node_name, node_id):
+        """Wake up dispatcher if it is subscribed, subsequent notifications are dropped until it subscribes again.
+
+        :param dispatcher_id: id of dispatcher that handles flow
+        :param flow_name: name of flow in which the node was run
+        :param node_name: name of node that finished or failed
+        :param node_id: id of node that finished or failed
+        """
+        with self._lock:
+            subscribed = self._subscribed.pop(dispatcher_id, None) is not None
+
+        if subscribed:
+            self.wakeup(dispatcher_id)
+
+    def is_subscribed(self, dispatcher_id):
+        """Check whether the given dispatcher waits for a notification.
+
+        :param dispatcher_id: id of dispatcher to check
+        :return: True if dispatcher is subscribed for notifications
+        """
+        with self._lock:
+            return dispatcher_id in self._subscribed
@@ -142,5 +142,9 @@ class CacheMissError(Exception):
     """An error raised when there is requested an item from cache that is not stored in cache."""
 
 
+class MessageMutatedError(Exception):
+    """Raised by executor in strict mode if arguments of a message were modified before the message was consumed."""
+
+
 class ConfigNotInitializedError(Exception):
     """An error raised when the configuration was requested, but not initialized."""
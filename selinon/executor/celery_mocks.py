@@ -9,6 +9,9 @@
 Classes and functions to make Selinon executor work as a standalone CLI.
 """
 
+import threading
+from uuid import uuid4
+
 
 class SimulateRequest(object):
     """Simulate Celery's Task.request.
@@ -16,19 +19,26 @@ class SimulateRequest(object):
     Make possible to query task id right inside task by calling self.request.id
     """
 
-    def __init__(self, instance):
+    def __init__(self, instance, task_id=None):  # pylint: disable=unused-argument
         """Instantiate request.
 
         :param instance:Instance for the request.
+        :param task_id: id of the task, a new unique id is assigned if not provided
         """
-        self.id = str(id(instance))  # pylint: disable=redefined-builtin,invalid-name
+        # ids have to be unique across worker processes of executor
+        self.id = task_id or str(uuid4())  # pylint: disable=redefined-builtin,invalid-name
 
 
 class SimulateAsyncResult(object):
     """Simulate AsyncResult returned by apply_async() or by instantiating AsyncResult by Task id."""
 
+    # task id -> traceback/result, replaced by shared dicts when executor runs tasks in multiple processes
     task_failures = {}
     task_successes = {}
+    _lock = threading.Lock()
+    # virtual clock when simulating, tasks are finished once virtual time passes their completion time
+    clock = None
+    _completion_times = {}
 
     def __init__(self, node_name, node_id):  # pylint: disable=redefined-builtin,invalid-name
         """Initialize AsyncResult.
@@ -46,7 +56,10 @@ class SimulateAsyncResult(object):
         :param task_id: an ID of task that should be marked as successful
         :param result: result of task (None for SelinonTaskEnvelope, JSON describing system state for Dispatcher)
         """
-        cls.task_successes[task_id] = result
+        with cls._lock:
+            cls.task_successes[task_id] = result
+            if cls.clock is not None:
+                cls._completion_times[task_id] = cls.clock.now()
 
     @classmethod
     def set_failed(cls, task_id, exception):
@@ -55,21 +68,41 @@ class SimulateAsyncResult(object):
         :param task_id: an ID of task that should be marked as failed
         :param exception: exception raised in task
         """
-        cls.task_failures[task_id] = exception
+        with cls._lock:
+            cls.task_failures[task_id] = exception
+            if cls.clock is not None:
+                cls._completion_times[task_id] = cls.clock.now()
+
+    @classmethod
+    def clear(cls):
+        """Forget all task results."""
+        with cls._lock:
+            cls.task_successes.clear()
+            cls.task_failures.clear()
+            cls._completion_times.clear()
+
+    def _is_completed(self):
+        """Check whether the task already finished in virtual time, always true if not simulating.
+
+        :return: True if the task finished
+        """
+        if self.clock is None or self.task_id not in self._completion_times:
+            return True
+        return self._completion_times[self.task_id] <= self.clock.now()
 
     def successful(self):
         """Check for success.
 
         :return: True if task succeeded.
         """
-        return self.task_id in self.task_successes
+        return self.task_id in self.task_successes and self._is_completed()
 
     def failed(self):
         """Check for failure.
 
         :return: True if task failed
         """
-        return self.task_id in self.task_failures
+        return self.task_id in self.task_failures and self._is_completed()
 
     @property
     def traceback(self):
@@ -114,7 +147,7 @@ def simulate_apply_async(instance, **celery_kwargs):
     Executor.schedule(instance, celery_kwargs)
     selinon_kwargs = celery_kwargs['kwargs']
     return SimulateAsyncResult(selinon_kwargs.get('task_name', selinon_kwargs['flow_name']),
-                               node_id=id(instance))
+                               node_id=instance.request.id)
 
 
 def simulate_retry(instance, **celery_kwargs):
@@ -17,36 +17,58 @@ scheduled. Under the hood there is used a heap queue to optimize inserting to O(
 number messages currently in the queue. These queues are coupled into QueuePool (selinon.execute.queue_pool) which
 encapsulates all queues, keeps their references, instantiates it lazily and provides concurrency safety.
 
-In order to avoid starving, QueuePool keeps track of the queue ("a last used queue") which prevents from
-starving messages that were scheduled for the same time (basically a simple round-robin). QueuePool looks for a message
-that is not scheduled to the future and can be executed (to do so we get O(N) where N is number of queues being used).
+In order to avoid starving, QueuePool keeps track of when each queue was used which prevents from starving messages
+that were scheduled for the same time (basically a simple round-robin). QueuePool keeps heads of queues in a heap, so a
+message with the smallest time is found in O(log(Q)) where Q is number of queues being used.
 
 All workers listen on all queues for now. This prevents from waiting on a message that would be never processed.
 
+Executor can serve messages by multiple workers (concurrency higher than one) - either threads or processes. Queues are
+kept by the main thread which hands messages that can be run right now to a pool of workers. Messages scheduled to the
+future do not block other messages - the main thread sleeps until the earliest scheduled message can be run, a new
+message is published or a worker finishes. Worker threads publish messages directly to QueuePool. Worker processes
+collect messages that were published (and dispatcher notifications) while running a task and hand them to the main
+thread once the task finishes, results of tasks are shared using a multiprocessing manager. Note that worker processes
+do not share memory - use storages that are accessible from all processes (e.g. not in-memory storage) in such case.
+
 In order to understand how Executor works, you need to understand how Celery works. Please refer to Celery
 documentation if you are a Celery-newbie.
 """
 
-import copy
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
+import heapq
 import logging
+import multiprocessing
+import pickle
+import threading
 import traceback
 
 from selinon.celery import Task as CeleryTask
 from selinon import Config
+from selinon import Dispatcher
 from selinon import run_flow
 from selinon import run_flow_selective
+from selinon import RequestError
 from selinon.system_state import SystemState
 from selinon import UnknownError
+from selinon.dispatcher_notifier import DispatcherNotifier
+from selinon.dispatcher_notifier import LocalDispatcherNotifier
+from selinon.errors import MessageMutatedError
 from selinon.global_config import GlobalConfig
 
 from .celery_mocks import simulate_apply_async
 from .celery_mocks import simulate_retry
 from .celery_mocks import SimulateAsyncResult
+from .celery_mocks import SimulateRequest
 from .celery_mocks import SimulateRetry
+from .lazy_copy import lazy_copy
 from .progress import Progress
 from .queue_pool import QueuePool
+from .simulation import SimulationStats
+from .simulation import VirtualClock
 
 
 class Executor(object):
@@ -54,13 +76,34 @@ class Executor(object):
 
     executor_queues = QueuePool()
     _logger = logging.getLogger(__name__)
+    # dispatcher id -> record of the dispatcher message that is waiting in queues
+    _dispatcher_records = {}
+    # ids of records that were superseded by dispatcher wakeup and should be skipped
+    _stale_records = set()
+    # ids of dispatchers that are being run and ids of those that were notified meanwhile
+    _running_dispatchers = set()
+    _missed_notifications = set()
+    # guards queues and records above, notified on each published message
+    _queue_condition = threading.Condition(threading.RLock())
+    # messages and dispatcher notifications collected in a worker process, None in the main process
+    _worker_process_outbox = None
+    # if true, message arguments are not copied, but they are checked for modifications done while in queues
+    _strict_arguments = False
+    # ids of records -> fingerprints of their arguments as published, used in strict mode
+    _record_fingerprints = {}
+    # virtual clock when simulating, None when running in real time
+    _clock = None
 
     DEFAULT_SLEEP_TIME = 1
     DEFAULT_CONCURRENCY = 1
+    POOL_THREADS = 'threads'
+    POOL_PROCESSES = 'processes'
+    DEFAULT_POOL = POOL_THREADS
 
     def __init__(self, nodes_definition, flow_definitions,
                  concurrency=DEFAULT_CONCURRENCY, sleep_time=DEFAULT_SLEEP_TIME,
-                 config_py=None, keep_config_py=False, show_progressbar=True):
+                 config_py=None, keep_config_py=False, show_progressbar=True, notify_dispatcher=False,
+                 pool=DEFAULT_POOL, strict_arguments=False, duration_model=None):
         """Instantiate execute.
 
         :param nodes_definition: path to nodes.yaml file
@@ -77,17 +120,38 @@ class Executor(object):
         :type keep_config_py: bool
         :param show_progressbar: show progressbar on executor run
         :type show_progressbar: bool
+        :param notify_dispatcher: wake up dispatcher as soon as a task in the flow finishes
+        :type notify_dispatcher: bool
+        :param pool: pool of workers used if concurrency is higher than one - threads or processes
+        :type pool: str
+        :param strict_arguments: do not copy message arguments before running a task, raise an exception if arguments
+                                 of a message changed before the message was consumed instead
+        :type strict_arguments: bool
+        :param duration_model: if set, simulate flows in virtual time with task durations given by the model,
+                               concurrency states number of simulated workers in such case
+        :type duration_model: selinon.executor.simulation.DurationModel
         """
+        if pool not in (self.POOL_THREADS, self.POOL_PROCESSES):
+            raise RequestError("Unknown executor pool %r, available pools are %r and %r"
+                               % (pool, self.POOL_THREADS, self.POOL_PROCESSES))
+
         Config.set_config_yaml(nodes_definition, flow_definitions,
                                config_py=config_py,
                                keep_config_py=keep_config_py)
 
+        self.nodes_definition = nodes_definition
+        self.flow_definitions = flow_definitions
         self.concurrency = concurrency
         self.sleep_time = sleep_time
         self.show_progressbar = show_progressbar
+        self.notify_dispatcher = notify_dispatcher
+        self.pool = pool
+        self.duration_model = duration_model
+        self.simulation_stats = None
+        Executor._strict_arguments = strict_arguments
 
-        if concurrency != 1:
-            raise NotImplementedError("Concurrency is now unsupported")
+        if notify_dispatcher:
+            Config.set_dispatcher_notifier(_ExecutorDispatcherNotifier(self.wakeup_dispatcher))
 
     @staticmethod
     def _prepare():
@@ -97,6 +161,25 @@ class Executor(object):
         # Overwrite used Celery functions so we do not rely on Celery logic at all
         CeleryTask.apply_async = simulate_apply_async
         CeleryTask.retry = simulate_retry
+        # Throttling respects virtual time when simulating
+        SystemState._get_current_datetime = staticmethod(Executor.now)  # pylint: disable=protected-access
+
+    def _prepare_clock(self):
+        """Start virtual clock if flows are simulated."""
+        clock = VirtualClock() if self.duration_model is not None else None
+        Executor._clock = SimulateAsyncResult.clock = clock
+        self.simulation_stats = SimulationStats(clock.start_time) if clock is not None else None
+
+    @classmethod
+    def now(cls):
+        """Get the current time - virtual time if flows are simulated.
+
+        :return: the current time
+        :rtype: datetime.datetime
+        """
+        if cls._clock is not None:
+            return cls._clock.now()
+        return datetime.now()
 
     def run(self, flow_name, node_args=None):
         """Run executor.
@@ -105,6 +188,7 @@ class Executor(object):
         :param node_args: arguments for the flow
         """
         self._prepare()
+        self._prepare_clock()
         run_flow(flow_name, node_args)
         self._executor_run()
 
@@ -120,6 +204,7 @@ class Executor(object):
         :raises selinon.errors.SelectiveNoPathError: there was no way found to the desired task in the flow
         """
         self._prepare()
+        self._prepare_clock()
         run_flow_selective(
             flow_name,
             task_names,
@@ -131,45 +216,238 @@ class Executor(object):
 
     def _executor_run(self):
         """Perform task execution based on published message on queue."""
-        while not self.executor_queues.is_empty():
-            # TODO: concurrency
+        try:
+            if self.duration_model is not None:
+                self._executor_run_simulation()
+            elif self.concurrency == 1:
+                self._executor_run_serial()
+            elif self.pool == self.POOL_THREADS:
+                self._serve_pool(ThreadPoolExecutor(max_workers=self.concurrency),
+                                 submit=lambda pool, record: pool.submit(self._run_record, record),
+                                 finish=lambda _: None)
+            else:
+                self._executor_run_processes()
+        finally:
+            # dispatchers that finished flows
+            self._running_dispatchers.clear()
+            self._missed_notifications.clear()
+
+    def _executor_run_serial(self):
+        """Run tasks one by one in the current thread, wait for messages scheduled to the future."""
+        while True:
             self._logger.debug("new executor run")
 
             # Retrieve a task that can be run right now
-            time, record = self.executor_queues.pop()
-            task, celery_kwargs = record
+            time, record = self._pop_record()
+            if record is None:
+                break
 
             # we got a task with the lowest wait time - we need to wait if the task was scheduled in the future
             wait_time = (time - datetime.now()).total_seconds()
             Progress.sleep(wait_time=wait_time,
                            sleep_time=self.sleep_time,
                            info_text='Waiting for next task to process (%s seconds)... ' % round(wait_time, 3),
-                           show_progressbar=self.show_progressbar and self.concurrency == 1)
+                           show_progressbar=self.show_progressbar)
+            self._run_record(record)
+
+    def _executor_run_simulation(self):
+        """Run tasks in virtual time, time jumps to the next message instead of waiting for it."""
+        # virtual times at which simulated workers are free
+        workers = [self._clock.now()] * self.concurrency
+
+        while True:
+            self._logger.debug("new simulated executor run")
+            time, record = self._pop_record()
+            if record is None:
+                break
+
+            task, celery_kwargs = record
+            kwargs = celery_kwargs['kwargs']
+            start_time = max(time, heapq.heappop(workers))
+
+            if isinstance(task, Dispatcher):
+                # dispatcher takes no time
+                self._clock.set(start_time)
+                self._run_record(record)
+                finished = task.request.id in SimulateAsyncResult.task_successes \
+                    or task.request.id in SimulateAsyncResult.task_failures
+                self.simulation_stats.add_dispatcher_run(kwargs['flow_name'], task.request.id, start_time, finished)
+                heapq.heappush(workers, start_time)
+            else:
+                end_time = start_time + timedelta(seconds=self.duration_model.get_duration(kwargs['task_name']))
+                # task result and messages published by task are visible once the task finishes
+                self._clock.set(end_time)
+                self._run_record(record)
+                self.simulation_stats.add_task_run(kwargs['task_name'], start_time, end_time)
+                heapq.heappush(workers, end_time)
+
+    def _executor_run_processes(self):
+        """Run tasks in a pool of worker processes, results of tasks are shared using a multiprocessing manager."""
+        original_results = SimulateAsyncResult.task_successes, SimulateAsyncResult.task_failures
+
+        with multiprocessing.Manager() as manager:
+            SimulateAsyncResult.task_successes = manager.dict(original_results[0])
+            SimulateAsyncResult.task_failures = manager.dict(original_results[1])
+            pool = ProcessPoolExecutor(max_workers=self.concurrency,
+                                       initializer=_init_worker_process,
+                                       initargs=(self.nodes_definition, self.flow_definitions,
+                                                 SimulateAsyncResult.task_successes,
+                                                 SimulateAsyncResult.task_failures,
+                                                 self.notify_dispatcher))
             try:
-                kwargs = celery_kwargs.get('kwargs')
-                # remove additional metadata placed by Selinon when doing tracing
-                kwargs.pop('meta', None)
-                # Perform deep copy so any modification on task arguments does not affect arguments in queues.
-                result = task.run(**copy.deepcopy(kwargs))
-
-                # Dispatcher needs info about flow (JSON), but SelinonTaskEnvelope always returns None - we
-                # need to keep track of success)
-                SimulateAsyncResult.set_successful(task.request.id, result)
-            except SimulateRetry as selinon_exc:
-                if 'exc' in selinon_exc.celery_kwargs and selinon_exc.celery_kwargs.get('max_retries', 1) == 0:
-                    # log only user exception as we do not want SimulateRetry in our exception traceback
-                    user_exc = selinon_exc.celery_kwargs['exc']
-                    user_exc_info = (user_exc, user_exc, user_exc.__traceback__)
-                    self._logger.exception(str(user_exc), exc_info=user_exc_info)
-                    SimulateAsyncResult.set_failed(task.request.id, traceback.format_exception(*user_exc_info))
-                else:
-                    # reschedule if there was an exception and we did not hit max_retries when doing retry
-                    Executor.schedule(task, selinon_exc.celery_kwargs)
-            except KeyboardInterrupt:
-                raise
-            except Exception as exc:
-                raise UnknownError("Ooooops! Congratulations! It looks like you've found a bug! Feel free to open an "
-                                   "issue at https://github.com/selinon/selinon/issues") from exc
+                self._serve_pool(pool, submit=self._submit_to_process, finish=self._replay_worker_outbox)
+            finally:
+                original_results[0].update(SimulateAsyncResult.task_successes)
+                original_results[1].update(SimulateAsyncResult.task_failures)
+                SimulateAsyncResult.task_successes, SimulateAsyncResult.task_failures = original_results
+
+    def _serve_pool(self, pool, submit, finish):
+        """Hand messages that can be run right now to a pool of workers until there are no messages left.
+
+        :param pool: pool of workers, an instance of concurrent.futures.Executor
+        :param submit: a callable that submits a record to pool and returns future
+        :param finish: a callable called in the main thread with result of a finished future
+        """
+        condition = self._queue_condition
+        running = set()
+
+        def notify(_):
+            with condition:
+                condition.notify_all()
+
+        with pool, condition:
+            while True:
+                for future in [future for future in running if future.done()]:
+                    running.remove(future)
+                    finish(future.result())
+
+                next_time = None
+                while len(running) < self.concurrency:
+                    next_time, record = self._pop_record(until=datetime.now())
+                    if record is None:
+                        break
+
+                    self._logger.debug("new executor run")
+                    future = submit(pool, record)
+                    running.add(future)
+                    future.add_done_callback(notify)
+
+                if not running and next_time is None:
+                    # no message in queues and no worker is running a task
+                    break
+
+                if any(future.done() for future in running):
+                    # a worker finished before its done callback was added, nobody would notify us
+                    continue
+
+                timeout = None
+                if next_time is not None and len(running) < self.concurrency:
+                    # messages scheduled to the future do not block workers, wait until the first one can be run
+                    timeout = max((next_time - datetime.now()).total_seconds(), 0)
+
+                condition.wait(timeout)
+
+    @staticmethod
+    def _submit_to_process(pool, record):
+        """Submit a record to be run in a worker process.
+
+        :param pool: pool of worker processes
+        :param record: record of message to be run
+        :return: future holding messages and dispatcher notifications collected in worker process
+        """
+        task, celery_kwargs = record
+        return pool.submit(_run_in_worker_process, task.__class__, task.request.id, celery_kwargs)
+
+    def _replay_worker_outbox(self, outbox):
+        """Publish messages and deliver dispatcher notifications collected in a worker process.
+
+        :param outbox: a list of actions and their arguments as collected in worker process
+        """
+        for action, args in outbox:
+            if action == 'schedule':
+                task_class, task_id, celery_kwargs = args
+                task = task_class()
+                task.request = SimulateRequest(task, task_id)
+                self.schedule(task, celery_kwargs)
+            else:
+                getattr(Config.dispatcher_notifier, action)(*args)
+
+    @classmethod
+    def _pop_record(cls, until=None):
+        """Pop a record of a message with the smallest time, skip messages of dispatchers that were woken up.
+
+        :param until: pop only a message scheduled to the given time or before it, None to pop any message
+        :return: (time, record) tuple, record is None if there is no message to pop - time is time of the next
+                 message in such case or None if queues are empty
+        """
+        with cls._queue_condition:
+            while not cls.executor_queues.is_empty():
+                time, record = cls.executor_queues.top()
+
+                if id(record) in cls._stale_records:
+                    # dispatcher was woken up by a notification, the message was rescheduled - drop it right away so
+                    # executor does not wait for it
+                    cls.executor_queues.pop()
+                    cls._stale_records.remove(id(record))
+                    cls._record_fingerprints.pop(id(record), None)
+                    continue
+
+                if until is not None and time > until:
+                    return time, None
+
+                time, record = cls.executor_queues.pop()
+                task, _ = record
+
+                if isinstance(task, Dispatcher):
+                    cls._running_dispatchers.add(task.request.id)
+                    if cls._dispatcher_records.get(task.request.id) is record:
+                        del cls._dispatcher_records[task.request.id]
+
+                cls._check_fingerprint(record)
+                return time, record
+
+        return None, None
+
+    @classmethod
+    def _run_record(cls, record):
+        """Run a task based on the given record of message.
+
+        :param record: record of message - task and raw Celery arguments
+        """
+        task, celery_kwargs = record
+        try:
+            kwargs = celery_kwargs.get('kwargs')
+            # remove additional metadata placed by Selinon when doing tracing
+            kwargs.pop('meta', None)
+            if not cls._strict_arguments and cls._worker_process_outbox is None:
+                # Copy (lazily) so any modification on task arguments does not affect arguments in queues, worker
+                # processes get their own copy when arguments are unpickled
+                kwargs = {key: lazy_copy(value) for key, value in kwargs.items()}
+            result = task.run(**kwargs)
+
+            # Dispatcher needs info about flow (JSON), but SelinonTaskEnvelope always returns None - we
+            # need to keep track of success)
+            SimulateAsyncResult.set_successful(task.request.id, result)
+            if not isinstance(task, Dispatcher):
+                # as Celery does, task is notified once its state is stored
+                task.on_success(result, task.request.id, (), celery_kwargs['kwargs'])
+        except SimulateRetry as selinon_exc:
+            if 'exc' in selinon_exc.celery_kwargs and selinon_exc.celery_kwargs.get('max_retries', 1) == 0:
+                # log only user exception as we do not want SimulateRetry in our exception traceback
+                user_exc = selinon_exc.celery_kwargs['exc']
+                user_exc_info = (user_exc, user_exc, user_exc.__traceback__)
+                cls._logger.exception(str(user_exc), exc_info=user_exc_info)
+                SimulateAsyncResult.set_failed(task.request.id, traceback.format_exception(*user_exc_info))
+                if not isinstance(task, Dispatcher):
+                    task.on_failure(user_exc, task.request.id, (), celery_kwargs['kwargs'], None)
+            else:
+                # reschedule if there was an exception and we did not hit max_retries when doing retry
+                Executor.schedule(task, selinon_exc.celery_kwargs)
+        except KeyboardInterrupt:
+            raise
+        except Exception as exc:
+            raise UnknownError("Ooooops! Congratulations! It looks like you've found a bug! Feel free to open an "
+                               "issue at https://github.com/selinon/selinon/issues") from exc
 
     @classmethod
     def schedule(cls, task, celery_kwargs):
@@ -181,6 +459,141 @@ class Executor(object):
                               arguments
         """
         cls._logger.debug("executor is scheduling %s - %s", task.__class__.__name__, celery_kwargs)
-        cls.executor_queues.push(queue_name=celery_kwargs.get('queue', GlobalConfig.DEFAULT_CELERY_QUEUE),
-                                 time=datetime.now() + timedelta(seconds=celery_kwargs.get('countdown') or 0),
-                                 record=(task, celery_kwargs,))
+
+        if cls._worker_process_outbox is not None:
+            # queues are kept by the main process, exceptions are not needed there (and they do not need to pickle)
+            celery_kwargs = {key: value for key, value in celery_kwargs.items() if key != 'exc'}
+            cls._worker_process_outbox.append(('schedule', (task.__class__, task.request.id, celery_kwargs)))
+            return
+
+        record = (task, celery_kwargs,)
+        with cls._queue_condition:
+            countdown = celery_kwargs.get('countdown') or 0
+            if isinstance(task, Dispatcher):
+                cls._running_dispatchers.discard(task.request.id)
+                if task.request.id in cls._missed_notifications:
+                    # a node finished while dispatcher was run, dispatcher could check node states before that
+                    cls._missed_notifications.remove(task.request.id)
+                    countdown = 0
+
+            cls.executor_queues.push(queue_name=celery_kwargs.get('queue', GlobalConfig.DEFAULT_CELERY_QUEUE),
+                                     time=cls.now() + timedelta(seconds=countdown),
+                                     record=record)
+
+            if isinstance(task, Dispatcher):
+                cls._dispatcher_records[task.request.id] = record
+
+            if cls._strict_arguments:
+                cls._record_fingerprints[id(record)] = cls._fingerprint(celery_kwargs)
+
+            cls._queue_condition.notify_all()
+
+    @staticmethod
+    def _fingerprint(celery_kwargs):
+        """Compute fingerprint of message arguments.
+
+        :param celery_kwargs: raw Celery arguments of message
+        :return: fingerprint of arguments
+        """
+        return pickle.dumps(celery_kwargs.get('kwargs'), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def _check_fingerprint(cls, record):
+        """Check that arguments of a consumed message did not change since the message was published.
+
+        :param record: record of consumed message
+        :raises selinon.errors.MessageMutatedError: arguments of message were modified while the message was in queue
+        """
+        fingerprint = cls._record_fingerprints.pop(id(record), None)
+        if fingerprint is None:
+            return
+
+        task, celery_kwargs = record
+        if fingerprint != cls._fingerprint(celery_kwargs):
+            kwargs = celery_kwargs.get('kwargs') or {}
+            raise MessageMutatedError("Arguments of message for %r in flow %r were modified after the message was "
+                                      "published, a task modified arguments it shares with other messages: %s"
+                                      % (kwargs.get('task_name', task.__class__.__name__), kwargs.get('flow_name'),
+                                         kwargs))
+
+    @classmethod
+    def wakeup_dispatcher(cls, dispatcher_id):
+        """Reschedule dispatcher that is waiting in queues to run right now.
+
+        :param dispatcher_id: id of dispatcher that should be woken up
+        """
+        with cls._queue_condition:
+            record = cls._dispatcher_records.pop(dispatcher_id, None)
+            if record is None:
+                return
+
+            task, celery_kwargs = record
+            cls._logger.debug("executor is waking up dispatcher %s", dispatcher_id)
+            # The original message stays in the queue, it is skipped once popped
+            cls._stale_records.add(id(record))
+            cls.schedule(task, dict(celery_kwargs, countdown=0))
+
+
+class _ExecutorDispatcherNotifier(LocalDispatcherNotifier):
+    """Local dispatcher notifier that does not drop notifications for dispatchers that are being run."""
+
+    def notify(self, dispatcher_id, flow_name, node_name, node_id):
+        """Wake up dispatcher, if the dispatcher is being run, wake it up once it is retried."""
+        # pylint: disable=protected-access
+        with Executor._queue_condition:
+            if dispatcher_id in Executor._running_dispatchers:
+                Executor._missed_notifications.add(dispatcher_id)
+                return
+
+        super().notify(dispatcher_id, flow_name, node_name, node_id)
+
+
+class _ForwardingDispatcherNotifier(DispatcherNotifier):
+    """Dispatcher notifier used in worker processes, notifications are delivered by the main process."""
+
+    def subscribe(self, dispatcher_id, flow_name, countdown):
+        """Forward subscription of dispatcher to the main process."""
+        # pylint: disable=protected-access
+        Executor._worker_process_outbox.append(('subscribe', (dispatcher_id, flow_name, countdown)))
+
+    def notify(self, dispatcher_id, flow_name, node_name, node_id):
+        """Forward notification of dispatcher to the main process."""
+        # pylint: disable=protected-access
+        Executor._worker_process_outbox.append(('notify', (dispatcher_id, flow_name, node_name, node_id)))
+
+
+def _init_worker_process(nodes_definition, flow_definitions, task_successes, task_failures, notify_dispatcher):
+    """Initialize a worker process of executor.
+
+    :param nodes_definition: path to nodes.yaml file
+    :param flow_definitions: a list of YAML files describing flows
+    :param task_successes: results of tasks shared with the main process
+    :param task_failures: failures of tasks shared with the main process
+    :param notify_dispatcher: wake up dispatcher as soon as a task in the flow finishes
+    """
+    # pylint: disable=protected-access
+    if not Config.initialized:
+        # configuration is not inherited if the worker process was not forked
+        Config.set_config_yaml(nodes_definition, flow_definitions)
+
+    Executor._prepare()
+    Executor._worker_process_outbox = []
+    SimulateAsyncResult.task_successes = task_successes
+    SimulateAsyncResult.task_failures = task_failures
+    Config.set_dispatcher_notifier(_ForwardingDispatcherNotifier() if notify_dispatcher else None)
+
+
+def _run_in_worker_process(task_class, task_id, celery_kwargs):
+    """Run a task in a worker process.
+
+    :param task_class: class of task to be run (Dispatcher or SelinonTaskEnvelope)
+    :param task_id: id of the task
+    :param celery_kwargs: raw Celery arguments of the task
+    :return: messages and dispatcher notifications to be handled by the main process
+    """
+    # pylint: disable=protected-access
+    task = task_class()
+    task.request = SimulateRequest(task, task_id)
+    outbox = Executor._worker_process_outbox = []
+    Executor._run_record((task, celery_kwargs))
+    return outbox
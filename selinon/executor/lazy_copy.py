@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Copy message arguments lazily so tasks run by executor cannot modify messages that are still in queues.
+
+Messages published in executor share objects - e.g. flow arguments are passed to all tasks in the flow. Instead of
+deep copying arguments of each message before a task is run, dicts are copied one level at a time once they are
+reached - nested dicts and lists are copied when they are accessed for the first time, parts of arguments that are
+never accessed are never copied. Lists are copied as a whole (with dicts inside them copied lazily).
+
+Converting a lazily copied dict to a plain dict (dict(d), {**d}, passing **d) copies values that are still shared.
+"""
+
+import copy
+
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def lazy_copy(obj):
+    """Copy obj lazily - dicts are copied on access, objects of other types than lists and immutables are deep copied.
+
+    :param obj: object to be copied
+    :return: a copy of obj, obj itself if immutable
+    """
+    obj_type = type(obj)
+
+    if obj_type is dict or obj_type is LazyCopyDict:
+        return LazyCopyDict(obj)
+
+    if obj_type is list:
+        return [lazy_copy(item) for item in obj]
+
+    if obj_type in _IMMUTABLE_TYPES:
+        return obj
+
+    return copy.deepcopy(obj)
+
+
+class LazyCopyDict(dict):
+    """A shallow copy of a dict that copies nested values once they are accessed."""
+
+    def __init__(self, original=None):
+        """Instantiate lazy copy.
+
+        :param original: dict to be copied
+        """
+        super().__init__(original or {})
+        # keys which values are still shared with the original dict
+        self._shared = set(self.keys())
+
+    def _copy_value(self, key):
+        """Copy value stored under key if it is still shared with the original dict.
+
+        :param key: key which value should be copied
+        :return: value stored under key
+        """
+        value = super().__getitem__(key)
+        if key in self._shared:
+            self._shared.discard(key)
+            value = lazy_copy(value)
+            super().__setitem__(key, value)
+
+        return value
+
+    def _copy_shared(self):
+        """Copy all values that are still shared with the original dict."""
+        for key in list(self._shared):
+            self._copy_value(key)
+
+    def __iter__(self):
+        """Iterate over keys.
+
+        Overriding iteration makes dict(), {**d} and dict.update() access values using __getitem__ instead of reading
+        shared values directly.
+        """
+        return super().__iter__()
+
+    def __getitem__(self, key):
+        """Get value for key, copy it if accessed for the first time."""
+        return self._copy_value(key)
+
+    def __setitem__(self, key, value):
+        """Set value for key, the value is not copied."""
+        super().__setitem__(key, value)
+        self._shared.discard(key)
+
+    def __delitem__(self, key):
+        """Remove key from dict."""
+        super().__delitem__(key)
+        self._shared.discard(key)
+
+    def get(self, key, default=None):
+        """Get value for key, copy it if accessed for the first time."""
+        if key in self:
+            return self._copy_value(key)
+        return default
+
+    def setdefault(self, key, default=None):
+        """Get value for key, set it to default if not present."""
+        if key in self:
+            return self._copy_value(key)
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        """Remove key and return its value."""
+        if key in self:
+            value = self._copy_value(key)
+            del self[key]
+            return value
+        return super().pop(key, *default)
+
+    def popitem(self):
+        """Remove and return the last inserted key and its value."""
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def update(self, *args, **kwargs):
+        """Update dict, values are not copied."""
+        for arg in args:
+            if isinstance(arg, LazyCopyDict):
+                # do not take over values that are shared with other dict
+                arg._copy_shared()  # pylint: disable=protected-access
+
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        """Remove all items."""
+        super().clear()
+        self._shared.clear()
+
+    def values(self):
+        """Values of dict, shared values are copied."""
+        self._copy_shared()
+        return super().values()
+
+    def items(self):
+        """Items of dict, shared values are copied."""
+        self._copy_shared()
+        return super().items()
+
+    def copy(self):
+        """Shallow copy of dict."""
+        self._copy_shared()
+        return dict(self)
+
+    def __copy__(self):
+        """Shallow copy of dict, see copy.copy()."""
+        return self.copy()
+
+    def __ior__(self, other):
+        """Update dict in place, values are not copied."""
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        """Merge dicts into a new dict."""
+        self._copy_shared()
+        return super().__or__(other)
+
+    def __ror__(self, other):
+        """Merge dicts into a new dict."""
+        self._copy_shared()
+        return super().__ror__(other)
+
+    def __reduce__(self):
+        """Pickle and deep copy as a plain dict."""
+        return dict, (dict(self),)
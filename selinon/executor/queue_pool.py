@@ -4,7 +4,18 @@
 # Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
 # This file is part of Selinon project.
 # ######################################################################
-"""Pool of all queues in the system."""
+"""Pool of all queues in the system.
+
+Heads of queues (records with the smallest time in each queue) are indexed in a heap so a record with the smallest
+time across all queues is found in O(log(Q)) where Q is number of queues. Entries in the heap are invalidated lazily -
+once a head of a queue changes, a new entry is pushed and the old one is skipped when it reaches top of the heap.
+
+Records scheduled for the same time in different queues are served in a round-robin fashion - the queue that was
+served least recently wins.
+"""
+
+import heapq
+import itertools
 
 from .time_queue import TimeQueue
 
@@ -13,22 +24,19 @@ class QueuePool(object):
     """Pool of all queues in the system."""
 
     class _QueueWrapper(object):
-        """Wrap a queue so we carry additional info needed for QueuePool - cyclic double linked list."""
+        """Wrap a queue so we carry additional info needed for QueuePool."""
 
-        def __init__(self, previous_wrapper, next_wrapper, queue_name):
+        def __init__(self, queue_name):
             """Init QueueWrapper.
 
-            :param previous_wrapper: preceding queue wrapper in the linked list
-            :param next_wrapper: next queue wrapper in the linked list
             :param queue_name: name of the queue that is wrapped
             """
             self.queue_name = queue_name
             self.queue = TimeQueue()
-            self.previous = previous_wrapper or self
-            self.next = next_wrapper or self
-
-        def __next__(self):  # noqa
-            return self.next
+            # sequence number of the last pop from this queue, used for round-robin
+            self.last_used = 0
+            # sequence number of the heap entry that is valid for the current head of the queue
+            self.heap_entry_id = None
 
         def __repr__(self):
             """Queue representation for nice logs.
@@ -41,49 +49,30 @@ class QueuePool(object):
         """Initialize pool of queues."""
         # Queues are instantiated lazily on demand.
         self._queues = {}
-        self._last_used = None
-        self._queue_head = None
-        self._queue_tail = None
+        # heap of (time, last used, entry id, queue wrapper) tuples for heads of queues
+        self._heads = []
+        self._entry_ids = itertools.count(1)
+        self._pop_count = 0
 
-    def _create_queue_wrapper(self, queue_name):
-        """Create queue wrapper for the given queue name and register it to our queue pool (cyclic double-linked list).
+    def _push_head(self, queue_wrapper):
+        """Index the current head of the given queue, entries previously pushed for the queue become stale.
 
-        :param queue_name: queue name that the wrapper represents
-        :return queue wrapper
+        :param queue_wrapper: queue wrapper which head should be indexed
         """
-        queue_wrapper = self._QueueWrapper(self._queue_tail, self._queue_head, queue_name)
-
-        if self._queue_tail is not None:
-            self._queue_tail.next = queue_wrapper
-        self._queue_tail = queue_wrapper
-
-        if self._queue_head is None:
-            self._queue_head = queue_wrapper
-        self._queue_head.previous = queue_wrapper
-
-        return queue_wrapper
-
-    def _remove_queue_wrapper(self, queue_wrapper):
-        """Remove queue wrapper from queue pool - double linked list."""
-        self._queues.pop(queue_wrapper.queue_name)
-
-        if queue_wrapper is self._queue_head and queue_wrapper is self._queue_tail:
-            self._queue_head = None
-            self._queue_tail = None
-            self._last_used = None
-            return
-
-        queue_wrapper.previous.next = queue_wrapper.next
-        queue_wrapper.next.previous = queue_wrapper.previous
+        time, _ = queue_wrapper.queue.top()
+        queue_wrapper.heap_entry_id = next(self._entry_ids)
+        heapq.heappush(self._heads, (time, queue_wrapper.last_used, queue_wrapper.heap_entry_id, queue_wrapper))
 
-        if queue_wrapper is self._queue_head:
-            self._queue_head = queue_wrapper.next
+    def _top_queue_wrapper(self):
+        """Find queue wrapper holding a record with the smallest time, drop stale heap entries on the way.
 
-        if queue_wrapper is self._queue_tail:
-            self._queue_tail = queue_wrapper.previous
-
-        if queue_wrapper is self._last_used:
-            self._last_used = queue_wrapper.previous
+        :return: queue wrapper with the record with the smallest time
+        """
+        while True:
+            _, _, entry_id, queue_wrapper = self._heads[0]
+            if entry_id == queue_wrapper.heap_entry_id:
+                return queue_wrapper
+            heapq.heappop(self._heads)
 
     def get_queue(self, name):
         """Get queue wrapper by name of the queue that is wrapped, if does not exist, create one lazily.
@@ -93,7 +82,7 @@ class QueuePool(object):
         """
         queue_wrapper = self._queues.get(name)
         if queue_wrapper is None:
-            queue_wrapper = self._create_queue_wrapper(name)
+            queue_wrapper = self._QueueWrapper(name)
             self._queues[name] = queue_wrapper
         return queue_wrapper
 
@@ -112,45 +101,38 @@ class QueuePool(object):
         :param time: time of record (when should be record executed)
         :param record: record itself (message with additional information such as task name and its parameters)
         """
-        # TODO: add lock per queue
         queue_wrapper = self.get_queue(queue_name)
+        head_time = queue_wrapper.queue.top()[0] if not queue_wrapper.queue.is_empty() else None
         queue_wrapper.queue.push(time, record)
 
-        # initialize head if we haven't pushed anything to queue yet
-        # so we start from the very first queue
-        if self._last_used is None:
-            self._last_used = queue_wrapper
+        if head_time is None or time < head_time:
+            # the pushed record became head of the queue
+            self._push_head(queue_wrapper)
 
-    def pop(self):
-        """Pop a record with the smallest time.
+    def top(self):
+        """Get a record with the smallest time without removing it, the same record is returned by subsequent pop().
 
         :return: (time, record) tuple -  time of record and record itself (see self.push for more info)
         """
-        # TODO: add lock per queue
-        assert self._last_used is not None  # nosec
-
-        exit_loop = False
-        result_time, result_record = self._last_used.queue.top()
-        result_queue_wrapper = self._last_used
-        queue_wrapper = next(self._last_used)
+        return self._top_queue_wrapper().queue.top()
 
-        while not exit_loop:
-            candidate_time, candidate_record = queue_wrapper.queue.top()
-
-            if result_time is None or candidate_time < result_time:
-                result_time, result_record = candidate_time, candidate_record
-                result_queue_wrapper = queue_wrapper
+    def pop(self):
+        """Pop a record with the smallest time.
 
-            queue_wrapper = next(queue_wrapper)
-            if queue_wrapper == self._last_used:
-                exit_loop = True
+        :return: (time, record) tuple -  time of record and record itself (see self.push for more info)
+        """
+        queue_wrapper = self._top_queue_wrapper()
+        heapq.heappop(self._heads)
+        result_time, result_record = queue_wrapper.queue.pop()
 
-        result_queue_wrapper.queue.pop()
+        self._pop_count += 1
+        queue_wrapper.last_used = self._pop_count
 
-        if result_queue_wrapper.queue.is_empty():
-            self._remove_queue_wrapper(result_queue_wrapper)
+        if queue_wrapper.queue.is_empty():
+            queue_wrapper.heap_entry_id = None
+            self._queues.pop(queue_wrapper.queue_name)
         else:
-            self._last_used = result_queue_wrapper
+            self._push_head(queue_wrapper)
 
         return result_time, result_record
 
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Discrete-event simulation of flows in executor.
+
+By default executor waits real time for messages scheduled to the future (dispatcher retries, throttling, task
+retries). In simulation mode executor keeps a virtual clock instead - time jumps to the next message right away and
+each task takes time given by a duration model. Tasks are still run (and dispatchers still evaluate conditions), only
+the time is virtual. Dispatchers take no virtual time, but they are still retried based on flow sampling strategy so
+the number of dispatcher messages is predicted as well.
+
+.. code-block:: python
+
+  from selinon.executor import Executor
+  from selinon.executor.simulation import SampledDuration
+
+  executor = Executor('nodes.yml', ['flow1.yml'], concurrency=4,
+                      duration_model=SampledDuration({'Task1': ('gauss', 10, 2)}, default=1, seed=42))
+  executor.run('flow1')
+  print(executor.simulation_stats.to_dict())
+
+Simulation statistics hold makespan of the whole run and of each flow, number of dispatcher messages per flow and time
+workers spent running each task. Note that the executor concurrency states number of simulated workers, all tasks are
+run in the main thread.
+"""
+
+import abc
+from collections import Counter
+from datetime import datetime
+import itertools
+import json
+import random
+
+
+class VirtualClock(object):
+    """Clock used in simulation, time is set by executor."""
+
+    def __init__(self, start_time=None):
+        """Instantiate virtual clock.
+
+        :param start_time: time at which simulation starts, the current time if not provided
+        :type start_time: datetime.datetime
+        """
+        self.start_time = start_time or datetime.now()
+        self._now = self.start_time
+
+    def now(self):
+        """Get the current virtual time.
+
+        :return: the current virtual time
+        :rtype: datetime.datetime
+        """
+        return self._now
+
+    def set(self, time):
+        """Set the current virtual time.
+
+        :param time: time to be set
+        :type time: datetime.datetime
+        """
+        self._now = time
+
+
+class DurationModel(metaclass=abc.ABCMeta):
+    """Base class for models of task durations used in simulation."""
+
+    @abc.abstractmethod
+    def get_duration(self, task_name):
+        """Get duration of a task run.
+
+        :param task_name: name of the task that is run
+        :return: duration of the task run in seconds
+        :rtype: float
+        """
+
+
+class FixedDuration(DurationModel):
+    """Each run of a task takes the same time."""
+
+    def __init__(self, durations=None, default=0.0):
+        """Instantiate model.
+
+        :param durations: a dict mapping task names to their durations in seconds
+        :param default: duration in seconds of tasks not stated in durations
+        """
+        self.durations = durations or {}
+        self.default = default
+
+    def get_duration(self, task_name):
+        """Get duration of a task run."""
+        return self.durations.get(task_name, self.default)
+
+
+class SampledDuration(DurationModel):
+    """Duration of each task run is sampled from a distribution."""
+
+    def __init__(self, distributions, default=0.0, seed=None):
+        """Instantiate model.
+
+        :param distributions: a dict mapping task names to distributions - a tuple with a name of random.Random
+                              method and its arguments, e.g. ('gauss', 10, 2) or ('expovariate', 0.1)
+        :param default: duration in seconds of tasks not stated in distributions
+        :param seed: seed for random number generator so simulations can be reproduced
+        """
+        self.distributions = distributions
+        self.default = default
+        self._random = random.Random(seed)
+
+        for task_name, (distribution, *_) in distributions.items():
+            if not callable(getattr(self._random, distribution, None)):
+                raise ValueError("Unknown distribution %r for task %r" % (distribution, task_name))
+
+    def get_duration(self, task_name):
+        """Get duration of a task run, negative samples are treated as zero."""
+        if task_name not in self.distributions:
+            return self.default
+
+        distribution, *args = self.distributions[task_name]
+        return max(getattr(self._random, distribution)(*args), 0.0)
+
+
+class TraceDuration(DurationModel):
+    """Durations of task runs are replayed from traces of real runs."""
+
+    # events that finish a task run
+    _END_EVENTS = ('TASK_END', 'TASK_FAILURE')
+
+    def __init__(self, durations, default=0.0):
+        """Instantiate model.
+
+        :param durations: a dict mapping task names to a list of durations in seconds, durations are replayed in
+                          the given order and repeated once all of them were used
+        :param default: duration in seconds of tasks not stated in durations
+        """
+        self.durations = {task_name: itertools.cycle(task_durations)
+                          for task_name, task_durations in durations.items() if task_durations}
+        self.default = default
+
+    @classmethod
+    def from_trace(cls, trace_lines, default=0.0):
+        """Compute durations of task runs from trace - JSON trace points or trace points logged using logging.
+
+        :param trace_lines: an iterable of trace lines (e.g. a file)
+        :param default: duration in seconds of tasks not found in trace
+        :return: model replaying durations of task runs found in trace
+        :rtype: TraceDuration
+        """
+        durations = {}
+        started = {}
+        for line in trace_lines:
+            if '{' not in line:
+                continue
+
+            try:
+                trace_point = json.loads(line[line.index('{'):])
+            except ValueError:
+                continue
+
+            if not isinstance(trace_point, dict) or 'event' not in trace_point:
+                continue
+
+            details = trace_point.get('details') or {}
+            if trace_point['event'] == 'TASK_START':
+                started[details.get('task_id')] = datetime.fromisoformat(trace_point['time'])
+            elif trace_point['event'] in cls._END_EVENTS and details.get('task_id') in started:
+                start_time = started.pop(details['task_id'])
+                duration = (datetime.fromisoformat(trace_point['time']) - start_time).total_seconds()
+                durations.setdefault(details['task_name'], []).append(duration)
+
+        return cls(durations, default=default)
+
+    def get_duration(self, task_name):
+        """Get duration of a task run."""
+        if task_name not in self.durations:
+            return self.default
+
+        return next(self.durations[task_name])
+
+
+class SimulationStats(object):
+    """Statistics gathered during simulation."""
+
+    def __init__(self, start_time):
+        """Instantiate statistics.
+
+        :param start_time: virtual time at which simulation started
+        :type start_time: datetime.datetime
+        """
+        self.start_time = start_time
+        self.end_time = start_time
+        # flow name -> number of dispatcher messages run
+        self.dispatcher_messages = Counter()
+        # task name -> number of task messages run
+        self.task_messages = Counter()
+        # task name -> virtual time in seconds workers spent running the task
+        self.task_busy_time = Counter()
+        # dispatcher id -> [flow name, time of the first dispatcher run, time when flow finished or None]
+        self.flows = {}
+
+    def add_task_run(self, task_name, start_time, end_time):
+        """Record a task run.
+
+        :param task_name: name of the task
+        :param start_time: virtual time at which the task was started
+        :param end_time: virtual time at which the task finished
+        """
+        self.task_messages[task_name] += 1
+        self.task_busy_time[task_name] += (end_time - start_time).total_seconds()
+        self.end_time = max(self.end_time, end_time)
+
+    def add_dispatcher_run(self, flow_name, dispatcher_id, start_time, finished):
+        """Record a dispatcher run.
+
+        :param flow_name: name of the flow handled by dispatcher
+        :param dispatcher_id: id of dispatcher
+        :param start_time: virtual time at which the dispatcher was run
+        :param finished: True if the flow finished (successfully or not) in this run
+        """
+        self.dispatcher_messages[flow_name] += 1
+        self.end_time = max(self.end_time, start_time)
+
+        flow = self.flows.setdefault(dispatcher_id, [flow_name, start_time, None])
+        if finished:
+            flow[2] = start_time
+
+    @property
+    def makespan(self):
+        """Virtual time in seconds from start of the simulation to the end of the last message run."""
+        return (self.end_time - self.start_time).total_seconds()
+
+    def flow_makespans(self):
+        """Compute makespans of flows.
+
+        :return: a dict mapping flow names to a list of makespans in seconds of finished flows
+        """
+        result = {}
+        for flow_name, start_time, end_time in self.flows.values():
+            if end_time is not None:
+                result.setdefault(flow_name, []).append((end_time - start_time).total_seconds())
+
+        return result
+
+    def to_dict(self):
+        """Summarize statistics.
+
+        :return: a dict summarizing the simulation
+        """
+        return {
+            'makespan': self.makespan,
+            'flow_makespans': self.flow_makespans(),
+            'dispatcher_messages': dict(self.dispatcher_messages),
+            'task_messages': dict(self.task_messages),
+            'task_busy_time': dict(self.task_busy_time)
+        }
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Keep finished nodes of huge flows out of the result backend.
+
+Once a flow finishes, dispatcher returns finished nodes (a mapping of node names to lists of node ids) as its result.
+This result is retrieved by the parent flow dispatcher if finished nodes are propagated (propagate_finished or
+propagate_compound_finished) and it is passed to all subsequent nodes as their parent. For flows with thousands of
+nodes, the result gets huge and it is serialized over and over again. Using FinishedNodesStore, finished nodes of flows
+with more nodes than the given threshold are written to a storage in chunks and the dispatcher returns only a handle:
+
+.. code-block:: python
+
+  from selinon import Config
+  from selinon import FinishedNodesStore
+
+  # Storage1 is a storage stated in YAML configuration
+  Config.set_finished_nodes_store(FinishedNodesStore('Storage1', threshold=1000, chunk_size=1000))
+
+Parent dispatcher does not expand handles - they are passed in the parent dict of subsequent nodes. Handles are
+resolved lazily in tasks, once SelinonTask.parent_flow_result() or SelinonTask.parent_flow_exception() is called,
+chunk by chunk. Make sure the configuration is the same on all workers.
+"""
+
+from .config import Config
+from .errors import ConfigurationError
+from .storage_pool import StoragePool
+from .trace import Trace
+
+
+class FinishedNodesStore(object):
+    """Store finished nodes of huge flows in a storage in chunks and return only a handle to them."""
+
+    # Key in a dict that marks the dict as a handle to stored finished nodes
+    HANDLE_KEY = 'selinon_finished_nodes_ref'
+    # Key in parent dict under which handles of not yet resolved flows are listed
+    REFS_KEY = 'selinon_finished_nodes_refs'
+    # Task name under which chunks are stored in the storage
+    STORAGE_TASK_NAME = 'selinon_finished_nodes'
+
+    def __init__(self, storage_name, threshold=1000, chunk_size=1000):
+        """Instantiate finished nodes store.
+
+        :param storage_name: name of storage (as stated in YAML configuration) used to store finished nodes
+        :param threshold: number of finished nodes in a flow from which finished nodes are stored
+        :param chunk_size: maximum number of node ids stored in one chunk
+        """
+        if chunk_size < 1:
+            raise ConfigurationError("Chunk size for finished nodes store has to be a positive integer, got %r"
+                                     % chunk_size)
+
+        self.storage_name = storage_name
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def is_handle(cls, finished_nodes):
+        """Check whether the given finished nodes are a handle to stored finished nodes.
+
+        :param finished_nodes: finished nodes as returned by dispatcher
+        :return: True if finished_nodes is a handle
+        """
+        return isinstance(finished_nodes, dict) and cls.HANDLE_KEY in finished_nodes
+
+    @classmethod
+    def add_ref(cls, parent_flow, handle, compound):
+        """Record a handle in parent dict so it can be resolved later on demand.
+
+        :param parent_flow: a dict in parent that should hold finished nodes of the flow
+        :param handle: handle to stored finished nodes
+        :param compound: True if finished nodes are propagated as compound
+        """
+        parent_flow.setdefault(cls.REFS_KEY, []).append({'handle': handle, 'compound': compound})
+
+    @staticmethod
+    def _chunk_id(handle, chunk_idx):
+        """Compute id of a chunk under which the chunk is stored.
+
+        :param handle: handle to stored finished nodes
+        :param chunk_idx: index of chunk
+        :return: chunk id
+        """
+        return '%s-%d' % (handle[FinishedNodesStore.HANDLE_KEY], chunk_idx)
+
+    def _split(self, finished_nodes):
+        """Split finished nodes into chunks of at most chunk_size node ids.
+
+        :param finished_nodes: finished nodes to split
+        :return: a generator of chunks, each chunk maps node name to a list of node ids
+        """
+        chunk = {}
+        chunk_len = 0
+        for node_name, node_ids in finished_nodes.items():
+            pos = 0
+            while pos < len(node_ids):
+                taken = node_ids[pos:pos + self.chunk_size - chunk_len]
+                chunk[node_name] = taken
+                chunk_len += len(taken)
+                pos += len(taken)
+
+                if chunk_len == self.chunk_size:
+                    yield chunk
+                    chunk = {}
+                    chunk_len = 0
+
+        if chunk:
+            yield chunk
+
+    def store(self, flow_name, dispatcher_id, finished_nodes):
+        """Store finished nodes if there are enough of them and return a handle.
+
+        :param flow_name: name of flow that finished
+        :param dispatcher_id: id of dispatcher that handled the flow
+        :param finished_nodes: finished nodes of the flow
+        :return: handle to stored finished nodes or finished nodes if there are not enough of them to be stored
+        """
+        node_count = sum(len(node_ids) for node_ids in finished_nodes.values())
+        if node_count < self.threshold:
+            return finished_nodes
+
+        handle = {self.HANDLE_KEY: dispatcher_id, 'flow_name': flow_name, 'chunk_count': 0}
+        storage = StoragePool.get_connected_storage(self.storage_name)
+        for chunk in self._split(finished_nodes):
+            storage.store(None, flow_name, self.STORAGE_TASK_NAME, self._chunk_id(handle, handle['chunk_count']), chunk)
+            handle['chunk_count'] += 1
+
+        Trace.log(Trace.FINISHED_NODES_STORE, {
+            'flow_name': flow_name,
+            'dispatcher_id': dispatcher_id,
+            'storage_name': self.storage_name,
+            'node_count': node_count,
+            'chunk_count': handle['chunk_count']
+        })
+        return handle
+
+    def iter_nodes(self, finished_nodes):
+        """Iterate over finished nodes, retrieve chunks one by one if finished nodes were stored.
+
+        A node name can be yielded multiple times if its node ids span multiple chunks.
+
+        :param finished_nodes: finished nodes as returned by dispatcher - a handle or finished nodes themselves
+        :return: a generator of tuples - node name and a list of node ids
+        """
+        if not self.is_handle(finished_nodes):
+            yield from finished_nodes.items()
+            return
+
+        storage = StoragePool.get_connected_storage(self.storage_name)
+        for chunk_idx in range(finished_nodes['chunk_count']):
+            chunk_id = self._chunk_id(finished_nodes, chunk_idx)
+            Trace.log(Trace.FINISHED_NODES_RETRIEVE, {
+                'flow_name': finished_nodes['flow_name'],
+                'dispatcher_id': finished_nodes[self.HANDLE_KEY],
+                'storage_name': self.storage_name,
+                'chunk_id': chunk_id
+            })
+            yield from storage.retrieve(finished_nodes['flow_name'], self.STORAGE_TASK_NAME, chunk_id).items()
+
+
+def store_finished_nodes(flow_name, dispatcher_id, finished_nodes):
+    """Replace finished nodes of a huge flow with a handle if configured to do so, see FinishedNodesStore.
+
+    :param flow_name: name of flow that finished
+    :param dispatcher_id: id of dispatcher that handled the flow
+    :param finished_nodes: finished nodes of the flow
+    :return: handle to stored finished nodes or finished nodes themselves
+    """
+    if Config.finished_nodes_store is None:
+        return finished_nodes
+
+    return Config.finished_nodes_store.store(flow_name, dispatcher_id, finished_nodes)
+
+
+def iter_finished_nodes(finished_nodes):
+    """Iterate over finished nodes that can be a handle to stored finished nodes, see FinishedNodesStore.
+
+    :param finished_nodes: finished nodes as returned by dispatcher
+    :return: a generator of tuples - node name and a list of node ids
+    """
+    if Config.finished_nodes_store is None:
+        if FinishedNodesStore.is_handle(finished_nodes):
+            raise ConfigurationError("Finished nodes were passed as a handle %r but finished nodes store is not "
+                                     "configured, see Config.set_finished_nodes_store()" % finished_nodes)
+        return iter(finished_nodes.items())
+
+    return Config.finished_nodes_store.iter_nodes(finished_nodes)
+
+
+def resolve_finished_nodes_refs(parent_flow, get_finished_nodes):
+    """Expand handles recorded in parent dict of a flow, see FinishedNodesStore.add_ref().
+
+    :param parent_flow: a dict in parent that holds finished nodes of a flow
+    :param get_finished_nodes: a callable that returns finished nodes of a subflow given its name and id
+    :return: parent_flow with all handles listed in it expanded, parent_flow itself if there are no handles
+    """
+    if FinishedNodesStore.REFS_KEY not in parent_flow:
+        return parent_flow
+
+    result = {}
+    for node_name, value in parent_flow.items():
+        if node_name != FinishedNodesStore.REFS_KEY:
+            result[node_name] = list(value) if isinstance(value, list) else value
+
+    for ref in parent_flow[FinishedNodesStore.REFS_KEY]:
+        stack = [(result, ref['handle'])]
+        while stack:
+            dst, finished_nodes = stack.pop()
+            for node_name, node_ids in iter_finished_nodes(finished_nodes):
+                if Config.is_flow(node_name):
+                    sub_dst = dst if ref['compound'] else dst.setdefault(node_name, {})
+                    for node_id in node_ids:
+                        stack.append((sub_dst, get_finished_nodes(node_name, node_id)))
+                else:
+                    dst.setdefault(node_name, []).extend(node_ids)
+
+    return result
@@ -10,6 +10,8 @@ import os
 
 from .errors import ConfigurationError
 from .helpers import check_conf_keys
+from .trace import Trace
+from .trace_sampler import TraceSampler
 
 
 class GlobalConfig(object):
@@ -21,12 +23,16 @@ class GlobalConfig(object):
     default_task_queue = DEFAULT_CELERY_QUEUE
     default_dispatcher_queue = DEFAULT_CELERY_QUEUE
     migration_dir = None
+    lazy_imports = False
 
     _trace_logging = []
     _trace_function = []
     _trace_storage = []
     _trace_sentry = []
     _trace_json = None
+    _trace_metrics = None
+    _trace_spans = None
+    _trace_sampling = None
 
     def __init__(self):
         """Placeholder."""
@@ -46,19 +52,60 @@ class GlobalConfig(object):
             output.write('%s%s.trace_by_logging()\n' % (indent, config_name))
 
         for entry in cls._trace_storage:
-            output.write('%s%s.trace_by_func(functools.partial(%s.%s, %s))\n'
-                         % (indent, config_name, entry[0].class_name, entry[1], entry[0].var_name))
+            if cls.lazy_imports:
+                output.write("%s%s.trace_by_func(functools.partial(import_object('%s', '%s').%s, "
+                             "storage2instance_mapping['%s']), events=%r)\n"
+                             % (indent, config_name, entry[0].import_path, entry[0].class_name, entry[1],
+                                entry[0].name, entry[2]))
+            else:
+                output.write('%s%s.trace_by_func(functools.partial(%s.%s, %s), events=%r)\n'
+                             % (indent, config_name, entry[0].class_name, entry[1], entry[0].var_name, entry[2]))
 
         for entry in cls._trace_function:
             output.write('%sfrom %s import %s\n' % (indent, entry[0], entry[1]))
-            output.write('%s%s.trace_by_func(%s)\n' % (indent, config_name, entry[1]))
+            output.write('%s%s.trace_by_func(%s, events=%r)\n' % (indent, config_name, entry[1], entry[2]))
 
         for entry in cls._trace_sentry:
             output.write("%s%s.trace_by_sentry(dsn=%s)\n"
                          % (indent, config_name, "'%s'" % entry if entry is not True else None))
 
+        if cls._trace_metrics is not None:
+            output.write("%s%s.trace_by_metrics(buckets=%r)\n"
+                         % (indent, config_name, cls._trace_metrics.get('buckets')))
+
+        if cls._trace_spans is not None:
+            output.write("%s%s.trace_by_spans(output=%r)\n" % (indent, config_name, cls._trace_spans.get('output')))
+
+        if cls._trace_sampling is not None:
+            output.write("%s%s.set_trace_sampling(**%r)\n" % (indent, config_name, cls._trace_sampling))
+
         if cls._trace_json is True:
             output.write("%s%s.trace_by_json()\n" % (indent, config_name))
+        elif isinstance(cls._trace_json, dict):
+            output.write("%s%s.trace_by_json(buffered=%r)\n" % (indent, config_name, cls._trace_json))
+
+    @staticmethod
+    def _parse_trace_events(trace_def):
+        """Parse events a tracer is subscribed to.
+
+        :param trace_def: definition of tracing as supplied in the YAML file
+        :return: a list of event names, None if all events should be traced
+        """
+        events = trace_def.get('events')
+        if events is None:
+            return None
+
+        if not isinstance(events, list):
+            raise ConfigurationError("Trace events should be stated as a list of event names, got '%s' instead "
+                                     "(type: %s)" % (events, type(events)))
+
+        for event in events:
+            try:
+                Trace.str2event(event)
+            except ValueError as exc:
+                raise ConfigurationError("Unknown trace event %r supplied in tracing configuration" % event) from exc
+
+        return events
 
     @classmethod
     def _parse_trace_storage(cls, trace_def, system):
@@ -75,12 +122,13 @@ class GlobalConfig(object):
             raise ConfigurationError('Expected storage name in tracing configuration, got %s instead'
                                      % trace_def)
 
-        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('method', 'name'))
+        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('method', 'name', 'events'))
         if unknown_conf:
             raise ConfigurationError("Unknown configuration for trace storage '%s' supplied: %s"
                                      % (trace_def, unknown_conf))
 
-        cls._trace_storage.append((system.storage_by_name(trace_def['name']), trace_def.get('method', 'trace')))
+        cls._trace_storage.append((system.storage_by_name(trace_def['name']), trace_def.get('method', 'trace'),
+                                   cls._parse_trace_events(trace_def)))
 
     @classmethod
     def _parse_trace_function(cls, trace_def):
@@ -100,12 +148,12 @@ class GlobalConfig(object):
             raise ConfigurationError('Expected function name in function trace configuration, got %s instead'
                                      % trace_def)
 
-        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('import', 'name'))
+        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('import', 'name', 'events'))
         if unknown_conf:
             raise ConfigurationError("Unknown configuration for trace function '%s' from '%s' supplied: %s"
                                      % (trace_def['name'], trace_def['import'], unknown_conf))
 
-        cls._trace_function.append((trace_def['import'], trace_def['name']))
+        cls._trace_function.append((trace_def['import'], trace_def['name'], cls._parse_trace_events(trace_def)))
 
     @classmethod
     def _parse_trace_logging(cls, trace_def):
@@ -138,14 +186,112 @@ class GlobalConfig(object):
 
         :param trace_def: definition of tracing as supplied in the YAML file
         """
-        if not isinstance(trace_def, bool):
-            raise ConfigurationError("Configuration of JSON tracing expects bool, got '%s' instead (type: %s)"
+        if not isinstance(trace_def, (bool, dict)):
+            raise ConfigurationError("Configuration of JSON tracing expects bool or dict, got '%s' instead (type: %s)"
                                      % (trace_def, type(trace_def)))
         if cls._trace_json is not None:
             raise ConfigurationError("Configuration of JSON tracing supplied multiple times")
 
+        if isinstance(trace_def, dict):
+            unknown_conf = check_conf_keys(trace_def, known_conf_opts=('output', 'batch_size', 'flush_interval',
+                                                                       'max_queue_size', 'drop_policy'))
+            if unknown_conf:
+                raise ConfigurationError("Unknown configuration for buffered JSON tracing supplied: %s"
+                                         % unknown_conf)
+
         cls._trace_json = trace_def
 
+    @classmethod
+    def _parse_trace_metrics(cls, trace_def):
+        """Parse aggregation of trace events to in-process metrics.
+
+        :param trace_def: definition of tracing as supplied in the YAML file
+        """
+        if trace_def is False:
+            return
+
+        if trace_def is True:
+            trace_def = {}
+
+        if not isinstance(trace_def, dict):
+            raise ConfigurationError("Configuration of metrics expects bool or dict, got '%s' instead (type: %s)"
+                                     % (trace_def, type(trace_def)))
+
+        if cls._trace_metrics is not None:
+            raise ConfigurationError("Configuration of metrics supplied multiple times")
+
+        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('buckets',))
+        if unknown_conf:
+            raise ConfigurationError("Unknown configuration for metrics supplied: %s" % unknown_conf)
+
+        buckets = trace_def.get('buckets')
+        if buckets is not None and (not isinstance(buckets, list) or not buckets
+                                    or not all(isinstance(bucket, (int, float)) and bucket > 0 for bucket in buckets)):
+            raise ConfigurationError("Metrics histogram buckets should be a non-empty list of positive numbers, "
+                                     "got %r instead" % buckets)
+
+        cls._trace_metrics = trace_def
+
+    @classmethod
+    def _parse_trace_spans(cls, trace_def):
+        """Parse span-based tracing of dispatcher wakeups and task execution.
+
+        :param trace_def: definition of tracing as supplied in the YAML file
+        """
+        if trace_def is False:
+            return
+
+        if trace_def is True:
+            trace_def = {}
+
+        if not isinstance(trace_def, dict):
+            raise ConfigurationError("Configuration of span tracing expects bool or dict, got '%s' instead (type: %s)"
+                                     % (trace_def, type(trace_def)))
+
+        if cls._trace_spans is not None:
+            raise ConfigurationError("Configuration of span tracing supplied multiple times")
+
+        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('output',))
+        if unknown_conf:
+            raise ConfigurationError("Unknown configuration for span tracing supplied: %s" % unknown_conf)
+
+        if trace_def.get('output') is not None and not isinstance(trace_def['output'], str):
+            raise ConfigurationError("Output of span tracing should be a path to file, got %r instead"
+                                     % trace_def['output'])
+
+        cls._trace_spans = trace_def
+
+    @classmethod
+    def _parse_trace_sampling(cls, trace_def):
+        """Parse sampling and rate limiting of traced events.
+
+        :param trace_def: definition of trace sampling as supplied in the YAML file
+        """
+        if not isinstance(trace_def, dict):
+            raise ConfigurationError("Configuration of trace sampling expects dict, got '%s' instead (type: %s)"
+                                     % (trace_def, type(trace_def)))
+
+        if cls._trace_sampling is not None:
+            raise ConfigurationError("Configuration of trace sampling supplied multiple times")
+
+        unknown_conf = check_conf_keys(trace_def, known_conf_opts=('sample_rate', 'rate_limits', 'always_record',
+                                                                   'flows'))
+        if unknown_conf:
+            raise ConfigurationError("Unknown configuration for trace sampling supplied: %s" % unknown_conf)
+
+        if trace_def.get('always_record') is not None and not isinstance(trace_def['always_record'], list):
+            raise ConfigurationError("Events always recorded should be stated as a list of event names, got %r "
+                                     "instead" % trace_def['always_record'])
+
+        if trace_def.get('flows') is not None and not isinstance(trace_def['flows'], dict):
+            raise ConfigurationError("Trace sampling configuration of flows should be a dict, got %r instead"
+                                     % trace_def['flows'])
+
+        # Check configuration early so errors are reported on configuration parsing
+        TraceSampler(**trace_def)
+
+        cls._trace_sampling = trace_def
+
     @classmethod
     def _parse_trace(cls, system, trace_record):
         """Parse trace configuration entry.
@@ -178,6 +324,15 @@ class GlobalConfig(object):
             if 'json' in entry:
                 cls._parse_trace_json(entry['json'])
 
+            if 'metrics' in entry:
+                cls._parse_trace_metrics(entry['metrics'])
+
+            if 'spans' in entry:
+                cls._parse_trace_spans(entry['spans'])
+
+            if 'sampling' in entry:
+                cls._parse_trace_sampling(entry['sampling'])
+
     @classmethod
     def from_dict(cls, system, dict_):
         """Parse global configuration from a dictionary.
@@ -219,6 +374,12 @@ class GlobalConfig(object):
                           "proposed migration dir: %r" % cls.migration_dir
                 raise ConfigurationError(err_msg) from exc
 
+        # Import task classes, storages and caches on first use
+        cls.lazy_imports = dict_.pop('lazy_imports', False)
+        if not isinstance(cls.lazy_imports, bool):
+            raise ConfigurationError("Option lazy_imports in global configuration should be a boolean, got %r instead"
+                                     % cls.lazy_imports)
+
         if dict_:
             raise ConfigurationError("Unknown configuration options supplied in global configuration section: %s"
                                      % dict_)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Lazy resolution of task classes, storages and caches in generated configuration.
+
+By default the generated configuration imports all task classes, storage adapters and caches when a worker starts.
+Workers that serve only a subset of queues do not need most of them. If lazy imports are turned on in the global
+section of nodes definition:
+
+.. code-block:: yaml
+
+  global:
+    lazy_imports: true
+
+the generated configuration holds LazyMapping instances instead of plain dicts - a module is imported and a storage
+or a cache instantiated once it is first requested (e.g. in Config.get_task_instance() or
+StoragePool.get_connected_storage()). Note that import errors are then reported on first use instead of on worker
+start.
+"""
+
+import importlib
+import threading
+from collections.abc import Mapping
+
+
+def import_object(import_path, name):
+    """Import an object from a module.
+
+    :param import_path: path to module from which the object should be imported
+    :param name: name of object in module
+    :return: imported object
+    """
+    return getattr(importlib.import_module(import_path), name)
+
+
+class LazyMapping(Mapping):
+    """A read-only mapping which values are computed on first access and kept afterwards."""
+
+    def __init__(self, factories):
+        """Instantiate lazy mapping.
+
+        :param factories: a dict mapping keys to callables with no arguments that compute corresponding values
+        """
+        self._factories = factories
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        """Get value for key, compute it if it was not requested yet.
+
+        :param key: key to look up
+        :return: value for key
+        """
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        factory = self._factories[key]
+        with self._lock:
+            # another thread could be faster
+            if key not in self._values:
+                self._values[key] = factory()
+
+        return self._values[key]
+
+    def __contains__(self, key):
+        """Check key presence without computing its value.
+
+        :param key: key to check
+        :return: True if key is present in the mapping
+        """
+        return key in self._factories
+
+    def __iter__(self):
+        """Iterate over keys, values are not computed."""
+        return iter(self._factories)
+
+    def __len__(self):
+        """Get number of keys in the mapping."""
+        return len(self._factories)
+
+    def is_resolved(self, key):
+        """Check whether the value for key was already computed.
+
+        :param key: key to check
+        :return: True if the value was already computed
+        """
+        return key in self._values
+
+    def __repr__(self):
+        """Representation of lazy mapping, values are not computed."""
+        return '%s(%r)' % (self.__class__.__name__, sorted(self._factories))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Aggregate trace events to in-process metrics.
+
+MetricsTracer is a trace function that keeps counters and latency histograms computed from trace events, so there is
+no need to parse logs to get basic insights. Metrics are kept in the worker process and they can be pulled using
+MetricsTracer API or exposed in Prometheus text format:
+
+.. code-block:: python
+
+  from selinon import Trace
+
+  metrics = Trace.trace_by_metrics()
+  ...
+  print(metrics.cache_hit_ratio('node_state', flow_name='flow1'))
+  print(metrics.prometheus_text())
+
+The following metrics are computed:
+
+  * `selinon_events_total` - number of traced events by event, flow_name, task_name and storage_name (if present
+    in event details), e.g. dispatcher retries per flow or cache hits and misses
+  * `selinon_task_duration_seconds` - histogram of task durations (from TASK_START to TASK_END, TASK_FAILURE or
+    TASK_RETRY) by flow_name, task_name and status
+  * `selinon_storage_retrieve_duration_seconds` - histogram of durations of task result retrievals from storages by
+    storage_name, a retrieval of multiple results at once (see StoragePool.prefetch()) is observed once
+
+Note that task durations are computed only if TASK_START and the corresponding end event are traced in the same process.
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+from .trace import Trace
+
+_EVENTS_TOTAL = 'selinon_events_total'
+_TASK_DURATION = 'selinon_task_duration_seconds'
+_STORAGE_RETRIEVE_DURATION = 'selinon_storage_retrieve_duration_seconds'
+
+_HELP = {
+    _EVENTS_TOTAL: 'Number of traced Selinon events.',
+    _TASK_DURATION: 'Duration of task execution in seconds.',
+    _STORAGE_RETRIEVE_DURATION: 'Duration of task result retrieval from storage in seconds.'
+}
+
+# Details of events that are used as labels of selinon_events_total
+_EVENT_LABELS = ('flow_name', 'task_name', 'storage_name')
+
+_TASK_END_EVENTS = {
+    Trace.TASK_END: 'success',
+    Trace.TASK_FAILURE: 'failure',
+    Trace.TASK_RETRY: 'retry'
+}
+
+_CACHE_EVENTS = {
+    'node_state': (Trace.NODE_STATE_CACHE_HIT, Trace.NODE_STATE_CACHE_MISS),
+    'task_result': (Trace.TASK_RESULT_CACHE_HIT, Trace.TASK_RESULT_CACHE_MISS)
+}
+
+
+def _escape_label_value(value):
+    """Escape label value for Prometheus text format.
+
+    :param value: label value
+    :return: escaped label value
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    """Format labels for Prometheus text format.
+
+    :param labels: a tuple of label name and label value pairs
+    :param extra: additional label name and label value pairs
+    :return: formatted labels including curly braces, an empty string if there are no labels
+    """
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape_label_value(value)) for name, value in labels)
+
+
+class _Histogram(object):
+    """Histogram of observed values with fixed buckets."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        """Instantiate histogram.
+
+        :param buckets: sorted upper bounds of buckets
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add an observed value to histogram.
+
+        :param value: observed value
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        """Convert histogram to a dict with cumulative bucket counts.
+
+        :return: a dict describing histogram
+        """
+        cumulative = []
+        total = 0
+        for upper_bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((upper_bound, total))
+
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class MetricsTracer(object):
+    """A trace function that aggregates trace events to counters and histograms."""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+    def __init__(self, buckets=None, max_running_tasks=10000):
+        """Instantiate metrics tracer.
+
+        :param buckets: upper bounds of histogram buckets in seconds
+        :param max_running_tasks: maximum number of tasks for which start time is kept to compute task duration
+        """
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.max_running_tasks = max_running_tasks
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._running_tasks = collections.OrderedDict()
+
+    def reset(self):
+        """Drop all metrics computed so far."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._running_tasks.clear()
+
+    def _observe(self, name, labels, value):
+        """Add an observed value to histogram, lock has to be held.
+
+        :param name: name of histogram
+        :param labels: a tuple of label name and label value pairs
+        :param value: observed value
+        """
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    def __call__(self, event, msg_dict):
+        """Aggregate event, used as a trace function.
+
+        :param event: event that triggered trace point
+        :param msg_dict: a dict holding additional trace information for event
+        """
+        now = time.monotonic()
+        labels = (('event', Trace.event2str(event)),) + \
+            tuple((name, msg_dict[name]) for name in _EVENT_LABELS if msg_dict.get(name) is not None)
+
+        with self._lock:
+            key = (_EVENTS_TOTAL, labels)
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+            if event == Trace.TASK_START:
+                self._running_tasks[msg_dict.get('task_id')] = now
+                if len(self._running_tasks) > self.max_running_tasks:
+                    self._running_tasks.popitem(last=False)
+            elif event in _TASK_END_EVENTS:
+                start = self._running_tasks.pop(msg_dict.get('task_id'), None)
+                if start is not None:
+                    self._observe(_TASK_DURATION, (('flow_name', msg_dict.get('flow_name')),
+                                                   ('task_name', msg_dict.get('task_name')),
+                                                   ('status', _TASK_END_EVENTS[event])), now - start)
+            elif event in (Trace.STORAGE_RETRIEVED, Trace.STORAGE_RETRIEVED_MANY) and 'elapsed' in msg_dict:
+                self._observe(_STORAGE_RETRIEVE_DURATION, (('storage_name', msg_dict.get('storage_name')),),
+                              msg_dict['elapsed'])
+
+    @staticmethod
+    def _match(labels, expected):
+        """Check whether labels of a metric match expected labels.
+
+        :param labels: a tuple of label name and label value pairs
+        :param expected: a dict of expected label values
+        :return: True if all expected labels are present with the expected values
+        """
+        labels = dict(labels)
+        return all(labels.get(name) == value for name, value in expected.items())
+
+    def counter_value(self, name, **labels):
+        """Get value of a counter summed over all label values that are not stated.
+
+        :param name: name of counter, e.g. selinon_events_total
+        :param labels: label values to filter on, e.g. event='DISPATCHER_RETRY', flow_name='flow1'
+        :return: value of counter
+        """
+        with self._lock:
+            return sum(value for (counter_name, counter_labels), value in self._counters.items()
+                       if counter_name == name and self._match(counter_labels, labels))
+
+    def event_count(self, event, **labels):
+        """Get number of traced events.
+
+        :param event: event or its name
+        :param labels: label values to filter on - flow_name, task_name or storage_name
+        :return: number of traced events
+        """
+        if not isinstance(event, str):
+            event = Trace.event2str(event)
+
+        return self.counter_value(_EVENTS_TOTAL, event=event, **labels)
+
+    def cache_hit_ratio(self, cache_name, **labels):
+        """Compute cache hit ratio.
+
+        :param cache_name: name of cache - 'node_state' or 'task_result'
+        :param labels: label values to filter on - flow_name, task_name or storage_name
+        :return: cache hit ratio, None if the cache was not used
+        """
+        hit_event, miss_event = _CACHE_EVENTS[cache_name]
+        hits = self.event_count(hit_event, **labels)
+        total = hits + self.event_count(miss_event, **labels)
+        return hits / total if total else None
+
+    def histogram_value(self, name, **labels):
+        """Get histogram merged over all label values that are not stated.
+
+        :param name: name of histogram, e.g. selinon_task_duration_seconds
+        :param labels: label values to filter on, e.g. task_name='Task1'
+        :return: a dict with cumulative bucket counts (a list of tuples upper bound and count), sum and count
+        """
+        merged = _Histogram(self.buckets)
+        with self._lock:
+            for (histogram_name, histogram_labels), histogram in self._histograms.items():
+                if histogram_name == name and self._match(histogram_labels, labels):
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.sum += histogram.sum
+                    merged.count += histogram.count
+
+        return merged.to_dict()
+
+    def snapshot(self):
+        """Get all metrics computed so far.
+
+        :return: a dict with lists of counters and histograms, each entry states its name, labels and value
+        """
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [{'name': name, 'labels': dict(labels), 'value': histogram.to_dict()}
+                               for (name, labels), histogram in self._histograms.items()]
+            }
+
+    def prometheus_text(self):
+        """Expose metrics in Prometheus text exposition format.
+
+        :return: metrics formatted in Prometheus text format
+        """
+        with self._lock:
+            counters = sorted(self._counters.items(), key=lambda item: str(item[0]))
+            histograms = sorted(((key, histogram.to_dict()) for key, histogram in self._histograms.items()),
+                                key=lambda item: str(item[0]))
+
+        lines = []
+        last_name = None
+        for (name, labels), value in counters:
+            if name != last_name:
+                lines.append('# HELP %s %s' % (name, _HELP[name]))
+                lines.append('# TYPE %s counter' % name)
+                last_name = name
+            lines.append('%s%s %d' % (name, _format_labels(labels), value))
+
+        for (name, labels), histogram in histograms:
+            if name != last_name:
+                lines.append('# HELP %s %s' % (name, _HELP[name]))
+                lines.append('# TYPE %s histogram' % name)
+                last_name = name
+            for upper_bound, count in histogram['buckets']:
+                upper_bound = '+Inf' if upper_bound == float('inf') else repr(upper_bound)
+                lines.append('%s_bucket%s %d' % (name, _format_labels(labels, (('le', upper_bound),)), count))
+            lines.append('%s_sum%s %r' % (name, _format_labels(labels), histogram['sum']))
+            lines.append('%s_count%s %d' % (name, _format_labels(labels), histogram['count']))
+
+        return '\n'.join(lines) + '\n'
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Migrations of configuration files."""
 
+from .migration_chain import MigrationChain
 from .migrator import Migrator
 from .tainted_flow_strategy import TaintedFlowStrategy
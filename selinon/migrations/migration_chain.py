@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Process-wide cache of parsed migrations.
+
+Dispatcher checks whether the received message needs to be migrated on each wakeup. Instead of listing the migration
+directory and parsing migration files each time, parsed migrations are kept per migration directory in the process and
+they are dropped once modification time of the migration directory changes (a migration file was added, removed or
+replaced). Note that editing a migration file in place without replacing it is not detected.
+
+Migrations of a flow from one migration version to the latest one are composed once - migrations that do not affect
+the flow are left out and consecutive migrations that only translate waiting edges are merged into a single
+translation. Migrations that can taint the flow are kept as separate steps as their outcome depends on the state of
+the flow.
+"""
+
+import logging
+import os
+import threading
+
+import yaml
+
+from selinon.errors import MigrationFlowFail
+from selinon.errors import MigrationFlowRetry
+from selinon.errors import MigrationSkew
+
+from .tainted_flow_strategy import TaintedFlowStrategy
+
+_logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class MigrationStep(object):
+    """A migration of a flow that can taint the flow."""
+
+    def __init__(self, migration_version, tainted_flow_strategy, flow_migration):
+        """Instantiate migration step.
+
+        :param migration_version: migration version the step migrates to
+        :param tainted_flow_strategy: strategy used if the flow is tainted
+        :type tainted_flow_strategy: selinon.migrations.tainted_flow_strategy.TaintedFlowStrategy
+        :param flow_migration: migration of the flow as stored in the migration file
+        """
+        self.migration_version = migration_version
+        self.tainted_flow_strategy = tainted_flow_strategy
+        self.translation = {int(edge_idx): new_edge_idx
+                            for edge_idx, new_edge_idx in flow_migration['translation'].items()}
+        tainted_edges = flow_migration['tainted_edges']
+        if isinstance(tainted_edges, list):
+            # old migration files list only indexes of tainted edges
+            tainted_edges = dict.fromkeys(tainted_edges)
+        self.tainted_edges = {int(edge_idx): tainted_edge for edge_idx, tainted_edge in tainted_edges.items()}
+        self.tainting_nodes = [(int(edge_idx), node_names, frozenset(node_names))
+                               for edge_idx, node_names in flow_migration['tainting_nodes'].items()]
+
+    def _raise_on_tainted_state(self, latest_migration_version, **kwargs):
+        """Raise exceptions signalizing tainted flow when needed."""
+        if self.tainted_flow_strategy == TaintedFlowStrategy.FAIL:
+            raise MigrationFlowFail("Migration requested flow to fail",
+                                    migration_version=self.migration_version,
+                                    latest_migration_version=latest_migration_version,
+                                    **kwargs)
+        elif self.tainted_flow_strategy == TaintedFlowStrategy.RETRY:
+            raise MigrationFlowRetry("Migration requested flow to retry",
+                                     migration_version=self.migration_version,
+                                     latest_migration_version=latest_migration_version,
+                                     **kwargs)
+
+    def apply(self, state, latest_migration_version):
+        """Migrate waiting edges of the flow state.
+
+        :param state: decoded flow state with waiting edges, modified in place
+        :param latest_migration_version: the latest migration version available on worker
+        :return: True if the flow was tainted
+        """
+        tainted = False
+        waiting_edges = []
+        for waiting_edge in state['waiting_edges']:
+            if waiting_edge in self.tainted_edges:
+                tainted = True
+                self._raise_on_tainted_state(latest_migration_version,
+                                             tainted_edge=self.tainted_edges[waiting_edge])
+
+            waiting_edge = self.translation.get(waiting_edge, waiting_edge)
+            # Remove edges that should be discarded (mapped to None)
+            if waiting_edge is not None:
+                waiting_edges.append(waiting_edge)
+
+        finished_nodes = state['finished_nodes'].keys()
+        for _, node_names, node_names_set in self.tainting_nodes:
+            if node_names_set and node_names_set.issubset(finished_nodes):
+                tainted = True
+                self._raise_on_tainted_state(latest_migration_version, tainting_nodes=node_names)
+
+        # Add edges that were added and should be triggered after the corresponding subset of active nodes finish.
+        active_nodes = {node['name'] for node in state['active_nodes']}
+        for edge_idx, _, node_names_set in self.tainting_nodes:
+            if node_names_set.issubset(active_nodes) and edge_idx not in waiting_edges:
+                waiting_edges.append(edge_idx)
+
+        state['waiting_edges'] = waiting_edges
+        return tainted
+
+
+class ComposedMigration(object):
+    """Migration of a flow from a migration version to the latest migration version."""
+
+    def __init__(self, steps, latest_migration_version):
+        """Compose migration steps, merge consecutive translation-only steps into a single translation.
+
+        :param steps: a list of MigrationStep instances for migrations affecting the flow, ordered by version
+        :param latest_migration_version: the latest migration version available on worker
+        """
+        self.latest_migration_version = latest_migration_version
+        # a list of translations (dicts) and MigrationStep instances
+        self.segments = []
+
+        translation = None
+        for step in steps:
+            if step.tainted_edges or step.tainting_nodes:
+                if translation:
+                    self.segments.append(translation)
+                translation = None
+                self.segments.append(step)
+            else:
+                translation = self._compose_translations(translation or {}, step.translation)
+
+        if translation:
+            self.segments.append(translation)
+
+    @staticmethod
+    def _compose_translations(first, second):
+        """Compose two translations of edges, edges not stated in a translation are kept.
+
+        :param first: translation applied first
+        :param second: translation applied on the result of the first one
+        :return: a single translation equal to applying both translations
+        """
+        result = {}
+        for edge_idx in set(first.keys()) | set(second.keys()):
+            new_edge_idx = first.get(edge_idx, edge_idx)
+            if new_edge_idx is not None:
+                new_edge_idx = second.get(new_edge_idx, new_edge_idx)
+
+            if new_edge_idx != edge_idx:
+                result[edge_idx] = new_edge_idx
+
+        return result
+
+    def apply(self, state):
+        """Migrate decoded flow state to the latest migration version.
+
+        :param state: decoded flow state, modified in place
+        :return: migrated state and information whether the flow was tainted
+        :rtype: tuple
+        """
+        tainted = False
+        for segment in self.segments:
+            if not state.get('waiting_edges'):
+                # Flow not run yet or no edges to wait for
+                break
+
+            if isinstance(segment, dict):
+                waiting_edges = (segment.get(edge_idx, edge_idx) for edge_idx in state['waiting_edges'])
+                state['waiting_edges'] = [edge_idx for edge_idx in waiting_edges if edge_idx is not None]
+            else:
+                tainted = segment.apply(state, self.latest_migration_version) or tainted
+
+        return state, tainted
+
+
+class MigrationChain(object):
+    """Parsed migrations present in a migration directory."""
+
+    # migration directory -> MigrationChain
+    _cache = {}
+
+    def __init__(self, migration_dir, mtime, latest_migration_version):
+        """Instantiate migration chain, migration files are parsed on demand.
+
+        :param migration_dir: a path to directory containing migration files
+        :param mtime: modification time of the migration directory when it was listed
+        :param latest_migration_version: the latest migration version present in the migration directory
+        """
+        self.migration_dir = migration_dir
+        self.mtime = mtime
+        self.latest_migration_version = latest_migration_version
+        self._migration_specs = {}
+        self._composed = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def migration_file_name(migration_version):
+        """Create migration file name based on migration version."""
+        return str(migration_version) + ".json"
+
+    @staticmethod
+    def get_latest_migration_version(migration_dir):
+        """Get latest migration number based on migration files present in the migration directory.
+
+        :param migration_dir: a path to directory containing migration files
+        :return: latest migration number
+        """
+        latest_migration_number = 0
+        for file_name in os.listdir(migration_dir):
+            file_path = os.path.join(migration_dir, file_name)
+            if not os.path.isfile(file_path) or not file_name.endswith('.json') or file_name[0] == '.':
+                _logger.debug("Skipping %r, not a file nor JSON file (or hidden file)", file_path)
+                continue
+
+            migration_number = file_name[:-len('.json')]
+            try:
+                migration_number = int(migration_number)
+            except ValueError as exc:
+                raise MigrationSkew("Unable to parse previous migrations, file name %r does not correspond "
+                                    "to migration file - migration files should be named numerically"
+                                    % file_path, available_migration_version=None) from exc
+
+            latest_migration_number = max(migration_number, latest_migration_number)
+
+        return latest_migration_number
+
+    @classmethod
+    def get(cls, migration_dir):
+        """Get migrations for the given migration directory, reuse parsed migrations if the directory did not change.
+
+        :param migration_dir: a path to directory containing migration files
+        :return: migration chain for the migration directory
+        :rtype: MigrationChain
+        """
+        mtime = os.stat(migration_dir).st_mtime_ns
+        chain = cls._cache.get(migration_dir)
+
+        if chain is None or chain.mtime != mtime:
+            _logger.debug("Loading migrations from %r", migration_dir)
+            chain = cls(migration_dir, mtime, cls.get_latest_migration_version(migration_dir))
+            cls._cache[migration_dir] = chain
+
+        return chain
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop all parsed migrations."""
+        cls._cache.clear()
+
+    def _get_migration_spec(self, migration_version):
+        """Get parsed migration file for the given migration version.
+
+        :param migration_version: migration version
+        :return: parsed content of the migration file
+        """
+        migration_spec = self._migration_specs.get(migration_version)
+        if migration_spec is not None:
+            return migration_spec
+
+        migration_path = os.path.join(self.migration_dir, self.migration_file_name(migration_version))
+        try:
+            with open(migration_path, 'r') as migration_file:
+                migration_spec = yaml.safe_load(migration_file)
+        except FileNotFoundError as exc:
+            raise MigrationSkew("Migration file %r not found, cannot perform migrations" % migration_path,
+                                available_migration_version=migration_version) from exc
+
+        self._migration_specs[migration_version] = migration_spec
+        return migration_spec
+
+    def compose(self, flow_name, migration_version):
+        """Compose migrations of a flow from the given migration version to the latest migration version.
+
+        :param flow_name: name of flow to be migrated
+        :param migration_version: migration version of the flow state
+        :return: composed migration
+        :rtype: ComposedMigration
+        """
+        key = (migration_version, flow_name)
+        composed = self._composed.get(key)
+        if composed is not None:
+            return composed
+
+        with self._lock:
+            steps = []
+            for version in range(migration_version + 1, self.latest_migration_version + 1):
+                migration_spec = self._get_migration_spec(version)
+                flow_migration = migration_spec['migration'].get(flow_name)
+                if not flow_migration:
+                    # Nothing to do, no changes in flow in the migration
+                    continue
+
+                strategy = TaintedFlowStrategy.get_option_by_name(migration_spec['tainted_flow_strategy'])
+                steps.append(MigrationStep(version, strategy, flow_migration))
+
+            composed = ComposedMigration(steps, self.latest_migration_version)
+            self._composed[key] = composed
+
+        return composed
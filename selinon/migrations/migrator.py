@@ -13,16 +13,15 @@ import platform
 
 import yaml
 
-from selinon.errors import MigrationFlowFail
-from selinon.errors import MigrationFlowRetry
 from selinon.errors import MigrationNotNeeded
 from selinon.errors import MigrationSkew
 from selinon.errors import RequestError
 from selinon.errors import UnknownError
 from selinon.helpers import dict2json
 from selinon.predicate import Predicate
+from selinon.state_encoding import CompactStateEncoder
 
-from .tainted_flow_strategy import TaintedFlowStrategy
+from .migration_chain import MigrationChain
 
 _logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -86,29 +85,12 @@ class Migrator(object):
 
         :return: latest migration number
         """
-        latest_migration_number = 0
-        for file_name in os.listdir(self.migration_dir):
-            file_path = os.path.join(self.migration_dir, file_name)
-            if not os.path.isfile(file_path) or not file_name.endswith('.json') or file_name[0] == '.':
-                _logger.debug("Skipping %r, not a file nor JSON file (or hidden file)", file_path)
-                continue
-
-            migration_number = file_name[:-len('.json')]
-            try:
-                migration_number = int(migration_number)
-            except ValueError as exc:
-                raise MigrationSkew("Unable to parse previous migrations, file name %r does not correspond "
-                                    "to migration file - migration files should be named numerically"
-                                    % file_path, available_migration_version=None) from exc
-
-            latest_migration_number = max(migration_number, latest_migration_number)
-
-        return latest_migration_number
+        return MigrationChain.get_latest_migration_version(self.migration_dir)
 
     @staticmethod
     def _migration_file_name(migration_version):
         """Create migration file name based on migration version."""
-        return str(migration_version) + ".json"
+        return MigrationChain.migration_file_name(migration_version)
 
     def _get_new_migration_file_name(self):
         """Generate a new migration file name.
@@ -366,69 +348,6 @@ class Migrator(object):
         self._report_diff_flow()
         return self._calculate_migrations(tainted_flow_strategy, add_meta)
 
-    @staticmethod
-    def _do_migration(migration_spec, flow_name, state, migration_version, latest_migration_version):
-        """Do single migration of message based on migration definition.
-
-        :param migration_spec: migration specification to be used
-        :param flow_name: a name of flow for which the migration is perfomed
-        :param state: the current flow state
-        :param migration_version: the current migration version
-        :param latest_migration_version: the latest migration version available on worker
-        :return:
-        """
-        # pylint: disable=too-many-locals
-        def raise_on_tainted_state(**kwargs):
-            """Raise exceptions signalizing tainted flow when needed."""
-            if tainted_flow_strategy == TaintedFlowStrategy.FAIL:
-                raise MigrationFlowFail("Migration requested flow to fail",
-                                        migration_version=migration_version,
-                                        latest_migration_version=latest_migration_version,
-                                        **kwargs)
-            elif tainted_flow_strategy == TaintedFlowStrategy.RETRY:
-                raise MigrationFlowRetry("Migration requested flow to retry",
-                                         migration_version=migration_version,
-                                         latest_migration_version=latest_migration_version,
-                                         **kwargs)
-
-        flow_migration = migration_spec['migration'].get(flow_name)
-        if not flow_migration:
-            # Nothing to do, no changes in flow in the migration
-            return state, False
-
-        waiting_edges = state.get('waiting_edges', [])
-        if not waiting_edges:
-            # Flow not run yet, no waiting edges
-            return state, False
-
-        tainted_flow_strategy = TaintedFlowStrategy.get_option_by_name(migration_spec['tainted_flow_strategy'])
-        tainted = False
-        for idx, waiting_edge in enumerate(waiting_edges):
-            if str(waiting_edge) in flow_migration['tainted_edges'].keys():
-                tainted = True
-                raise_on_tainted_state(tainted_edge=flow_migration['tainted_edges'][str(waiting_edge)])
-
-            if str(waiting_edge) in flow_migration['translation']:
-                state['waiting_edges'][idx] = flow_migration['translation'][str(waiting_edge)]
-
-        # Remove edges that should be discarded (mapped to None)
-        state['waiting_edges'] = list(edge for edge in state['waiting_edges'] if edge is not None)
-
-        finished_and_active_nodes = set(node_name for node_name in state['finished_nodes'].keys())
-        for tainting_nodes in flow_migration['tainting_nodes'].values():
-            if tainting_nodes and set(tainting_nodes).issubset(finished_and_active_nodes):
-                tainted = True
-                raise_on_tainted_state(tainting_nodes=tainting_nodes)
-
-        # Add edges that were added and should be triggered after the corresponding subset of active nodes finish.
-        active_nodes = {node['name'] for node in state['active_nodes']}
-        for edge_idx, node_names in flow_migration['tainting_nodes'].items():
-            edge_idx = int(edge_idx)
-            if set(node_names).issubset(active_nodes) and edge_idx not in state['waiting_edges']:
-                state['waiting_edges'].append(edge_idx)
-
-        return state, tainted
-
     def perform_migration(self, flow_name, state, migration_version):
         """Perform actual migration based on message received.
 
@@ -441,7 +360,8 @@ class Migrator(object):
         if not self.migration_dir:
             raise UnknownError("No migration directory provided on instantiation")
 
-        latest_migration_version = self._get_latest_migration_version()
+        migration_chain = MigrationChain.get(self.migration_dir)
+        latest_migration_version = migration_chain.latest_migration_version
         if migration_version is None or state is None:
             # This means that this message is consumed for the first time, adjust migration based on migration
             # version of the current worker.
@@ -457,26 +377,7 @@ class Migrator(object):
                                 % (migration_version, latest_migration_version),
                                 available_migration_version=latest_migration_version)
 
-        tainted = False
-        current_migration_version = migration_version
-        while current_migration_version != latest_migration_version:
-            current_migration_version += 1
-            current_migration_path = os.path.join(self.migration_dir,
-                                                  self._migration_file_name(current_migration_version))
-
-            try:
-                with open(current_migration_path, 'r') as migration_file:
-                    migration_spec = yaml.safe_load(migration_file)
-            except FileNotFoundError as exc:
-                raise MigrationSkew("Migration file %r not found, cannot perform migrations"
-                                    % current_migration_path,
-                                    available_migration_version=current_migration_version) from exc
-
-            state, taints_flow = self._do_migration(migration_spec,
-                                                    flow_name,
-                                                    state,
-                                                    current_migration_version,
-                                                    latest_migration_version)
-            tainted = tainted or taints_flow
-
-        return state, current_migration_version, tainted
+        # Migrations operate on decoded state, state is encoded again by dispatcher if configured so
+        state = CompactStateEncoder.decode(state)
+        state, tainted = migration_chain.compose(flow_name, migration_version).apply(state)
+        return state, latest_migration_version, tainted
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Keep large flow arguments out of broker messages.
+
+Flow arguments (node_args) are by default passed in each message - when a task or a subflow is scheduled, on each
+dispatcher retry and on each task retry. If flow arguments are large, they are serialized over and over again. Using
+NodeArgsStore, flow arguments larger than the given threshold are stored once in a storage and messages carry only a
+reference - a digest of the serialized flow arguments. References are resolved only when flow arguments are really
+needed (task is run, condition is evaluated) and resolved flow arguments are cached in the worker:
+
+.. code-block:: python
+
+  from selinon import Config
+  from selinon import NodeArgsStore
+
+  # Storage1 is a storage stated in YAML configuration
+  Config.set_node_args_store(NodeArgsStore('Storage1', threshold=64*1024))
+
+Make sure the configuration is the same on all workers and on the client side that schedules flows.
+
+Stored flow arguments are never deleted by Selinon. If the storage expires records (e.g. a TTL configured for a Redis
+storage), make sure the TTL is longer than the longest flow run - a reference that outlived its record cannot be
+resolved on a worker that does not have flow arguments cached. Flow arguments are written to the storage each time a
+flow is scheduled with them (or they are taken from the first task, see node_args_from_first), even if the worker has
+them cached, so an expired record is recreated for each new flow. The write is content addressed - the same flow
+arguments are always stored under the same key - so writing them again is safe.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+
+from .caches import LRU
+from .config import Config
+from .errors import CacheMissError
+from .errors import ConfigurationError
+from .storage_pool import StoragePool
+from .trace import Trace
+
+
+class NodeArgsStore(object):
+    """Store large flow arguments in a storage and pass only references to them in messages."""
+
+    # Key in a dict that marks the dict as a reference to stored flow arguments
+    REFERENCE_KEY = 'selinon_node_args_ref'
+    # Task name under which flow arguments are stored in the storage
+    STORAGE_TASK_NAME = 'selinon_node_args'
+
+    def __init__(self, storage_name, threshold=64 * 1024, cache_size=16):
+        """Instantiate node args store.
+
+        :param storage_name: name of storage (as stated in YAML configuration) used to store flow arguments
+        :param threshold: size of JSON-serialized flow arguments in bytes from which flow arguments are stored
+        :param cache_size: number of resolved flow arguments cached in the worker
+        """
+        self.storage_name = storage_name
+        self.threshold = threshold
+        self._cache = LRU(max_cache_size=cache_size)
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def is_reference(cls, node_args):
+        """Check whether the given flow arguments are a reference to stored flow arguments.
+
+        :param node_args: flow arguments as passed in a message
+        :return: True if node_args is a reference
+        """
+        return isinstance(node_args, dict) and len(node_args) == 2 and cls.REFERENCE_KEY in node_args
+
+    def _cache_get(self, flow_name, digest):
+        """Get resolved flow arguments from worker cache.
+
+        :param flow_name: name of flow under which flow arguments are stored
+        :param digest: digest of flow arguments
+        :return: tuple - cached flow arguments and a flag whether they were found in cache
+        """
+        with self._cache_lock:
+            try:
+                return self._cache.get((flow_name, digest)), True
+            except CacheMissError:
+                return None, False
+
+    def _cache_add(self, flow_name, digest, node_args):
+        """Add resolved flow arguments to worker cache.
+
+        :param flow_name: name of flow under which flow arguments are stored
+        :param digest: digest of flow arguments
+        :param node_args: flow arguments to be cached
+        """
+        with self._cache_lock:
+            self._cache.add((flow_name, digest), copy.deepcopy(node_args))
+
+    def store(self, flow_name, node_args):
+        """Store flow arguments if they are large enough and return a reference to them.
+
+        :param flow_name: name of flow to which flow arguments are passed
+        :param node_args: flow arguments
+        :return: reference to flow arguments or flow arguments if they are not large enough to be stored
+        """
+        if node_args is None or self.is_reference(node_args):
+            return node_args
+
+        serialized = json.dumps(node_args, sort_keys=True).encode('utf-8')
+        if len(serialized) < self.threshold:
+            return node_args
+
+        digest = hashlib.sha256(serialized).hexdigest()
+        reference = {self.REFERENCE_KEY: digest, 'flow_name': flow_name}
+
+        # Do not skip the write based on worker cache - the record could expire in the storage meanwhile, see module
+        # documentation. The write is content addressed, storing the same flow arguments again is idempotent.
+        storage = StoragePool.get_connected_storage(self.storage_name)
+        storage.store(None, flow_name, self.STORAGE_TASK_NAME, digest, node_args)
+        self._cache_add(flow_name, digest, node_args)
+        Trace.log(Trace.NODE_ARGS_STORE, {
+            'flow_name': flow_name,
+            'storage_name': self.storage_name,
+            'digest': digest,
+            'size': len(serialized)
+        })
+
+        return reference
+
+    def resolve(self, node_args):
+        """Resolve reference to flow arguments.
+
+        :param node_args: flow arguments as passed in a message - a reference or flow arguments themselves
+        :return: flow arguments
+        """
+        if not self.is_reference(node_args):
+            return node_args
+
+        digest = node_args[self.REFERENCE_KEY]
+        result, cached = self._cache_get(node_args['flow_name'], digest)
+        if cached:
+            # Tasks can modify flow arguments, never hand out the cached instance
+            return copy.deepcopy(result)
+
+        Trace.log(Trace.NODE_ARGS_RETRIEVE, {
+            'flow_name': node_args['flow_name'],
+            'storage_name': self.storage_name,
+            'digest': digest
+        })
+        storage = StoragePool.get_connected_storage(self.storage_name)
+        result = storage.retrieve(node_args['flow_name'], self.STORAGE_TASK_NAME, digest)
+        self._cache_add(node_args['flow_name'], digest, result)
+
+        return result
+
+
+def store_node_args(flow_name, node_args):
+    """Replace large flow arguments with a reference if configured to do so, see NodeArgsStore.
+
+    :param flow_name: name of flow to which flow arguments are passed
+    :param node_args: flow arguments
+    :return: reference to flow arguments or flow arguments themselves
+    """
+    if Config.node_args_store is None:
+        return node_args
+
+    return Config.node_args_store.store(flow_name, node_args)
+
+
+def resolve_node_args(node_args):
+    """Resolve flow arguments that can be a reference to stored flow arguments, see NodeArgsStore.
+
+    :param node_args: flow arguments as passed in a message
+    :return: flow arguments
+    """
+    if Config.node_args_store is None:
+        if NodeArgsStore.is_reference(node_args):
+            raise ConfigurationError("Flow arguments were passed as a reference %r but node args store is not "
+                                     "configured, see Config.set_node_args_store()" % node_args)
+        return node_args
+
+    return Config.node_args_store.resolve(node_args)
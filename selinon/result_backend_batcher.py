@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Resolve states of multiple nodes in a few calls to the result backend.
+
+Dispatcher checks state of all active nodes on each wakeup. By default each node is checked by instantiating
+Celery's AsyncResult which means a separate round trip to the result backend for each active node. Using
+ResultBackendBatcher, dispatcher asks for states of all active nodes at once using a multi-get function:
+
+.. code-block:: python
+
+  from selinon import Config
+  from selinon import ResultBackendBatcher
+
+  Config.set_result_backend_batcher(ResultBackendBatcher())
+
+A multi-get function accepts a list of node ids and returns a dict mapping node id to Celery-like task meta
+(a dict with keys `status`, `result` and `traceback`). Nodes that are not present in the returned dict are
+considered as pending.
+"""
+
+from .config import Config
+
+# Mirror Celery's states so we do not require Celery to be installed
+SUCCESS = 'SUCCESS'
+FAILURE = 'FAILURE'
+PENDING = 'PENDING'
+
+
+def celery_multi_get(node_ids):
+    """Retrieve task meta for the given nodes from Celery result backend, use MGET if the backend supports it.
+
+    :param node_ids: a list of node ids for which task meta should be retrieved
+    :return: a dict mapping node id to task meta
+    """
+    backend = Config.celery_app.backend
+    result = {}
+
+    if hasattr(backend, 'mget') and hasattr(backend, 'get_key_for_task'):
+        # key-value store backends (e.g. Redis) - one round trip for all nodes
+        keys = [backend.get_key_for_task(node_id) for node_id in node_ids]
+        values = backend.mget(keys)
+        if isinstance(values, dict):
+            values = [values.get(key) for key in keys]
+
+        for node_id, value in zip(node_ids, values):
+            if value is not None:
+                result[node_id] = backend.decode_result(value)
+    else:
+        for node_id in node_ids:
+            result[node_id] = backend.get_task_meta(node_id)
+
+    return result
+
+
+class BatchedAsyncResult(object):
+    """A snapshot of node state as retrieved by ResultBackendBatcher, mimics Celery's AsyncResult interface."""
+
+    def __init__(self, task_id, state, result=None, traceback=None):
+        """Instantiate result snapshot.
+
+        :param task_id: id of the task (node id)
+        :param state: state of the task as stated in task meta
+        :param result: task result or exception raised in the task
+        :param traceback: traceback of failed task
+        """
+        self.task_id = task_id
+        self.state = state
+        self._result = result
+        self._traceback = traceback
+
+    def __repr__(self):
+        """Represent result for logs/debug."""
+        return "%s(%s, %s)" % (self.__class__.__name__, self.task_id, self.state)
+
+    def successful(self):
+        """Check for success.
+
+        :return: True if task succeeded
+        """
+        return self.state == SUCCESS
+
+    def failed(self):
+        """Check for failure.
+
+        :return: True if task failed
+        """
+        return self.state == FAILURE
+
+    @property
+    def result(self):
+        """Get result of the task (or exception that was raised).
+
+        :return: task result
+        """
+        return self._result
+
+    @property
+    def traceback(self):
+        """Get traceback of the failed task.
+
+        :return: traceback of the task
+        """
+        return self._traceback
+
+
+class ResultBackendBatcher(object):
+    """Resolve states of multiple nodes in one or a few calls to the result backend."""
+
+    DEFAULT_BATCH_SIZE = 500
+
+    def __init__(self, multi_get=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Instantiate batcher.
+
+        :param multi_get: a function that accepts list of node ids and returns task meta for them,
+                          Celery result backend is used if omitted
+        :param batch_size: maximum number of node ids passed to one multi_get call
+        """
+        assert batch_size > 0  # nosec
+        self.multi_get = multi_get or celery_multi_get
+        self.batch_size = batch_size
+
+    def fetch(self, node_ids):
+        """Retrieve states of the given nodes.
+
+        :param node_ids: a list of node ids for which states should be retrieved
+        :return: a dict mapping node id to BatchedAsyncResult
+        """
+        result = {}
+
+        for i in range(0, len(node_ids), self.batch_size):
+            batch = node_ids[i:i + self.batch_size]
+            task_metas = self.multi_get(batch)
+
+            for node_id in batch:
+                task_meta = task_metas.get(node_id) or {}
+                result[node_id] = BatchedAsyncResult(
+                    node_id,
+                    task_meta.get('status', PENDING),
+                    task_meta.get('result'),
+                    task_meta.get('traceback')
+                )
+
+        return result
+
+
+class InMemoryResultBackend(object):
+    """A result backend stand-in that keeps node states in memory - suitable for testing without Redis."""
+
+    def __init__(self):
+        """Initialize an empty backend."""
+        self._task_metas = {}
+
+    def set_successful(self, task_id, result=None):
+        """Mark task as successful.
+
+        :param task_id: id of task to be marked
+        :param result: result of the task
+        """
+        self._task_metas[task_id] = {'status': SUCCESS, 'result': result, 'traceback': None}
+
+    def set_failed(self, task_id, exc=None, traceback=None):
+        """Mark task as failed.
+
+        :param task_id: id of task to be marked
+        :param exc: exception that was raised in the task
+        :param traceback: traceback of the failure
+        """
+        self._task_metas[task_id] = {'status': FAILURE, 'result': exc, 'traceback': traceback}
+
+    def forget(self, task_id):
+        """Remove any information about task, task is reported as pending afterwards.
+
+        :param task_id: id of task to be forgotten
+        """
+        self._task_metas.pop(task_id, None)
+
+    def mget(self, node_ids):
+        """Multi-get function that can be passed to ResultBackendBatcher.
+
+        :param node_ids: a list of node ids for which task meta should be retrieved
+        :return: a dict mapping node id to task meta
+        """
+        return {node_id: self._task_metas[node_id] for node_id in node_ids if node_id in self._task_metas}
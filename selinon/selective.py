@@ -9,12 +9,17 @@
 from collections import deque
 import copy
 from itertools import chain
+import threading
 
 from .config import Config
+from .errors import CacheMissError
 from .errors import SelectiveNoPathError
 
+# guards Config.selective_runs_cache that is shared across dispatcher threads
+_selective_runs_cache_lock = threading.Lock()
 
-def _get_all_subflows_dict(flow_name):
+
+def _get_all_subflows_dict(edge_table, flow_name):
     """Get all subflows for the given flow name, the result is stored in a dict.
 
     The resulting dict has keys that correspond to all transitive subflows for flow flow_name and values for a subflow
@@ -38,6 +43,7 @@ def _get_all_subflows_dict(flow_name):
     Read as: I can get directly to flow <key> from flows <values>.
 
 
+    :param edge_table: edge table to be used, edges are keyed by flow name
     :param flow_name: a flow name for which all subflows should be computed
     :return: dict representing all subflows and direct paths for the given subflow
     """
@@ -47,9 +53,9 @@ def _get_all_subflows_dict(flow_name):
     stack.append(flow_name)
     while stack:
         inspected_flow_name = stack.pop()
-        for edge in Config.edge_table[inspected_flow_name]:
+        for edge in edge_table[inspected_flow_name]:
             for node_name in edge['to']:
-                if Config.is_flow(node_name):
+                if node_name in edge_table:
                     if node_name not in result:
                         result[node_name] = set()
                         stack.append(node_name)
@@ -80,38 +86,72 @@ def _normalize_path(paths):
     return result
 
 
-def _compute_paths(flow_name, task_name):
+def _backward_reachable(edges, incoming, node_name, usable_edges):
+    """Compute nodes from which the given node can be reached using only usable edges.
+
+    :param edges: edges of the flow
+    :param incoming: a dict mapping node name to indexes of edges that lead to the node
+    :param node_name: name of node from which traversal should be started
+    :param usable_edges: a set of indexes of edges that can be used
+    :return: a set of node names including node_name
+    """
+    result = {node_name}
+    stack = deque([node_name])
+
+    while stack:
+        name = stack.pop()
+        for edge_idx in incoming.get(name, []):
+            if edge_idx in usable_edges:
+                for source_name in edges[edge_idx]['from']:
+                    if source_name not in result:
+                        result.add(source_name)
+                        stack.append(source_name)
+
+    return result
+
+
+def _compute_paths(edge_table, flow_name, task_name):
     """Compute all paths in a flow to a node.
 
+    A node can be reached if all source nodes of some edge that leads to the node can be reached (edges that start
+    the flow have no source nodes, cycles are allowed). Instead of enumerating all paths, we compute the greatest set
+    of nodes that can be reached from each other and collect edges among them. This avoids exponential explosion
+    on flows with diamonds and cycles.
+
+    :param edge_table: edge table to be used, edges are keyed by flow name
     :param flow_name: name of flow that should be traversed
     :param task_name: a name of node that should be visited
-    :return: a list of paths that lead to the node that should be visited
+    :return: a dict mapping edge index to a list of destination nodes that lead to the node that should be visited
     """
-    result = []
-    stack = deque()
-    stack.append(({task_name}, set(), {}))
-
-    while stack:
-        to_expand, visited, expanded = stack.pop()
+    edges = edge_table[flow_name]
+    incoming = {}
+    for edge_idx, edge in enumerate(edges):
+        for name in edge['to']:
+            incoming.setdefault(name, []).append(edge_idx)
+
+    # Nodes that could be on a path to the desired node, remove nodes that cannot be reached at all
+    candidates = _backward_reachable(edges, incoming, task_name, set(range(len(edges))))
+    change = True
+    while change:
+        change = False
+        for name in list(candidates):
+            if not any(candidates.issuperset(edges[edge_idx]['from']) for edge_idx in incoming.get(name, [])):
+                candidates.remove(name)
+                change = True
 
-        for name in to_expand:
-            for edge_idx, edge in enumerate(Config.edge_table[flow_name]):
-                if name in edge['to'] and (edge_idx not in expanded.keys() or name not in expanded[edge_idx]):
-                    new_expanded = copy.copy(expanded)
-                    if edge_idx not in new_expanded:
-                        new_expanded[edge_idx] = [name]
-                    else:
-                        new_expanded[edge_idx].append(name)
+    if task_name not in candidates:
+        return {}
 
-                    new_visited = visited | {name}
-                    new_to_expand = to_expand | set(edge['from']) - {name}
+    usable_edges = {edge_idx for edge_idx, edge in enumerate(edges) if candidates.issuperset(edge['from'])}
+    nodes = _backward_reachable(edges, incoming, task_name, usable_edges)
 
-                    if new_visited == new_to_expand:
-                        result.append(new_expanded)
-                    else:
-                        stack.append((new_to_expand, new_visited, new_expanded))
+    result = {}
+    for edge_idx in sorted(usable_edges):
+        nodes_to = [name for name in edges[edge_idx]['to'] if name in nodes]
+        if nodes_to:
+            result[edge_idx] = nodes_to
 
-    return _normalize_path(result)
+    return result
 
 
 def _raise_for_result_check(task_names, path):
@@ -132,9 +172,10 @@ def _raise_for_result_check(task_names, path):
             raise SelectiveNoPathError("No path to node '%s' found" % node)
 
 
-def _compute_subsequent_edges(flow_name, node_names):
+def _compute_subsequent_edges(edge_table, flow_name, node_names):
     """Compute nodes that are subsequent nodes based on node_names.
 
+    :param edge_table: edge table to be used, edges are keyed by flow name
     :param flow_name: name of the flow in which subsequent nodes should be found
     :param node_names: a list of nodes that were run, note that they does not need to be necessarily stated in flow_name
     :return: a list of tasks that follow after node_names execution
@@ -145,7 +186,7 @@ def _compute_subsequent_edges(flow_name, node_names):
     change = True
     while change:
         change = False
-        for edge_idx, edge in enumerate(Config.edge_table[flow_name]):
+        for edge_idx, edge in enumerate(edge_table[flow_name]):
             if edge['from'] and edge_idx not in result and set(edge['from']).issubset(desired_nodes):
                 result.append(edge_idx)
                 desired_nodes |= set(edge['to'])
@@ -154,9 +195,10 @@ def _compute_subsequent_edges(flow_name, node_names):
     return result
 
 
-def _compute_traversals(flow_name, task_names, follow_subflows=True):
+def _compute_traversals(edge_table, flow_name, task_names, follow_subflows=True):
     """Compute all traversals/paths to nodes from a flow.
 
+    :param edge_table: edge table to be used, edges are keyed by flow name
     :param flow_name: a name of flow to start traversing with
     :param task_names: a list of nodes we want to visit/traverse
     :param follow_subflows: if True, we also inspect transitively all subflows from flow_name
@@ -174,14 +216,14 @@ def _compute_traversals(flow_name, task_names, follow_subflows=True):
         stack.append((flow_name, task_name))
 
     if follow_subflows:
-        subflows_dict = _get_all_subflows_dict(flow_name)
+        subflows_dict = _get_all_subflows_dict(edge_table, flow_name)
         for subflow_name in subflows_dict.keys():  # pylint: disable=consider-iterating-dictionary
             for task_name in task_names:
                 stack.append((subflow_name, task_name))
 
     while stack:
         flow, node = stack.pop()
-        paths = _compute_paths(flow, node)
+        paths = _compute_paths(edge_table, flow, node)
 
         if flow != flow_name and paths:
             for parent_flow in subflows_dict[flow]:
@@ -198,16 +240,36 @@ def _compute_traversals(flow_name, task_names, follow_subflows=True):
     return result
 
 
-def compute_selective_run(flow_name, task_names, follow_subflows=False, run_subsequent=False):
-    """Compute selective run for a flow.
+def selective_run_key(flow_name, task_names, follow_subflows=False, run_subsequent=False):
+    """Construct a key under which the computed selective run is cached.
+
+    :param flow_name: a name of the flow that should be run
+    :param task_names: a list of tasks that should be run
+    :param follow_subflows: apply selective run to all subflows (transitively)
+    :param run_subsequent: run tasks that depend on task_names
+    :return: a hashable key for the given selective run
+    """
+    if not isinstance(task_names, (list, tuple)):
+        task_names = [task_names]
+
+    if isinstance(run_subsequent, (list, tuple)):
+        run_subsequent = tuple(run_subsequent)
+
+    return flow_name, tuple(task_names), bool(follow_subflows), run_subsequent
 
+
+def precompute_selective_run(edge_table, flow_name, task_names, follow_subflows=False, run_subsequent=False):
+    """Compute selective run for a flow based on the given edge table.
+
+    :param edge_table: edge table to be used, edges are keyed by flow name
     :param flow_name: a name of the flow that should be run
     :param task_names: a list of tasks that should be run
     :param follow_subflows: apply selective run to all subflows (transitively)
     :param run_subsequent: run tasks that depend on task_names
     :return: computed selective run dictionary
     """
-    traversals = _compute_traversals(flow_name, task_names, follow_subflows)
+    # pylint: disable=too-many-arguments
+    traversals = _compute_traversals(edge_table, flow_name, task_names, follow_subflows)
     result = {
         'task_names': task_names,
         'waiting_edges_subset': traversals
@@ -220,7 +282,7 @@ def compute_selective_run(flow_name, task_names, follow_subflows=False, run_subs
             subsequent_flows = traversals.keys()
 
         for flow in subsequent_flows:
-            subsequent_edges = _compute_subsequent_edges(flow, task_names)
+            subsequent_edges = _compute_subsequent_edges(edge_table, flow, task_names)
             for idx in subsequent_edges:
                 # We need to make sure that we start all nodes so we have fire edge when we visit it twice due to cycles
                 #
@@ -232,6 +294,38 @@ def compute_selective_run(flow_name, task_names, follow_subflows=False, run_subs
                 # T2 should be run, if we get minimal path to T2, there will be no T3, but since we have edge T2->T1, we
                 # need to start T3 as subsequent.
                 #
-                traversals[flow][idx] = Config.edge_table[flow][idx]['to']
+                traversals[flow][idx] = edge_table[flow][idx]['to']
 
     return result
+
+
+def compute_selective_run(flow_name, task_names, follow_subflows=False, run_subsequent=False):
+    """Compute selective run for a flow.
+
+    Selective runs for selective subflow edges are precomputed in the generated config (Config.selective_runs), other
+    selective runs are computed on demand and kept in a bounded cache (Config.selective_runs_cache), so repeated
+    selective runs do not traverse the flow graph again.
+
+    :param flow_name: a name of the flow that should be run
+    :param task_names: a list of tasks that should be run
+    :param follow_subflows: apply selective run to all subflows (transitively)
+    :param run_subsequent: run tasks that depend on task_names
+    :return: computed selective run dictionary
+    """
+    key = selective_run_key(flow_name, task_names, follow_subflows, run_subsequent)
+    selective = Config.selective_runs.get(key)
+
+    if selective is None:
+        with _selective_runs_cache_lock:
+            try:
+                selective = Config.selective_runs_cache.get(key)
+            except CacheMissError:
+                pass
+
+    if selective is None:
+        selective = precompute_selective_run(Config.edge_table, flow_name, task_names, follow_subflows, run_subsequent)
+        with _selective_runs_cache_lock:
+            Config.selective_runs_cache.add(key, selective)
+
+    # Selective run is passed to dispatcher and could be modified, do not touch the cached one
+    return copy.deepcopy(selective)
@@ -13,6 +13,7 @@ from .celery import AsyncResult
 from .errors import NoParentNodeError
 from .errors import RequestError
 from .errors import Retry
+from .finished_nodes_store import resolve_finished_nodes_refs
 from .storage_pool import StoragePool
 
 
@@ -36,6 +37,16 @@ class SelinonTask(metaclass=abc.ABCMeta):
         self.dispatcher_id = dispatcher_id
         self.log = logging.getLogger(__name__)
 
+    @staticmethod
+    def _selinon_get_finished_nodes(flow_name, flow_id):  # pylint: disable=unused-argument
+        """Retrieve finished nodes of a subflow, used when resolving handles to stored finished nodes.
+
+        :param flow_name: name of subflow
+        :param flow_id: id of subflow dispatcher
+        :return: finished nodes as returned by subflow dispatcher
+        """
+        return AsyncResult(flow_id).result['finished_nodes']
+
     def _selinon_dereference_task_id(self, flow_names, task_name, index):
         """Compute task id based on mapping of ancestors (from parent sub-flows).
 
@@ -50,11 +61,15 @@ class SelinonTask(metaclass=abc.ABCMeta):
         parent_flow = self.parent
         for flow_name in flow_names:
             try:
-                parent_flow = parent_flow[flow_name]
+                flow_parent = parent_flow[flow_name]
             except KeyError as exc:
                 raise NoParentNodeError("No such parent flow '%s' for task '%s', check your configuration; nested "
                                         "as %s from flow %s"
                                         % (flow_name, self.task_name, flow_names, self.flow_name)) from exc
+
+            # Finished nodes of huge flows are passed as handles, resolve them on demand only once
+            parent_flow[flow_name] = resolve_finished_nodes_refs(flow_parent, self._selinon_get_finished_nodes)
+            parent_flow = parent_flow[flow_name]
         try:
             task_id = parent_flow[task_name][index]
         except KeyError as exc:
@@ -87,7 +102,7 @@ class SelinonTask(metaclass=abc.ABCMeta):
             raise NoParentNodeError("No such parent '%s' in task '%s' in flow '%s', check your configuration"
                                     % (parent_name, self.task_name, self.flow_name)) from exc
 
-        return StoragePool.retrieve(self.flow_name, parent_name, parent_task_id)
+        return StoragePool.retrieve(self.flow_name, parent_name, parent_task_id, dispatcher_id=self.dispatcher_id)
 
     def parent_flow_result(self, flow_names, task_name, index=None):
         """Retrieve result of parent sub-flow task.
@@ -103,7 +118,7 @@ class SelinonTask(metaclass=abc.ABCMeta):
         index = -1 if index is None else index
         parent_flow_name = flow_names if not isinstance(flow_names, list) else flow_names[-1]
         task_id = self._selinon_dereference_task_id(flow_names, task_name, index)
-        return StoragePool.retrieve(parent_flow_name, task_name, task_id)
+        return StoragePool.retrieve(parent_flow_name, task_name, task_id, dispatcher_id=self.dispatcher_id)
 
     def parent_task_exception(self, parent_name):
         """Retrieve parent task exception. You have to call this from a fallback (direct or transitive).
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Span-based tracing of dispatcher wakeups and task execution.
+
+Trace events are points in time, spans measure how long an operation took and they nest - a dispatcher wakeup span
+contains spans of message migration, system state update, node state retrieval, edge condition evaluation and
+storage retrieval. Spans are turned on by:
+
+.. code-block:: python
+
+  from selinon import Trace
+
+  Trace.trace_by_spans(output='/var/log/selinon/spans.json')
+
+Each span carries a trace id and an id of its parent span. Once a dispatcher schedules a task or a sub-flow (or it is
+retried), the trace id and the id of the current span are passed in message meta, so spans of the whole flow can be
+stitched together offline. Spans are written as JSON objects, one per line, once the top-level span in the process
+finishes:
+
+.. code-block:: json
+
+  {"trace_id": "...", "span_id": "...", "parent_span_id": "...", "name": "get_async_result",
+   "start": 1500000000.123, "duration": 0.0012, "attributes": {"node_name": "Task1", ...}, "error": null,
+   "node": "hostname", "pid": 1234}
+"""
+
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+_local = threading.local()
+
+
+def _current_stack():
+    """Get stack of spans that are open in the current thread.
+
+    :return: a list of open spans, the innermost is the last one
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_span():
+    """Get the innermost span open in the current thread.
+
+    :return: the current span, None if there is no open span
+    """
+    stack = _current_stack()
+    return stack[-1] if stack else None
+
+
+class Span(object):
+    """A timed operation, used as a context manager."""
+
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_span_id', 'start', 'duration', 'error',
+                 '_exporter', '_meta', '_start_monotonic', '_root', '_finished')
+
+    def __init__(self, name, exporter, meta=None, attributes=None):
+        """Instantiate span, the span starts once entered.
+
+        :param name: name of the operation
+        :param exporter: a callable accepting a list of finished spans (dicts)
+        :param meta: message meta holding trace id and parent span id, used if there is no span open in the thread
+        :param attributes: a dict of additional span information
+        """
+        self.name = name
+        self.attributes = attributes or {}
+        self.trace_id = None
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_span_id = None
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._exporter = exporter
+        self._meta = meta
+        self._start_monotonic = None
+        self._root = None
+        self._finished = None
+
+    def set_attribute(self, name, value):
+        """Add additional information to span.
+
+        :param name: name of attribute
+        :param value: value of attribute, should be JSON serializable
+        """
+        self.attributes[name] = value
+
+    def meta(self):
+        """Construct message meta to propagate this span to other messages.
+
+        :return: a dict with trace id and parent span id
+        """
+        return {'trace_id': self.trace_id, 'parent_span_id': self.span_id}
+
+    def __enter__(self):
+        """Start span as a child of the current span in the thread or of the span stated in message meta."""
+        stack = _current_stack()
+        if stack:
+            parent = stack[-1]
+            self.trace_id = parent.trace_id
+            self.parent_span_id = parent.span_id
+            self._root = parent._root  # pylint: disable=protected-access
+        else:
+            meta = self._meta or {}
+            self.trace_id = meta.get('trace_id') or '%032x' % random.getrandbits(128)
+            self.parent_span_id = meta.get('parent_span_id')
+            self._root = self
+            self._finished = []
+
+        stack.append(self)
+        self.start = time.time()
+        self._start_monotonic = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Finish span, export all spans of the process-local tree once the top-level span finishes."""
+        self.duration = time.monotonic() - self._start_monotonic
+        if exc_type is not None:
+            self.error = exc_type.__name__
+
+        stack = _current_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+
+        root = self._root
+        root._finished.append(self.to_dict())  # pylint: disable=protected-access
+        if root is self:
+            finished, self._finished = self._finished, None
+            try:
+                self._exporter(finished)
+            except Exception:  # pylint: disable=broad-except
+                _logger.exception("Failed to export %d spans", len(finished))
+
+        return False
+
+    def to_dict(self):
+        """Convert span to a dict.
+
+        :return: a dict describing span
+        """
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan(object):
+    """A span used when span tracing is off, it does nothing."""
+
+    __slots__ = ()
+
+    def set_attribute(self, name, value):
+        """Ignore attribute."""
+
+    def __enter__(self):
+        """Do nothing."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Do nothing."""
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(object):
+    """Write finished spans as JSON objects, one per line."""
+
+    def __init__(self, output=None, sink=None):
+        """Instantiate span exporter.
+
+        :param output: a path to file to append spans to, a file-like object or None for stdout
+        :param sink: a callable accepting a list of finished spans (dicts), used instead of output if provided
+        """
+        self.output = output
+        self.sink = sink
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _get_stream(self):
+        """Get stream to write spans to, reopened after fork.
+
+        :return: a file-like object
+        """
+        if self._stream is None or (isinstance(self.output, str) and self._stream[0] != os.getpid()):
+            if self.output is None:
+                stream = sys.stdout
+            elif isinstance(self.output, str):
+                stream = open(self.output, 'a')
+            else:
+                stream = self.output
+            self._stream = (os.getpid(), stream)
+
+        return self._stream[1]
+
+    def __call__(self, spans):
+        """Export finished spans.
+
+        :param spans: a list of finished spans (dicts)
+        """
+        node = platform.node()
+        pid = os.getpid()
+        for span in spans:
+            span['node'] = node
+            span['pid'] = pid
+
+        if self.sink is not None:
+            self.sink(spans)
+            return
+
+        lines = ''.join(json.dumps(span, sort_keys=True, default=str) + '\n' for span in spans)
+        with self._lock:
+            stream = self._get_stream()
+            stream.write(lines)
+            stream.flush()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Compact encoding of dispatcher state.
+
+Dispatcher passes the whole flow state in each retry message. Flows with many nodes (e.g. when using foreach) produce
+large messages as each node is stated with its name and its id. CompactStateEncoder encodes state so that each node
+name is stated only once, consecutive nodes of the same name are run-length encoded and UUIDs are stored in their
+binary form. Encoded state can be optionally compressed:
+
+.. code-block:: python
+
+  from selinon import Config
+  from selinon import CompactStateEncoder
+
+  Config.set_state_encoder(CompactStateEncoder(compression_threshold=16*1024))
+
+Encoded state is versioned and it is decoded transparently, regardless of the current configuration, so workers with
+different configuration can process the same flow.
+"""
+
+import base64
+import json
+import re
+import zlib
+
+# Key marking encoded state, its value is version of the encoding
+FORMAT_KEY = 'selinon_state'
+FORMAT_VERSION = 1
+
+# Only canonical UUID strings can be stored in binary form and converted back to the very same string
+_UUID_RE = re.compile('^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def _is_uuid(node_id):
+    """Check whether node id is a canonical UUID string so it can be stored in a binary form.
+
+    :param node_id: node id to check
+    :return: True if node id can be converted to binary UUID and back
+    """
+    return isinstance(node_id, str) and _UUID_RE.match(node_id) is not None
+
+
+def _uuids2bytes(node_ids):
+    """Convert canonical UUID strings to their binary form.
+
+    :param node_ids: a list of UUID strings
+    :return: concatenated binary UUIDs
+    """
+    return bytes.fromhex(''.join(node_ids).replace('-', ''))
+
+
+def _bytes2uuids(raw):
+    """Convert concatenated binary UUIDs to canonical UUID strings.
+
+    :param raw: concatenated binary UUIDs
+    :return: a list of UUID strings
+    """
+    hex_str = raw.hex()
+    return ['%s-%s-%s-%s-%s' % (hex_str[i:i + 8], hex_str[i + 8:i + 12], hex_str[i + 12:i + 16],
+                                hex_str[i + 16:i + 20], hex_str[i + 20:i + 32])
+            for i in range(0, len(hex_str), 32)]
+
+
+def _run_length_encode(items):
+    """Run-length encode a list of items.
+
+    :param items: a list of items to be encoded
+    :return: a flat list of items and their run lengths - [item1, count1, item2, count2, ...]
+    """
+    result = []
+    for item in items:
+        if result and result[-2] == item:
+            result[-1] += 1
+        else:
+            result.extend((item, 1))
+
+    return result
+
+
+def _run_length_decode(encoded):
+    """Decode run-length encoded list of items.
+
+    :param encoded: a flat list of items and their run lengths as produced by _run_length_encode()
+    :return: a list of items
+    """
+    result = []
+    for item, count in zip(encoded[::2], encoded[1::2]):
+        result.extend([item] * count)
+
+    return result
+
+
+def _encode_v1(state_dict):
+    """Encode state in version 1 of compact format.
+
+    :param state_dict: state as produced by SystemState.to_dict()
+    :return: a JSON serializable dict with encoded state
+    """
+    names = {}
+    node_ids = []
+
+    def intern(node_name):
+        return names.setdefault(node_name, len(names))
+
+    active_nodes = state_dict.get('active_nodes', [])
+    active = _run_length_encode([intern(node['name']) for node in active_nodes])
+    node_ids.extend(node['id'] for node in active_nodes)
+
+    nodes = {}
+    for key in ('finished_nodes', 'failed_nodes'):
+        nodes[key] = []
+        for node_name, ids in state_dict.get(key, {}).items():
+            nodes[key].extend((intern(node_name), len(ids)))
+            node_ids.extend(ids)
+
+    encoded = {
+        'names': sorted(names, key=names.get),
+        'active': active,
+        'finished': nodes['finished_nodes'],
+        'failed': nodes['failed_nodes'],
+        'waiting_edges': state_dict.get('waiting_edges', [])
+    }
+
+    if all(_is_uuid(node_id) for node_id in node_ids):
+        encoded['uuids'] = base64.b64encode(_uuids2bytes(node_ids)).decode()
+    else:
+        encoded['ids'] = node_ids
+
+    return encoded
+
+
+def _decode_v1(encoded):
+    """Decode state encoded in version 1 of compact format.
+
+    :param encoded: encoded state as produced by _encode_v1()
+    :return: decoded state
+    """
+    names = encoded['names']
+
+    if 'uuids' in encoded:
+        node_ids = iter(_bytes2uuids(base64.b64decode(encoded['uuids'])))
+    else:
+        node_ids = iter(encoded['ids'])
+
+    state = {
+        'active_nodes': [{'name': names[name_idx], 'id': next(node_ids)}
+                         for name_idx in _run_length_decode(encoded['active'])],
+    }
+
+    for key, encoded_key in (('finished_nodes', 'finished'), ('failed_nodes', 'failed')):
+        state[key] = {}
+        for name_idx, count in zip(encoded[encoded_key][::2], encoded[encoded_key][1::2]):
+            state[key][names[name_idx]] = [next(node_ids) for _ in range(count)]
+
+    state['waiting_edges'] = list(encoded['waiting_edges'])
+    return state
+
+
+_DECODERS = {
+    1: _decode_v1
+}
+
+
+class CompactStateEncoder(object):
+    """Encode dispatcher state to a compact representation."""
+
+    def __init__(self, compression_threshold=None):
+        """Instantiate compact state encoder.
+
+        :param compression_threshold: size of encoded state in bytes from which the state is compressed, None to
+                                      never compress the state
+        """
+        self.compression_threshold = compression_threshold
+
+    def encode(self, state_dict):
+        """Encode state.
+
+        :param state_dict: state as produced by SystemState.to_dict()
+        :return: a JSON serializable dict with encoded state
+        """
+        encoded = _encode_v1(state_dict)
+
+        if self.compression_threshold is not None:
+            serialized = json.dumps(encoded, separators=(',', ':')).encode()
+            if len(serialized) >= self.compression_threshold:
+                return {FORMAT_KEY: FORMAT_VERSION, 'zlib': base64.b64encode(zlib.compress(serialized)).decode()}
+
+        encoded[FORMAT_KEY] = FORMAT_VERSION
+        return encoded
+
+    @staticmethod
+    def is_encoded(state):
+        """Check whether the given state is encoded.
+
+        :param state: state as passed to dispatcher
+        :return: True if the state is encoded
+        """
+        return isinstance(state, dict) and FORMAT_KEY in state
+
+    @classmethod
+    def decode(cls, state):
+        """Decode state if it was encoded, otherwise return state as it is.
+
+        :param state: state as passed to dispatcher
+        :return: decoded state
+        """
+        if not cls.is_encoded(state):
+            return state
+
+        decoder = _DECODERS.get(state[FORMAT_KEY])
+        if decoder is None:
+            raise ValueError("Unknown version of encoded state: %r" % state[FORMAT_KEY])
+
+        if 'zlib' in state:
+            return decoder(json.loads(zlib.decompress(base64.b64decode(state['zlib'])).decode()))
+
+        return decoder(state)
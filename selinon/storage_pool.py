@@ -6,6 +6,8 @@
 # ######################################################################
 """A pool that carries all database connections for workers."""
 
+import threading
+import time
 import traceback
 
 from .config import Config
@@ -16,19 +18,38 @@ from .lock_pool import LockPool
 from .trace import Trace
 
 
+class _InFlightRetrieval(object):  # pylint: disable=too-few-public-methods
+    """Retrieval of a task result from storage that is in progress, shared by threads asking for the same result."""
+
+    def __init__(self):
+        """Initialize in-flight retrieval."""
+        self.done = threading.Event()
+        self.retrieved = False
+        self.result = None
+        self.exc = None
+
+
 class StoragePool(object):
     """A pool that carries all database connections for workers."""
 
     _storage_pool_locks = LockPool()
+    # Guard task result caches and in-flight retrievals, never held when talking to storage
+    _storage_cache_locks = LockPool()
+    # (storage name, task id) -> _InFlightRetrieval
+    _in_flight = {}
 
-    def __init__(self, id_mapping, flow_name):
+    def __init__(self, id_mapping, flow_name, prefetched=None, dispatcher_id=None):
         """Initialize storage pool instance based on the current context.
 
         :param id_mapping: mapping tasks and their ids
         :param flow_name: name of flow for which StoragePool context is created
+        :param prefetched: task results retrieved in advance - a dict mapping task id to result, see prefetch()
+        :param dispatcher_id: id of dispatcher handling the flow, used for tracing
         """
         self._id_mapping = id_mapping or {}
         self._flow_name = flow_name
+        self._prefetched = prefetched or {}
+        self._dispatcher_id = dispatcher_id
 
     @classmethod
     def get_storage_name_by_task_name(cls, task_name, graceful=False):
@@ -84,17 +105,75 @@ class StoragePool(object):
         :param task_name: task's name that we are retrieving data for
         :return: task's result for the current context
         """
-        return self.retrieve(self._flow_name, task_name, self._id_mapping[task_name])
+        task_id = self._id_mapping[task_name]
+
+        if task_id in self._prefetched:
+            return self._prefetched[task_id]
+
+        return self.retrieve(self._flow_name, task_name, task_id, dispatcher_id=self._dispatcher_id)
+
+    @classmethod
+    def _get_cached_result(cls, cache, task_id, storage_task_name, flow_name, trace_msg):
+        """Try to retrieve task result from task result cache.
+
+        :param cache: cache to be used
+        :param task_id: task ID to uniquely identify task results
+        :param storage_task_name: name of task as stated in storage
+        :param flow_name: flow in which the retrieval is taking place
+        :param trace_msg: trace message used for tracing
+        :return: tuple - result and a flag whether the result was found in cache
+        """
+        # pylint: disable=too-many-arguments
+        # Actually it is OK if there are some issues with task result cache - if there is some issue, just
+        # report it in the tracing mechanism so users are aware of it and try to talk directly to storage
+        # instead.
+        Trace.log(Trace.TASK_RESULT_CACHE_GET, trace_msg)
+        try:
+            result = cache.get(task_id, task_name=storage_task_name, flow_name=flow_name)
+        except CacheMissError:
+            if Trace.enabled(Trace.TASK_RESULT_CACHE_MISS):
+                Trace.log(Trace.TASK_RESULT_CACHE_MISS, trace_msg, what=traceback.format_exc())
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+        else:
+            Trace.log(Trace.TASK_RESULT_CACHE_HIT, trace_msg)
+            return result, True
+
+        return None, False
+
+    @classmethod
+    def _add_cached_result(cls, cache, task_id, result, trace_msg):
+        """Add task result to task result cache.
+
+        :param cache: cache to be used
+        :param task_id: task ID to uniquely identify task results
+        :param result: task's result to be cached
+        :param trace_msg: trace message used for tracing
+        """
+        Trace.log(Trace.TASK_RESULT_CACHE_ADD, trace_msg)
+        try:
+            cache.add(task_id, result)
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
 
     @classmethod
-    def retrieve(cls, flow_name, task_name, task_id):
+    @Trace.spanned('storage_retrieve', lambda flow_name, task_name, task_id, **_: {'flow_name': flow_name,
+                                                                                   'task_name': task_name,
+                                                                                   'task_id': task_id})
+    def retrieve(cls, flow_name, task_name, task_id, dispatcher_id=None):
         """Retrieve task's result from database which was configured to be used for desired task.
 
+        Results of different tasks are retrieved from storage concurrently - the storage adapter has to be thread-safe
+        in threaded workers. If multiple threads ask for the same result at the same time, only one of them talks to
+        the storage and the others wait for its result.
+
         :param flow_name: flow in which the retrieval is taking place
         :param task_name: name of task for which result should be retrieved
         :param task_id: task ID to uniquely identify task results
+        :param dispatcher_id: id of dispatcher handling the flow, used for tracing
         :return: task's result
         """
+        # pylint: disable=too-many-locals
         storage = cls.get_storage_by_task_name(task_name)
         storage_task_name = Config.storage_task_name[task_name]
         storage_name = cls.get_storage_name_by_task_name(task_name)
@@ -103,48 +182,127 @@ class StoragePool(object):
             'storage_task_name': storage_task_name,
             'storage_name': storage_name,
             'flow_name': flow_name,
-            'task_id': task_id
+            'task_id': task_id,
+            'dispatcher_id': dispatcher_id
         }
+        cache = Config.storage2storage_cache[storage_name]
+        cache_lock = cls._storage_cache_locks.get_lock(storage_name)
+        in_flight_key = (storage_name, task_id)
+
+        with cache_lock:
+            result, result_retrieved = cls._get_cached_result(cache, task_id, storage_task_name, flow_name, trace_msg)
+
+            if result_retrieved:
+                cls._add_cached_result(cache, task_id, result, trace_msg)
+                return result
+
+            in_flight = cls._in_flight.get(in_flight_key)
+            is_leader = in_flight is None
+            if is_leader:
+                in_flight = _InFlightRetrieval()
+                cls._in_flight[in_flight_key] = in_flight
+
+        if is_leader:
+            Trace.log(Trace.STORAGE_RETRIEVE, trace_msg)
+            start = time.monotonic()
+            try:
+                in_flight.result = storage.retrieve(flow_name, task_name, task_id)
+                in_flight.retrieved = True
+                Trace.log(Trace.STORAGE_RETRIEVED, trace_msg, elapsed=time.monotonic() - start)
+            except Exception as exc:  # pylint: disable=broad-except
+                Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+                in_flight.exc = exc
+            finally:
+                # Make sure waiting threads are always released
+                with cache_lock:
+                    if in_flight.retrieved:
+                        cls._add_cached_result(cache, task_id, in_flight.result, trace_msg)
+                    del cls._in_flight[in_flight_key]
+
+                in_flight.done.set()
+        else:
+            in_flight.done.wait()
+
+        if not in_flight.retrieved:
+            error_msg = "Failed to retrieve result from storage after the result was not found in cache"
+            raise StorageError(error_msg) from in_flight.exc
+
+        return in_flight.result
 
-        with cls._storage_pool_locks.get_lock(storage):
-            cache = Config.storage2storage_cache[storage_name]
+    @classmethod
+    def prefetch(cls, flow_name, nodes, dispatcher_id=None):
+        """Retrieve results of multiple tasks at once so they do not need to be retrieved one by one later on.
 
-            result = None
-            result_retrieved = False
+        Results that are not available in task result cache are retrieved using DataStorage.retrieve_many() - one
+        call per storage. Retrieved results are added to task result cache. Tasks without an assigned storage are
+        skipped.
 
-            # Actually it is OK if there are some issues with task result cache - if there is some issue, just
-            # report it in the tracing mechanism so users are aware of it and try to talk directly to storage
-            # instead.
-            Trace.log(Trace.TASK_RESULT_CACHE_GET, trace_msg)
-            try:
-                result = cache.get(task_id, task_name=storage_task_name, flow_name=flow_name)
-                result_retrieved = True
-            except CacheMissError:
-                Trace.log(Trace.TASK_RESULT_CACHE_MISS, trace_msg, what=traceback.format_exc())
-            except Exception:  # pylint: disable=broad-except
-                Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
-            else:
-                Trace.log(Trace.TASK_RESULT_CACHE_HIT, trace_msg)
-
-            if not result_retrieved:
-                Trace.log(Trace.STORAGE_RETRIEVE, trace_msg)
-                try:
-                    result = storage.retrieve(flow_name, task_name, task_id)
-                except Exception as exc:
-                    error_msg = "Failed to retrieve result from storage after the result was not found in cache"
-                    Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
-                    raise StorageError(error_msg) from exc
-
-            Trace.log(Trace.TASK_RESULT_CACHE_ADD, trace_msg)
+        :param flow_name: flow in which the retrieval is taking place
+        :param nodes: a list of tuples (task_name, task_id) describing results that are going to be retrieved
+        :param dispatcher_id: id of dispatcher handling the flow, used for tracing
+        :return: a dict mapping task id to task's result
+        """
+        # pylint: disable=too-many-locals
+        result = {}
+        by_storage = {}
+        for task_name, task_id in nodes:
+            storage_name = cls.get_storage_name_by_task_name(task_name, graceful=True)
+            if storage_name:
+                by_storage.setdefault(storage_name, {})[task_id] = task_name
+
+        for storage_name, task_names in by_storage.items():
+            cache = Config.storage2storage_cache[storage_name]
+            trace_msgs = {task_id: {
+                'task_name': task_name,
+                'storage_task_name': Config.storage_task_name[task_name],
+                'storage_name': storage_name,
+                'flow_name': flow_name,
+                'task_id': task_id,
+                'dispatcher_id': dispatcher_id
+            } for task_id, task_name in task_names.items()}
+            missing = []
+
+            with cls._storage_cache_locks.get_lock(storage_name):
+                for task_id, task_name in task_names.items():
+                    trace_msg = trace_msgs[task_id]
+                    cached_result, result_retrieved = cls._get_cached_result(
+                        cache, task_id, trace_msg['storage_task_name'], flow_name, trace_msg
+                    )
+
+                    if result_retrieved:
+                        cls._add_cached_result(cache, task_id, cached_result, trace_msg)
+                        result[task_id] = cached_result
+                    else:
+                        missing.append((task_name, task_id))
+
+            if not missing:
+                continue
+
+            trace_msg = {
+                'flow_name': flow_name,
+                'storage_name': storage_name,
+                'task_names': [task_name for task_name, _ in missing],
+                'task_ids': [task_id for _, task_id in missing],
+                'dispatcher_id': dispatcher_id
+            }
+            Trace.log(Trace.STORAGE_RETRIEVE_MANY, trace_msg)
+            start = time.monotonic()
             try:
-                cache.add(task_id, result)
-            except Exception:  # pylint: disable=broad-except
-                Trace.log(Trace.TASK_RESULT_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+                retrieved = cls.get_connected_storage(storage_name).retrieve_many(flow_name, missing)
+            except Exception as exc:  # pylint: disable=broad-except
+                Trace.log(Trace.STORAGE_ISSUE, trace_msg, what=traceback.format_exc())
+                raise StorageError("Failed to retrieve results of multiple tasks from storage") from exc
+            Trace.log(Trace.STORAGE_RETRIEVED_MANY, trace_msg, elapsed=time.monotonic() - start)
+
+            with cls._storage_cache_locks.get_lock(storage_name):
+                for _, task_id in missing:
+                    cls._add_cached_result(cache, task_id, retrieved[task_id], trace_msgs[task_id])
+                    result[task_id] = retrieved[task_id]
 
-            return result
+        return result
 
     @classmethod
-    def set(cls, node_args, flow_name, task_name, task_id, result):
+    def set(cls, node_args, flow_name, task_name, task_id, result, dispatcher_id=None):
         # pylint: disable=too-many-arguments
         """Store result for task.
 
@@ -153,6 +311,7 @@ class StoragePool(object):
         :param task_name: task that computed result
         :param task_id: task id that computed result
         :param result: result that should be stored
+        :param dispatcher_id: id of dispatcher handling the flow, used for tracing
         :return: result ID - a unique ID which can be used to reference task results
         """
         storage = cls.get_storage_by_task_name(task_name)
@@ -166,12 +325,13 @@ class StoragePool(object):
             'storage_task_name': storage_task_name,
             'task_id': task_id,
             'storage_name': Config.task2storage_mapping[task_name],
-            'record_id': record_id
+            'record_id': record_id,
+            'dispatcher_id': dispatcher_id
         })
         return record_id
 
     @classmethod
-    def set_error(cls, node_args, flow_name, task_name, task_id, exc_info):
+    def set_error(cls, node_args, flow_name, task_name, task_id, exc_info, dispatcher_id=None):
         # pylint: disable=too-many-arguments
         """Store error information for task failure.
 
@@ -180,6 +340,7 @@ class StoragePool(object):
         :param task_name: task that computed result
         :param task_id: task id that computed result
         :param exc_info: information about exception - tuple (type, value, traceback) as returned by sys.exc_info()
+        :param dispatcher_id: id of dispatcher handling the flow, used for tracing
         :return: true if error was stored in database - DataStorage.store_error() was called
         """
         storage = cls.get_storage_by_task_name(task_name)
@@ -201,7 +362,8 @@ class StoragePool(object):
             'error_type': str(exc_info[0]),
             'error_value': str(exc_info[1]),
             'error_traceback': "".join(traceback.format_tb(exc_info[2])),
-            'record_id': record_id
+            'record_id': record_id,
+            'dispatcher_id': dispatcher_id
         })
 
         return True
@@ -6,6 +6,7 @@
 # ######################################################################
 """A simple filesystem storage implementation."""
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 
@@ -15,6 +16,9 @@ from selinon import DataStorage
 class Filesystem(DataStorage):
     """Selinon adapter for storing task results in a directory."""
 
+    # Number of files read in parallel in retrieve_many()
+    _RETRIEVE_MANY_WORKERS = 8
+
     def __init__(self, path=None):
         """Instantiate Filesystem adapter.
 
@@ -47,6 +51,15 @@ class Filesystem(DataStorage):
         with open(path, 'r') as result_file:
             return json.load(result_file)
 
+    def retrieve_many(self, flow_name, task_ids):  # noqa
+        if len(task_ids) < 2:
+            return super().retrieve_many(flow_name, task_ids)
+
+        # There is no multi-get on filesystem, at least read files in parallel
+        with ThreadPoolExecutor(max_workers=min(len(task_ids), self._RETRIEVE_MANY_WORKERS)) as executor:
+            results = executor.map(lambda item: self.retrieve(flow_name, item[0], item[1]), task_ids)
+            return {task_id: result for (_, task_id), result in zip(task_ids, results)}
+
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         base_path = self._construct_base_path(flow_name, task_name)
         if not os.path.isdir(base_path):
@@ -65,6 +65,26 @@ class MongoDB(DataStorage):
         assert task_name == record['task_name']  # nosec
         return record.get('result')
 
+    def retrieve_many(self, flow_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
+
+        task_names = dict((task_id, task_name) for task_name, task_id in task_ids)
+        filtering = {'_id': 0}
+        cursor = self.collection.find({'task_id': {'$in': list(task_names.keys())}}, filtering)
+
+        result = {}
+        for record in cursor:
+            if record['task_id'] in result:
+                raise ValueError("Multiple records with same task_id found")
+
+            assert task_names[record['task_id']] == record['task_name']  # nosec
+            result[record['task_id']] = record.get('result')
+
+        if len(result) != len(task_names):
+            raise FileNotFoundError("Record not found in database")
+
+        return result
+
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         assert self.is_connected()  # nosec
 
@@ -4,9 +4,33 @@
 # Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
 # This file is part of Selinon project.
 # ######################################################################
-"""Selinon adapter for Redis database."""
+"""Selinon adapter for Redis database.
 
+By default records are stored as JSON documents under task id. The adapter can be configured to store records in a
+binary format (msgpack), to compress large records and to store task result and metadata in separate hash fields so
+that only task result is transferred when the result is retrieved:
+
+.. code-block:: yaml
+
+  storages:
+    - name: 'Redis'
+      import: 'selinon.storages.redis'
+      configuration:
+        host: 'redis'
+        port: 6379
+        serializer: 'msgpack'
+        compression: 'zlib'
+        compression_threshold: 1024
+        hash_fields: true
+        ttl: 86400
+
+Records written with any serializer and compression can be read regardless of the current configuration, the layout
+of records (hash fields or plain values) has to stay the same for stored records.
+"""
+
+import importlib
 import json
+import zlib
 
 from selinon import DataStorage
 
@@ -16,12 +40,37 @@ except ImportError as exc:
     raise ImportError("Please install dependencies using `pip3 install selinon[redis]` "
                       "in order to use RedisStorage") from exc
 
+# Encoded values that are not plain JSON start with this byte followed by serializer and compression codes
+_HEADER_MAGIC = b'\x00'
+_SERIALIZERS = {'json': b'j', 'msgpack': b'm'}
+_COMPRESSIONS = {None: b'-', 'zlib': b'z', 'lz4': b'l'}
+
+
+def _import_optional(module_name, option):
+    """Import a module that is required only for some configuration options.
+
+    :param module_name: name of module to be imported
+    :param option: configuration option that requires the module
+    :return: imported module
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as exc:
+        raise ImportError("Please install %s using `pip3 install %s` in order to use %s in RedisStorage"
+                          % (module_name, module_name.split('.')[0], option)) from exc
+
 
 class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
     """Selinon adapter for Redis database."""
 
+    # Hash fields used when result and metadata are stored separately
+    _TASK_NAME_FIELD = 'task_name'
+    _RESULT_FIELD = 'result'
+    _METADATA_FIELD = 'metadata'
+
     def __init__(self, host=None, port=6379, db=0, password=None, socket_timeout=None, connection_pool=None,
-                 charset=None, errors=None, unix_socket_path=None):
+                 charset=None, errors=None, unix_socket_path=None, serializer=None, compression=None,
+                 compression_threshold=1024, hash_fields=False, ttl=None):
         """Instantiate Redis database adapter.
 
         :param host: Redis host
@@ -33,7 +82,13 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
         :param charset: connection character set
         :param errors: error treating method
         :param unix_socket_path: path to unix socket, if any
+        :param serializer: serializer used for records - 'json' (default) or 'msgpack'
+        :param compression: compression used for records larger than compression_threshold - 'zlib' or 'lz4'
+        :param compression_threshold: size of serialized record in bytes from which compression is used
+        :param hash_fields: store task result and metadata in separate hash fields, retrieve reads only result
+        :param ttl: number of seconds after which stored records expire, records do not expire if not set
         """
+        # pylint: disable=too-many-arguments
         super().__init__()
         self.conn = None
         self.host = host or 'localhost'
@@ -45,6 +100,25 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
         self.charset = charset or 'utf-8'
         self.errors = errors or 'strict'
         self.unix_socket_path = unix_socket_path
+        self.serializer = serializer or 'json'
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.hash_fields = hash_fields
+        self.ttl = ttl
+
+        if self.serializer not in _SERIALIZERS:
+            raise ValueError("Unknown serializer %r, available serializers: %s"
+                             % (self.serializer, ', '.join(_SERIALIZERS.keys())))
+
+        if self.compression not in _COMPRESSIONS:
+            raise ValueError("Unknown compression %r, available compressions: %s"
+                             % (self.compression, ', '.join(c for c in _COMPRESSIONS if c)))
+
+        # Make sure we fail early on missing dependencies
+        if self.serializer == 'msgpack':
+            _import_optional('msgpack', 'msgpack serializer')
+        if self.compression == 'lz4':
+            _import_optional('lz4.frame', 'lz4 compression')
 
     def is_connected(self):  # noqa
         return self.conn is not None
@@ -59,19 +133,106 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
             self.conn.connection_pool.disconnect()
             self.conn = None
 
-    def retrieve(self, flow_name, task_name, task_id):  # noqa
-        assert self.is_connected()  # nosec
+    def _encode(self, obj):
+        """Serialize and optionally compress an object based on adapter configuration.
+
+        :param obj: object to be encoded
+        :return: encoded object
+        """
+        if self.serializer == 'msgpack':
+            payload = _import_optional('msgpack', 'msgpack serializer').packb(obj, use_bin_type=True)
+        else:
+            payload = json.dumps(obj).encode(self.charset)
 
-        ret = self.conn.get(task_id)
+        compression = None
+        if self.compression and len(payload) >= self.compression_threshold:
+            compression = self.compression
+            if compression == 'lz4':
+                payload = _import_optional('lz4.frame', 'lz4 compression').compress(payload)
+            else:
+                payload = zlib.compress(payload)
+
+        if self.serializer == 'json' and compression is None:
+            # Keep plain JSON so records are readable by adapters not aware of encoding header
+            return payload
+
+        return _HEADER_MAGIC + _SERIALIZERS[self.serializer] + _COMPRESSIONS[compression] + payload
+
+    def _decode(self, raw):
+        """Decode an object encoded by _encode().
+
+        :param raw: raw value as retrieved from Redis
+        :return: decoded object
+        """
+        if not raw.startswith(_HEADER_MAGIC):
+            return json.loads(raw.decode(self.charset))
 
-        if ret is None:
+        serializer, compression, payload = raw[1:2], raw[2:3], raw[3:]
+
+        if compression == _COMPRESSIONS['zlib']:
+            payload = zlib.decompress(payload)
+        elif compression == _COMPRESSIONS['lz4']:
+            payload = _import_optional('lz4.frame', 'lz4 compression').decompress(payload)
+        elif compression != _COMPRESSIONS[None]:
+            raise ValueError("Unknown compression used in stored record: %r" % compression)
+
+        if serializer == _SERIALIZERS['msgpack']:
+            return _import_optional('msgpack', 'msgpack serializer').unpackb(payload, raw=False)
+        elif serializer == _SERIALIZERS['json']:
+            return json.loads(payload.decode(self.charset))
+
+        raise ValueError("Unknown serializer used in stored record: %r" % serializer)
+
+    def _decode_record(self, task_name, raw_record):
+        """Decode a raw record as stored in Redis.
+
+        :param task_name: name of task that result is expected in record
+        :param raw_record: raw record as retrieved from Redis - a value or a list of task name and result hash fields
+        :return: task result
+        """
+        if self.hash_fields:
+            raw_task_name, raw_result = raw_record
+            if raw_task_name is None:
+                raise FileNotFoundError("Record not found in database")
+
+            assert raw_task_name.decode(self.charset) == task_name  # nosec
+            return self._decode(raw_result)
+
+        if raw_record is None:
             raise FileNotFoundError("Record not found in database")
 
-        record = json.loads(ret.decode(self.charset))
+        record = self._decode(raw_record)
 
         assert record.get('task_name') == task_name  # nosec
         return record.get('result')
 
+    def retrieve(self, flow_name, task_name, task_id):  # noqa
+        assert self.is_connected()  # nosec
+
+        if self.hash_fields:
+            raw_record = self.conn.hmget(task_id, [self._TASK_NAME_FIELD, self._RESULT_FIELD])
+        else:
+            raw_record = self.conn.get(task_id)
+
+        return self._decode_record(task_name, raw_record)
+
+    def retrieve_many(self, flow_name, task_ids):  # noqa
+        assert self.is_connected()  # nosec
+
+        if not task_ids:
+            return {}
+
+        if self.hash_fields:
+            pipe = self.conn.pipeline(transaction=False)
+            for _, task_id in task_ids:
+                pipe.hmget(task_id, [self._TASK_NAME_FIELD, self._RESULT_FIELD])
+            raw_records = pipe.execute()
+        else:
+            raw_records = self.conn.mget([task_id for _, task_id in task_ids])
+
+        return {task_id: self._decode_record(task_name, raw_record)
+                for (task_name, task_id), raw_record in zip(task_ids, raw_records)}
+
     def store(self, node_args, flow_name, task_name, task_id, result):  # noqa
         assert self.is_connected()  # nosec
 
@@ -80,10 +241,24 @@ class Redis(DataStorage):  # pylint: disable=too-many-instance-attributes
             'flow_name': flow_name,
             'task_name': task_name,
             'task_id': task_id,
-            'result': result
         }
 
-        self.conn.set(task_id, json.dumps(record))
+        if not self.hash_fields:
+            record['result'] = result
+            self.conn.set(task_id, self._encode(record), ex=self.ttl)
+            return task_id
+
+        # Store hash and set its expiration atomically
+        pipe = self.conn.pipeline()
+        pipe.hset(task_id, mapping={
+            self._TASK_NAME_FIELD: task_name,
+            self._RESULT_FIELD: self._encode(result),
+            self._METADATA_FIELD: self._encode(record)
+        })
+        if self.ttl:
+            pipe.expire(task_id, self.ttl)
+        pipe.execute()
+
         return task_id
 
     def store_error(self, node_args, flow_name, task_name, task_id, exc_info):  # noqa
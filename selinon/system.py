@@ -16,6 +16,7 @@ import yaml
 import graphviz
 
 from .errors import ConfigurationError
+from .errors import SelectiveNoPathError
 from .flow import Flow
 from .global_config import GlobalConfig
 from .helpers import check_conf_keys
@@ -49,6 +50,8 @@ class System(object):
         self.tasks = tasks or []
         self.storages = storages or []
         self.task_classes = task_classes or []
+        # the whole system if this system was restricted to nodes served on some queues
+        self._full_system = None
 
     def _check_name_collision(self, name):
         """All tasks and flows share name space, check for collisions.
@@ -189,6 +192,48 @@ class System(object):
 
         return ret
 
+    def restrict_to_queues(self, queues):
+        """Restrict system to nodes that are served by a worker consuming the given queues.
+
+        The restricted system consists of flows which dispatcher queue is listed in queues together with all their
+        (transitive) sub-flows and tasks which task queue is listed in queues together with all tasks that are
+        scheduled in the restricted flows. Queues and storage configuration is kept for all nodes so results of any
+        task can be retrieved and any flow can be scheduled.
+
+        :param queues: a list of queue names
+        :return: restricted system
+        :rtype: System
+        """
+        queues = set(queues)
+
+        unknown_queues = queues - set(self.task_queue_names().values()) - set(self.dispatcher_queue_names().values())
+        if unknown_queues:
+            self._logger.warning("No task or flow is placed on queues %s", sorted(unknown_queues))
+
+        flows = set()
+        to_process = [flow for flow in self.flows if flow.queue_name in queues]
+        while to_process:
+            flow = to_process.pop()
+            if flow in flows:
+                continue
+
+            flows.add(flow)
+            to_process.extend(node for node in flow.all_used_nodes() if node.is_flow())
+
+        tasks = {task for task in self.tasks if task.queue_name in queues}
+        for flow in flows:
+            tasks.update(node for node in flow.all_used_nodes() if node.is_task())
+
+        self._logger.debug("Restricting system to %d flows out of %d and %d tasks out of %d for queues %s",
+                           len(flows), len(self.flows), len(tasks), len(self.tasks), sorted(queues))
+
+        system = System(tasks=[task for task in self.tasks if task in tasks],
+                        flows=[flow for flow in self.flows if flow in flows],
+                        storages=self.storages,
+                        task_classes=self.task_classes)
+        system._full_system = self._full_system or self  # pylint: disable=protected-access
+        return system
+
     def class_of_task(self, task):
         """Return task class of a task.
 
@@ -231,16 +276,22 @@ class System(object):
                                                                     self._dump_foreach_function_name(flow.name, idx)))
 
         for task in self.tasks:
-            output.write("from {} import {} as {}\n".format(task.import_path, task.class_name, task.name))
+            if not GlobalConfig.lazy_imports:
+                output.write("from {} import {} as {}\n".format(task.import_path, task.class_name, task.name))
             f = task.selective_run_function  # pylint: disable=invalid-name
             selective_run_function_imports.add((f.import_path, f.name))
 
         for storage in self.storages:
-            output.write("from {} import {}\n".format(storage.import_path, storage.class_name))
-            cache_imports.add((flow.cache_config.import_path, flow.cache_config.name))
+            if not GlobalConfig.lazy_imports:
+                output.write("from {} import {}\n".format(storage.import_path, storage.class_name))
+            cache_imports.add((storage.cache_config.import_path, storage.cache_config.name))
 
-        for import_path, cache_name in cache_imports:
-            output.write("from {} import {}\n".format(import_path, cache_name))
+        if GlobalConfig.lazy_imports:
+            # task classes, storages and caches are imported on first use
+            output.write("from selinon.lazy_mapping import LazyMapping, import_object\n")
+        else:
+            for import_path, cache_name in cache_imports:
+                output.write("from {} import {}\n".format(import_path, cache_name))
 
         for import_path, function_name in selective_run_function_imports:
             output.write("from {} import {} as {}\n".format(
@@ -325,11 +376,34 @@ class System(object):
             printed = True
         output.write('\n}\n\n')
 
+    @staticmethod
+    def _dump_lazy_mapping(output, dict_name, dict_items):
+        """Dump a LazyMapping, values are computed by expressions on first access.
+
+        :param output: a stream to write to
+        :param dict_name: name of the mapping in the generated Python code
+        :param dict_items: a dict mapping keys to Python expressions computing values (as strings)
+        """
+        output.write('%s = LazyMapping({' % dict_name)
+        printed = False
+        for key, expression in dict_items.items():
+            if printed:
+                output.write(',')
+            output.write("\n    '%s': lambda: %s" % (key, expression))
+            printed = True
+        output.write('\n})\n\n')
+
     def _dump_task_classes(self, output):
         """Dump mapping from task name to task class.
 
         :param output: a stream to write to
         """
+        if GlobalConfig.lazy_imports:
+            self._dump_lazy_mapping(output, 'task_classes', {
+                task.name: "import_object('%s', '%s')" % (task.import_path, task.class_name) for task in self.tasks
+            })
+            return
+
         output.write('task_classes = {')
         printed = False
         for task in self.tasks:
@@ -346,7 +420,7 @@ class System(object):
         """
         output.write('storage_task_name = {')
         printed = False
-        for task in self.tasks:
+        for task in (self._full_system or self).tasks:
             if printed:
                 output.write(',')
             output.write("\n    '%s': '%s'" % (task.name, task.storage_task_name))
@@ -358,24 +432,54 @@ class System(object):
 
         :param output: a stream to write to
         """
-        self._dump_dict(output, 'task_queues', {f.name: "'%s'" % f.queue_name for f in self.tasks})
-        self._dump_dict(output, 'dispatcher_queues', {f.name: "'%s'" % f.queue_name for f in self.flows})
+        system = self._full_system or self
+        self._dump_dict(output, 'task_queues', {f.name: "'%s'" % f.queue_name for f in system.tasks})
+        self._dump_dict(output, 'dispatcher_queues', {f.name: "'%s'" % f.queue_name for f in system.flows})
+
+    @staticmethod
+    def _storage_kwargs2str(storage):
+        """Construct arguments passed to storage adapter constructor.
+
+        :param storage: storage to construct arguments for
+        :return: arguments as a string
+        """
+        if storage.configuration and isinstance(storage.configuration, dict):
+            return dict2strkwargs(storage.configuration)
+        elif storage.configuration:
+            return expr2str(storage.configuration)
+
+        return ''
+
+    @staticmethod
+    def _cache_instance2str(cache_config):
+        """Construct expression instantiating a cache.
+
+        :param cache_config: cache configuration
+        :return: Python expression as a string
+        """
+        if GlobalConfig.lazy_imports:
+            cache_class = "import_object('%s', '%s')" % (cache_config.import_path, cache_config.name)
+        else:
+            cache_class = cache_config.name
+
+        return "%s(%s)" % (cache_class, dict2strkwargs(cache_config.configuration))
 
     def _dump_storage2instance_mapping(self, output):
         """Dump storage name to instance mapping to a stream.
 
         :param output: a stream to write to
         """
+        if GlobalConfig.lazy_imports:
+            self._dump_lazy_mapping(output, 'storage2instance_mapping', {
+                storage.name: "import_object('%s', '%s')(%s)" % (storage.import_path, storage.class_name,
+                                                                 self._storage_kwargs2str(storage))
+                for storage in self.storages
+            })
+            return
+
         storage_var_names = []
         for storage in self.storages:
-            output.write("%s = %s" % (storage.var_name, storage.class_name))
-            if storage.configuration and isinstance(storage.configuration, dict):
-                output.write("(%s)\n" % dict2strkwargs(storage.configuration))
-            elif storage.configuration:
-                output.write("(%s)\n" % expr2str(storage.configuration))
-            else:
-                output.write("()\n")
-
+            output.write("%s = %s(%s)\n" % (storage.var_name, storage.class_name, self._storage_kwargs2str(storage)))
             storage_var_names.append((storage.name, storage.var_name,))
 
         output.write('storage2instance_mapping = {\n')
@@ -395,7 +499,7 @@ class System(object):
         """
         output.write('task2storage_mapping = {\n')
         printed = False
-        for task in self.tasks:
+        for task in (self._full_system or self).tasks:
             if printed:
                 output.write(",\n")
             storage_name = ("'%s'" % task.storage.name) if task.storage else str(None)
@@ -411,10 +515,15 @@ class System(object):
         """
         self._dump_task2storage_mapping(output)
         self._dump_storage2instance_mapping(output)
+        if GlobalConfig.lazy_imports:
+            self._dump_lazy_mapping(output, 'storage2storage_cache', {
+                s.name: self._cache_instance2str(s.cache_config) for s in self.storages
+            })
+            return
+
         for storage in self.storages:
             cache_config = storage.cache_config
-            output.write("%s = %s(%s)\n" % (cache_config.var_name, cache_config.name,
-                                            dict2strkwargs(cache_config.configuration)))
+            output.write("%s = %s\n" % (cache_config.var_name, self._cache_instance2str(cache_config)))
         self._dump_dict(output, 'storage2storage_cache', {s.name: s.cache_config.var_name for s in self.storages})
 
     def _dump_async_result_cache(self, output):
@@ -422,10 +531,15 @@ class System(object):
 
         :param output: a stream to write to
         """
+        if GlobalConfig.lazy_imports:
+            self._dump_lazy_mapping(output, 'async_result_cache', {
+                f.name: self._cache_instance2str(f.cache_config) for f in self.flows
+            })
+            return
+
         for flow in self.flows:
             cache_config = flow.cache_config
-            output.write("%s = %s(%s)\n" % (cache_config.var_name, cache_config.name,
-                                            dict2strkwargs(cache_config.configuration)))
+            output.write("%s = %s\n" % (cache_config.var_name, self._cache_instance2str(cache_config)))
         self._dump_dict(output, 'async_result_cache', {f.name: f.cache_config.var_name for f in self.flows})
 
     def _dump_strategy_func(self, output):
@@ -628,6 +742,12 @@ class System(object):
                     output.write(", 'foreach_propagate_result': %s" % edge.foreach['propagate_result'])
                 if edge.selective:
                     output.write(", 'selective': %s" % edge.selective)
+                if edge.predicate.requires_message():
+                    condition_nodes = []
+                    for node in edge.predicate.nodes_used():
+                        if node.name not in condition_nodes:
+                            condition_nodes.append(node.name)
+                    output.write(", 'condition_nodes': %s" % condition_nodes)
                 output.write("}")
             if idx + 1 < len(self.flows):
                 output.write('],\n')
@@ -635,6 +755,55 @@ class System(object):
                 output.write(']\n')
         output.write('}\n\n')
 
+    def _dump_node2edge_idx(self, output):
+        """Dump mapping from a node name to indexes of edges in edge table that wait for the node.
+
+        :param output: a stream to write to
+        """
+        output.write('node2edge_idx = {')
+        printed = False
+        for flow in self.flows:
+            node2edge_idx = {}
+            for idx_edge, edge in enumerate(flow.edges):
+                for node in edge.nodes_from:
+                    node2edge_idx.setdefault(node.name, []).append(idx_edge)
+
+            if printed:
+                output.write(',')
+            output.write("\n    '%s': %s" % (flow.name, node2edge_idx))
+            printed = True
+        output.write('\n}\n\n')
+
+    def _dump_selective_runs(self, output):
+        """Dump precomputed selective runs for selective subflow edges so dispatcher does not need to compute them.
+
+        :param output: a stream to write to
+        """
+        # Avoid circular imports - selective module depends on Config
+        from .selective import precompute_selective_run
+        from .selective import selective_run_key
+
+        edge_table = {}
+        for flow in self.flows:
+            edge_table[flow.name] = [{'from': [node.name for node in edge.nodes_from],
+                                      'to': [node.name for node in edge.nodes_to]} for edge in flow.edges]
+
+        selective_runs = {}
+        for flow in self.flows:
+            for edge in flow.edges:
+                if not edge.selective:
+                    continue
+
+                # selective edges have always exactly one destination node - a flow
+                key = selective_run_key(edge.nodes_to[0].name, **edge.selective)
+                try:
+                    selective_runs[key] = precompute_selective_run(edge_table, edge.nodes_to[0].name, **edge.selective)
+                except SelectiveNoPathError:
+                    # Let dispatcher report the error at runtime
+                    continue
+
+        output.write('selective_runs = %s\n\n' % selective_runs)
+
     def dump2stream(self, stream):
         """Perform system dump to a Python source code to an output stream.
 
@@ -684,6 +853,8 @@ class System(object):
         self._dump_init(stream)
         self._dump_condition_functions(stream)
         self._dump_edge_table(stream)
+        self._dump_node2edge_idx(stream)
+        self._dump_selective_runs(stream)
 
     def dump2file(self, output_file):
         """Perform system dump to a Python source code.
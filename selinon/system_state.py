@@ -9,7 +9,7 @@
 from collections import deque
 import copy
 import datetime
-from functools import reduce
+import functools
 import itertools
 import traceback
 
@@ -19,12 +19,18 @@ from .errors import CacheMissError
 from .errors import DispatcherRetry
 from .errors import FlowError
 from .errors import StorageError
+from .finished_nodes_store import FinishedNodesStore
 from .lock_pool import LockPool
+from .node_args_store import resolve_node_args
+from .node_args_store import store_node_args
 from .selective import compute_selective_run
+from .state_encoding import CompactStateEncoder
 from .storage_pool import StoragePool
 from .task_envelope import SelinonTaskEnvelope
 from .trace import Trace
 
+# pylint: disable=too-many-lines
+
 
 class SystemState(object):  # pylint: disable=too-many-instance-attributes
     """Main system actions done by Selinon."""
@@ -35,6 +41,8 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
     _throttled_tasks = {}
     _throttled_flows = {}
     _node_state_cache_lock = LockPool()
+    # Current time used for throttling, replaced by executor when simulating in virtual time
+    _get_current_datetime = staticmethod(datetime.datetime.now)
 
     @property
     def node_args(self):
@@ -44,15 +52,14 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         """
         return self._node_args
 
-    def _get_async_result(self, node_name, node_id):  # pylint: disable=invalid-name,redefined-builtin
-        """Retrieve async result, check cache first.
+    def _get_async_result_trace_msg(self, node_name, node_id):
+        """Construct trace message for node state retrieval.
 
-        :param node_name: a name of node for which async result should be checked
-        :param node_id: id if node for which async result should be checked
-        :return: Celery AsyncResult
+        :param node_name: a name of node for which async result is checked
+        :param node_id: id of node for which async result is checked
+        :return: trace message
         """
-        cache = Config.async_result_cache[self._flow_name]
-        trace_msg = {
+        return {
             'flow_name': self._flow_name,
             'node_args': self._node_args,
             'parent': self._parent,
@@ -63,20 +70,75 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
             'selective': self._selective
         }
 
-        with self._node_state_cache_lock.get_lock(self._flow_name):
-            res = None
-            result_retrieved_from_cache = False
+    def _get_async_results_trace_msg(self, nodes):
+        """Construct trace message for batched retrieval of node states.
 
-            Trace.log(Trace.NODE_STATE_CACHE_GET, trace_msg)
-            try:
-                res = cache.get(node_id)
-                result_retrieved_from_cache = True
-            except CacheMissError:
+        :param nodes: a list of node references (dicts with name and id) for which async results are checked
+        :return: trace message
+        """
+        return {
+            'flow_name': self._flow_name,
+            'node_args': self._node_args,
+            'parent': self._parent,
+            'dispatcher_id': self._dispatcher_id,
+            'queue': Config.dispatcher_queues[self._flow_name],
+            'node_ids': [node['id'] for node in nodes],
+            'node_names': [node['name'] for node in nodes],
+            'selective': self._selective
+        }
+
+    @staticmethod
+    def _get_cached_async_result(cache, node_id, trace_msg):
+        """Retrieve async result from node state cache, cache issues are only reported.
+
+        :param cache: node state cache to be used
+        :param node_id: id of node for which async result should be retrieved
+        :param trace_msg: trace message for reporting
+        :return: a tuple - async result (if any) and a flag signalizing whether the result was found in cache
+        """
+        Trace.log(Trace.NODE_STATE_CACHE_GET, trace_msg)
+        try:
+            res = cache.get(node_id)
+        except CacheMissError:
+            if Trace.enabled(Trace.NODE_STATE_CACHE_MISS):
                 Trace.log(Trace.NODE_STATE_CACHE_MISS, trace_msg, what=traceback.format_exc())
-            except Exception:  # pylint: disable=broad-except
-                Trace.log(Trace.NODE_STATE_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
-            else:
-                Trace.log(Trace.NODE_STATE_CACHE_HIT, trace_msg)
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.NODE_STATE_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+        else:
+            Trace.log(Trace.NODE_STATE_CACHE_HIT, trace_msg)
+            return res, True
+
+        return None, False
+
+    @staticmethod
+    def _cache_async_result(cache, node_id, res, trace_msg):
+        """Add async result of a finished or failed node to node state cache.
+
+        :param cache: node state cache to be used
+        :param node_id: id of node which async result should be cached
+        :param res: async result to be cached
+        :param trace_msg: trace message for reporting
+        """
+        Trace.log(Trace.NODE_STATE_CACHE_ADD, trace_msg)
+        try:
+            cache.add(node_id, res)
+        except Exception:  # pylint: disable=broad-except
+            Trace.log(Trace.NODE_STATE_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+
+    def _get_async_result(self, node_name, node_id):  # pylint: disable=invalid-name,redefined-builtin
+        """Retrieve async result, check cache first.
+
+        :param node_name: a name of node for which async result should be checked
+        :param node_id: id if node for which async result should be checked
+        :return: Celery AsyncResult
+        """
+        cache = Config.async_result_cache[self._flow_name]
+        trace_msg = functools.partial(self._get_async_result_trace_msg, node_name, node_id)
+
+        with Trace.span('get_async_result', node_name=node_name, node_id=node_id) as span, \
+                self._node_state_cache_lock.get_lock(self._flow_name):
+            res, result_retrieved_from_cache = self._get_cached_async_result(cache, node_id, trace_msg)
+            span.set_attribute('cached', result_retrieved_from_cache)
 
             if not result_retrieved_from_cache:
                 try:
@@ -90,21 +152,58 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                 # We can cache only results of tasks that have finished or failed, not the ones that are
                 # going to be processed (state will change).
                 if successful or failed:
-                    Trace.log(Trace.NODE_STATE_CACHE_ADD, trace_msg)
-                    try:
-                        cache.add(node_id, res)
-                    except Exception:  # pylint: disable=broad-except
-                        Trace.log(Trace.NODE_STATE_CACHE_ISSUE, trace_msg, what=traceback.format_exc())
+                    self._cache_async_result(cache, node_id, res, trace_msg)
 
             return res
 
+    def _get_async_results(self, nodes):
+        """Retrieve async results of multiple nodes at once using the configured result backend batcher.
+
+        :param nodes: a list of node references (dicts with name and id)
+        :return: a dict mapping node id to its async result
+        """
+        cache = Config.async_result_cache[self._flow_name]
+        trace_msgs = {node['id']: functools.partial(self._get_async_result_trace_msg, node['name'], node['id'])
+                      for node in nodes}
+        ret = {}
+
+        with self._node_state_cache_lock.get_lock(self._flow_name):
+            for node in nodes:
+                res, result_retrieved_from_cache = self._get_cached_async_result(cache, node['id'],
+                                                                                 trace_msgs[node['id']])
+                if result_retrieved_from_cache:
+                    ret[node['id']] = res
+
+            not_cached = [node for node in nodes if node['id'] not in ret]
+            if not not_cached:
+                return ret
+
+            try:
+                fetched = Config.result_backend_batcher.fetch([node['id'] for node in not_cached])
+            except Exception as exc:  # pylint: disable=broad-except
+                trace_msg = functools.partial(self._get_async_results_trace_msg, not_cached)
+                Trace.log(Trace.RESULT_BACKEND_ISSUE, trace_msg, what=traceback.format_exc())
+                raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
+
+            for node_id, res in fetched.items():
+                # The same as in _get_async_result() - cache only nodes which state will not change
+                if res.successful() or res.failed():
+                    self._cache_async_result(cache, node_id, res, trace_msgs[node_id])
+                ret[node_id] = res
+
+        return ret
+
     def _instantiate_active_nodes(self, arr):
         """Retrieve all async results for active nodes.
 
         :return: convert node references from argument to AsyncResult
         """
-        return [{'name': node['name'], 'id': node['id'],
-                 'result': self._get_async_result(node['name'], node['id'])} for node in arr]
+        if Config.result_backend_batcher is None:
+            return [{'name': node['name'], 'id': node['id'],
+                     'result': self._get_async_result(node['name'], node['id'])} for node in arr]
+
+        async_results = self._get_async_results(arr)
+        return [{'name': node['name'], 'id': node['id'], 'result': async_results[node['id']]} for node in arr]
 
     @staticmethod
     def _deinstantiate_active_nodes(arr):
@@ -147,7 +246,7 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         :param parent: information about parent nodes
         :param selective: precomputed information about selective flow, if any
         """
-        state_dict = state or {}
+        state_dict = CompactStateEncoder.decode(state) or {}
 
         self._dispatcher_id = dispatcher_id
         self._flow_name = flow_name
@@ -158,6 +257,8 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         self._finished_nodes = state_dict.get('finished_nodes', {})
         self._failed_nodes = state_dict.get('failed_nodes', {})
         self._waiting_edges_idx = state_dict.get('waiting_edges', [])
+        # Position of an edge in waiting edges so we do not need to scan waiting edges each time
+        self._waiting_edges_pos = {idx: pos for pos, idx in enumerate(self._waiting_edges_idx)}
         # Instantiate lazily later if we will know that there is something to process
         self._waiting_edges = []
         self._retry = retry
@@ -201,7 +302,7 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         with self._throttle_lock_pool.get_lock(node_name):
             if throttle_conf[node_name]:
-                current_datetime = datetime.datetime.now()
+                current_datetime = self._get_current_datetime()
                 if node_name not in throttled_nodes:
                     # we throttle for the first time
                     throttled_nodes[node_name] = current_datetime
@@ -284,10 +385,11 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
             'parent': parent,
         }
 
-        storage_pool = StoragePool(parent, self._flow_name)
+        storage_pool = StoragePool(parent, self._flow_name, dispatcher_id=self._dispatcher_id)
         selective_func = Config.selective_run_task[node_name]
 
-        result = selective_func(self._flow_name, node_name, node_args, self._selective['task_names'], storage_pool)
+        result = selective_func(self._flow_name, node_name, resolve_node_args(node_args), self._selective['task_names'],
+                                storage_pool)
         Trace.log(Trace.SELECTIVE_RUN_FUNC, trace_msg, {'result': result})
 
         return result
@@ -322,26 +424,28 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                 'parent': start_parent,
                 'selective': selective or self.selective
             }
+            Trace.add_span_meta(kwargs)
 
             countdown = self._get_countdown(node_name, is_flow=True)
             async_result = Dispatcher().apply_async(kwargs=kwargs,
                                                     queue=Config.dispatcher_queues[node_name],
                                                     countdown=countdown)
 
-            Trace.log(Trace.SUBFLOW_SCHEDULE, {
-                'flow_name': self._flow_name,
-                'condition_str': None if not edge else edge['condition_str'],
-                'foreach_str': None if not edge else edge.get('foreach_str'),
-                'selective_edge_conf': None if not edge else edge.get('selective', False),
-                'child_flow_name': node_name,
-                'dispatcher_id': self._dispatcher_id,
-                'child_dispatcher_id': async_result.task_id,
-                'queue': Config.dispatcher_queues[node_name],
-                'countdown': countdown,
-                'child_selective': selective,
-                'selective': self._selective,
-                'node_args': start_node_args
-            })
+            if Trace.enabled(Trace.SUBFLOW_SCHEDULE):
+                Trace.log(Trace.SUBFLOW_SCHEDULE, {
+                    'flow_name': self._flow_name,
+                    'condition_str': None if not edge else edge['condition_str'],
+                    'foreach_str': None if not edge else edge.get('foreach_str'),
+                    'selective_edge_conf': None if not edge else edge.get('selective', False),
+                    'child_flow_name': node_name,
+                    'dispatcher_id': self._dispatcher_id,
+                    'child_dispatcher_id': async_result.task_id,
+                    'queue': Config.dispatcher_queues[node_name],
+                    'countdown': countdown,
+                    'child_selective': selective,
+                    'selective': self._selective,
+                    'node_args': start_node_args
+                })
 
         else:
             kwargs = {
@@ -351,21 +455,23 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                 'node_args': node_args,
                 'dispatcher_id': self._dispatcher_id
             }
+            Trace.add_span_meta(kwargs)
 
             countdown = self._get_countdown(node_name, is_flow=False)
             async_result = SelinonTaskEnvelope().apply_async(kwargs=kwargs,
                                                              queue=Config.task_queues[node_name],
                                                              countdown=countdown)
 
-            Trace.log(Trace.TASK_SCHEDULE, kwargs, {
-                'task_id': async_result.task_id,
-                'queue': Config.task_queues[node_name],
-                'condition_str': None if not edge else edge['condition_str'],
-                'foreach_str': None if not edge else edge.get('foreach_str'),
-                'selective_edge': False,  # always False as we are starting a task
-                'countdown': countdown,
-                'selective': self._selective
-            })
+            if Trace.enabled(Trace.TASK_SCHEDULE):
+                Trace.log(Trace.TASK_SCHEDULE, kwargs, {
+                    'task_id': async_result.task_id,
+                    'queue': Config.task_queues[node_name],
+                    'condition_str': None if not edge else edge['condition_str'],
+                    'foreach_str': None if not edge else edge.get('foreach_str'),
+                    'selective_edge': False,  # always False as we are starting a task
+                    'countdown': countdown,
+                    'selective': self._selective
+                })
 
         record = {
             'name': node_name,
@@ -378,19 +484,14 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         return record
 
-    def _fire_edge(self, edge_idx, edge, storage_pool, parent, node_args):
-        """Fire edge - start new nodes as described in edge table.
+    def _fire_edge_trace_msg(self, edge, parent):
+        """Construct trace message for events emitted when firing an edge.
 
-        :param edge: edge that should be fired
-        :param storage_pool: storage pool which makes results of previous tasks available
+        :param edge: edge that is fired
         :param parent: parent nodes
-        :param node_args: node arguments
-        :return: list of nodes that were scheduled
+        :return: trace message
         """
-        # pylint: disable=too-many-arguments,too-many-branches,too-many-locals
-        started = []
-        selective_reuse = []
-        trace_msg = {
+        return {
             'nodes_to': edge['to'],
             'nodes_from': edge['from'],
             'flow_name': self._flow_name,
@@ -402,6 +503,20 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
             'selective': self._selective
         }
 
+    def _fire_edge(self, edge_idx, edge, storage_pool, parent, node_args):
+        """Fire edge - start new nodes as described in edge table.
+
+        :param edge: edge that should be fired
+        :param storage_pool: storage pool which makes results of previous tasks available
+        :param parent: parent nodes
+        :param node_args: node arguments
+        :return: list of nodes that were scheduled
+        """
+        # pylint: disable=too-many-arguments,too-many-branches,too-many-locals
+        started = []
+        selective_reuse = []
+        trace_msg = functools.partial(self._fire_edge_trace_msg, edge, parent)
+
         nodes2start = None
         if self._selective:
             if edge_idx not in self._selective['waiting_edges_subset'][self._flow_name].keys():
@@ -411,7 +526,7 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                 nodes2start = self._selective['waiting_edges_subset'][self._flow_name][edge_idx]
 
         if 'foreach' in edge:
-            iterable = edge['foreach'](storage_pool, node_args)
+            iterable = edge['foreach'](storage_pool, resolve_node_args(node_args))
             Trace.log(Trace.FOREACH_RESULT, trace_msg, {'result': iterable})
             # handle None as well
             if not iterable:
@@ -500,7 +615,9 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         for idx, fallback in enumerate(failure_node['fallback']):
             trace_dict['fallback'] = fallback
             trace_dict['condition_strs'] = failure_node['condition_strs'][idx]
-            if not failure_node['conditions'][idx](StoragePool({}, self._flow_name), self._node_args):
+            condition = failure_node['conditions'][idx]
+            storage_pool = StoragePool({}, self._flow_name, dispatcher_id=self._dispatcher_id)
+            if not condition(storage_pool, resolve_node_args(self._node_args)):
                 Trace.log(Trace.FALLBACK_COND_FALSE, trace_dict)
                 continue
 
@@ -532,6 +649,34 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         return started, should_continue, skip_failure_node
 
+    def _failure_combinations(self, failed_nodes):
+        """Compute combinations of failed nodes that are present in the failure graph of the flow.
+
+        Only paths in the failure graph (see selinon.failure_node) that consist of failed nodes are followed, so we do
+        not need to inspect all 2^N combinations of N failed nodes.
+
+        :param failed_nodes: sorted list of failed nodes as stored in failed nodes (tuples of node name and ids)
+        :return: a list of tuples (combination, failure_node) in order in which fallbacks should be evaluated
+        """
+        ret = []
+        failure_nodes = Config.failures.get(self._flow_name, {})
+        # a stack of (index of the last node in failed_nodes, combination, failure_node)
+        stack = [(idx, (failed_node,), failure_nodes[failed_node[0]])
+                 for idx, failed_node in enumerate(failed_nodes) if failed_node[0] in failure_nodes]
+
+        while stack:
+            last_idx, combination, failure_node = stack.pop()
+            ret.append((combination, failure_node))
+
+            next_nodes = failure_node.get('next', {})
+            for idx in range(last_idx + 1, len(failed_nodes)):
+                if failed_nodes[idx][0] in next_nodes:
+                    stack.append((idx, combination + (failed_nodes[idx],), next_nodes[failed_nodes[idx][0]]))
+
+        # evaluate bigger combinations first, then respect alphabetical order of node names
+        ret.sort(key=lambda item: (-len(item[0]), [node[0] for node in item[0]]))
+        return ret
+
     def _compute_and_run_fallback(self):
         """Run fallback in the system.
 
@@ -541,27 +686,16 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         ret = []
         failed_nodes = sorted(self._failed_nodes.items())
 
-        # pylint: disable=too-many-nested-blocks
-        for i in range(len(failed_nodes), 0, -1):
-            for combination in itertools.combinations(failed_nodes, i):
-                try:
-                    failure_nodes = Config.failures[self._flow_name]
-                    failure_node = reduce(lambda n, c: n['next'][c[0]], combination[1:],
-                                          failure_nodes[combination[0][0]])
-                except KeyError:
-                    # such failure not found in the tree of permutations - this means that this
-                    # flow will always fail, but run defined fallbacks for defined failures first
-                    continue
-
-                while True:
-                    fallback_run, should_continue, skip_failure_node = self._run_fallback(failure_node, combination)
-                    ret.extend(fallback_run)
+        for combination, failure_node in self._failure_combinations(failed_nodes):
+            while True:
+                fallback_run, should_continue, skip_failure_node = self._run_fallback(failure_node, combination)
+                ret.extend(fallback_run)
 
-                    if not should_continue:
-                        return ret
+                if not should_continue:
+                    return ret
 
-                    if skip_failure_node or not all(node[0] in self._failed_nodes.keys() for node in combination):
-                        break
+                if skip_failure_node or not all(node[0] in self._failed_nodes.keys() for node in combination):
+                    break
 
         return ret
 
@@ -571,23 +705,25 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         :param nodes: nodes that will trigger edges.
         """
         res = []
+        edge_table = Config.edge_table[self._flow_name]
+        node2edge_idx = Config.node2edge_idx[self._flow_name]
+        nowait_nodes = Config.nowait_nodes.get(self._flow_name, [])
 
         for node in nodes:
-            for idx, edge in enumerate(Config.edge_table[self._flow_name]):
-                if node['name'] not in edge['from']:
-                    continue
-
-                if idx in self._waiting_edges_idx:
-                    continue
+            if node['name'] in nowait_nodes:
+                continue
 
-                if node['name'] in Config.nowait_nodes.get(self._flow_name, []):
+            # inspect only edges that wait for this node, see node2edge_idx in the generated config
+            for idx in node2edge_idx.get(node['name'], []):
+                if idx in self._waiting_edges_pos:
                     continue
 
                 if self._selective and idx not in self._selective['waiting_edges_subset'][self._flow_name]:
                     continue
 
                 res.append(node)
-                self._waiting_edges.append(edge)
+                self._waiting_edges_pos[idx] = len(self._waiting_edges_idx)
+                self._waiting_edges.append(edge_table[idx])
                 self._waiting_edges_idx.append(idx)
 
         return res
@@ -623,6 +759,14 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         def push_flow(s, p_n_name, flow_result, k):
             # pylint: disable=invalid-name,missing-docstring
+            if FinishedNodesStore.is_handle(flow_result[key]):
+                # Finished nodes of a huge flow were stored, pass just the handle - it is resolved lazily in tasks
+                shallow_k = copy.copy(k)
+                if not compound:
+                    shallow_k.append(p_n_name)
+                FinishedNodesStore.add_ref(follow_keys(res, shallow_k), flow_result[key], compound)
+                return
+
             for n_name, n_ids in flow_result[key].items():
                 if not compound:
                     shallow_k = copy.copy(k)
@@ -653,6 +797,28 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         return res
 
+    def _prefetch_condition_results(self, edge, from_nodes):
+        """Retrieve results of all nodes inspected by edge condition at once, see StoragePool.prefetch().
+
+        :param edge: edge which condition is going to be evaluated
+        :param from_nodes: a dict mapping source node names to node records that will be used for evaluation
+        :return: a dict mapping task id to prefetched task result
+        """
+        nodes = []
+        for node_name in edge.get('condition_nodes', []):
+            if node_name in from_nodes and not Config.is_flow(node_name):
+                nodes.extend((record['name'], record['id']) for record in from_nodes[node_name])
+
+        if len(nodes) < 2:
+            # Nothing to save here, let the storage pool retrieve result on demand
+            return None
+
+        try:
+            return StoragePool.prefetch(self._flow_name, nodes, dispatcher_id=self._dispatcher_id)
+        except StorageError as exc:
+            Trace.log(Trace.STORAGE_ISSUE, what=traceback.format_exc())
+            raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
+
     def _start_new_from_finished(self, new_finished):  # pylint: disable=too-many-locals
         """Start new based on finished nodes.
 
@@ -666,16 +832,17 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
         if len(new_finished) == 1 and not self._active_nodes and not self._finished_nodes:
             # propagate arguments from newly finished node if configured to do so
             if Config.node_args_from_first.get(self._flow_name, False):
-                self._node_args = StoragePool.retrieve(self._flow_name, new_finished[0]['name'], new_finished[0]['id'])
+                node_args = StoragePool.retrieve(self._flow_name, new_finished[0]['name'], new_finished[0]['id'],
+                                                 dispatcher_id=self._dispatcher_id)
+                self._node_args = store_node_args(self._flow_name, node_args)
+
+        node2edge_idx = Config.node2edge_idx[self._flow_name]
 
         for node in new_finished:
-            # We could optimize this by pre-computing affected edges in pre-generated config file for each
-            # node and computing intersection with waiting edges, but let's stick with this solution for now
-            edges = []
-            for waiting_edges_idx, edge_table_idx in enumerate(self._waiting_edges_idx):
-                # we have to store index to edge table, but inspect possible edge fires only in waiting edges
-                if node['name'] in self._waiting_edges[waiting_edges_idx]['from']:
-                    edges.append((edge_table_idx, self._waiting_edges[waiting_edges_idx]))
+            # Intersect pre-computed edges affected by the node with waiting edges, keep order of waiting edges
+            edges_pos = [self._waiting_edges_pos[idx] for idx in node2edge_idx.get(node['name'], [])
+                         if idx in self._waiting_edges_pos]
+            edges = [(self._waiting_edges_idx[pos], self._waiting_edges[pos]) for pos in sorted(edges_pos)]
 
             for i, edge in edges:
                 from_nodes = dict.fromkeys(edge['from'], [])
@@ -687,6 +854,8 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                         from_nodes[from_name] = [{'name': from_name, 'id': n}
                                                  for n in self._finished_nodes.get(from_name, [])]
 
+                prefetched = self._prefetch_condition_results(edge, from_nodes)
+
                 # if there are multiple nodes of a same type waiting on an edge:
                 #
                 #   A    B
@@ -716,10 +885,12 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
                     # We could also examine results of subflow, there could be passed a list of subflows with
                     # finished_nodes to 'condition' in order to do inspection
-                    storage_pool = StoragePool(storage_id_mapping, self._flow_name)
+                    storage_pool = StoragePool(storage_id_mapping, self._flow_name, prefetched=prefetched,
+                                               dispatcher_id=self._dispatcher_id)
 
                     try:
-                        condition_result = edge['condition'](storage_pool, self._node_args)
+                        with Trace.span('edge_condition', flow_name=self._flow_name, condition=edge['condition_str']):
+                            condition_result = edge['condition'](storage_pool, resolve_node_args(self._node_args))
                     except StorageError as exc:
                         Trace.log(Trace.STORAGE_ISSUE, what=traceback.format_exc())
                         raise DispatcherRetry(keep_state=True, adjust_retry_count=False) from exc
@@ -763,8 +934,8 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
                                      'node_args': self._node_args})
 
         for i, start_edge in Config.get_starting_edges(self._flow_name):
-            storage_pool = StoragePool(self._parent, self._flow_name)
-            if start_edge['condition'](storage_pool, self._node_args):
+            storage_pool = StoragePool(self._parent, self._flow_name, dispatcher_id=self._dispatcher_id)
+            if start_edge['condition'](storage_pool, resolve_node_args(self._node_args)):
                 records, reused = self._fire_edge(i, start_edge, storage_pool,
                                                   node_args=self._node_args, parent=self._parent)
 
@@ -821,6 +992,8 @@ class SystemState(object):  # pylint: disable=too-many-instance-attributes
 
         return new_started_nodes, selective_reuse, fallback_started
 
+    @Trace.spanned('system_state_update', lambda self: {'flow_name': self._flow_name,
+                                                        'dispatcher_id': self._dispatcher_id})
     def update(self):
         """Check the current state in the system and start new nodes if possible.
 
@@ -7,7 +7,10 @@
 """A raw Celery task that is responsible for running SelinonTask."""
 
 import json
+import os
+import random
 import sys
+import threading
 import traceback
 
 import jsonschema
@@ -16,6 +19,7 @@ from .celery import Task
 from .config import Config
 from .errors import FatalTaskError
 from .errors import Retry
+from .node_args_store import resolve_node_args
 from .storage_pool import StoragePool
 from .trace import Trace  # Ignore PyImportSortBear
 
@@ -30,6 +34,34 @@ class SelinonTaskEnvelope(Task):
     max_retries = None
     name = "selinon.SelinonTaskEnvelope"
 
+    # Compiled validators shared by all tasks in the process - schema path to a tuple (mtime, validator)
+    _validators = {}
+    _validators_lock = threading.Lock()
+
+    @classmethod
+    def get_validator(cls, schema_path):
+        """Get compiled validator for the given schema, schema is loaded again only if the schema file changed.
+
+        :param schema_path: path to JSON schema file
+        :return: validator instance for the given schema
+        """
+        mtime = os.stat(schema_path).st_mtime_ns
+        cached = cls._validators.get(schema_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(schema_path, "r") as input_file:
+            schema = json.load(input_file)
+
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        validator = validator_class(schema)
+
+        with cls._validators_lock:
+            cls._validators[schema_path] = (mtime, validator)
+
+        return validator
+
     @classmethod
     def validate_result(cls, task_name, result):
         """Validate result of the task for the given schema, if fails an Exception is raised.
@@ -38,14 +70,16 @@ class SelinonTaskEnvelope(Task):
         :param result: result of task
         """
         schema_path = Config.output_schemas.get(task_name)
-        if schema_path:
-            with open(schema_path, "r") as input_file:
-                schema = json.load(input_file)
+        if not schema_path:
+            return
 
-            jsonschema.validate(result, schema)
+        if Config.output_schema_sample_rate is not None and random.random() >= Config.output_schema_sample_rate:
+            return
+
+        cls.get_validator(schema_path).validate(result)
 
     def selinon_retry(self, task_name, flow_name, parent, node_args, retry_countdown, retried_count,
-                      dispatcher_id, user_retry=False):
+                      dispatcher_id, user_retry=False, meta=None):
         # pylint: disable=too-many-arguments
         """Retry on Celery level.
 
@@ -57,6 +91,7 @@ class SelinonTaskEnvelope(Task):
         :param retried_count: number of retries already done with this task
         :param dispatcher_id: ID id of dispatcher that is handling flow that run this task
         :param user_retry: True if retry was forced from the user
+        :param meta: meta of the message being processed
         """
         max_retry = Config.max_retry.get(task_name, 0)
         kwargs = {
@@ -67,6 +102,7 @@ class SelinonTaskEnvelope(Task):
             'dispatcher_id': dispatcher_id,
             'retried_count': retried_count
         }
+        Trace.add_span_meta(kwargs, meta)
 
         Trace.log(Trace.TASK_RETRY, {'flow_name': flow_name,
                                      'task_name': task_name,
@@ -82,7 +118,43 @@ class SelinonTaskEnvelope(Task):
                                      'max_retry': max_retry})
         raise self.retry(kwargs=kwargs, countdown=retry_countdown, queue=Config.task_queues[task_name])
 
-    def run(self, task_name, flow_name, parent, node_args, dispatcher_id, retried_count=None):
+    def notify_dispatcher(self, task_name, flow_name, dispatcher_id):
+        """Notify dispatcher handling the flow that the task finished or failed, if configured so.
+
+        :param task_name: name of the task that finished or failed
+        :param flow_name: name of flow in which the task was run
+        :param dispatcher_id: ID of dispatcher that is handling flow that run this task
+        """
+        if Config.dispatcher_notifier is None:
+            return
+
+        trace_msg = {
+            'flow_name': flow_name,
+            'task_name': task_name,
+            'task_id': self.request.id,
+            'dispatcher_id': dispatcher_id
+        }
+
+        try:
+            Config.dispatcher_notifier.notify(dispatcher_id, flow_name, task_name, self.request.id)
+        except Exception:  # pylint: disable=broad-except
+            # Not fatal, dispatcher will be retried based on sampling strategy
+            Trace.log(Trace.DISPATCHER_NOTIFIER_ISSUE, trace_msg, what=traceback.format_exc())
+        else:
+            Trace.log(Trace.DISPATCHER_NOTIFY, trace_msg)
+
+    def on_success(self, retval, task_id, args, kwargs):  # pylint: disable=unused-argument
+        """Notify dispatcher once Celery stored task state in result backend, see notify_dispatcher()."""
+        self.notify_dispatcher(kwargs['task_name'], kwargs['flow_name'], kwargs['dispatcher_id'])
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):  # pylint: disable=too-many-arguments,unused-argument
+        """Notify dispatcher once Celery stored task state in result backend, see notify_dispatcher()."""
+        self.notify_dispatcher(kwargs['task_name'], kwargs['flow_name'], kwargs['dispatcher_id'])
+
+    @Trace.spanned('task', lambda self, flow_name, task_name, **_: {'flow_name': flow_name,
+                                                                    'task_name': task_name,
+                                                                    'task_id': self.request.id})
+    def run(self, task_name, flow_name, parent, node_args, dispatcher_id, retried_count=None, meta=None):
         # pylint: disable=arguments-differ,too-many-arguments,too-many-locals
         """Task entry-point called by Celery.
 
@@ -92,6 +164,7 @@ class SelinonTaskEnvelope(Task):
         :param node_args: node arguments within the flow
         :param dispatcher_id: dispatcher id that handles flow
         :param retried_count: number of already attempts that failed so task was retried
+        :param meta: message meta, holds trace id and parent span id if span tracing is on
         :rtype: None
         """
         # we are passing args as one argument explicitly for now not to have troubles with *args and **kwargs mapping
@@ -111,12 +184,12 @@ class SelinonTaskEnvelope(Task):
                 task_id=self.request.id,
                 dispatcher_id=dispatcher_id
             )
-            result = task.run(node_args)
+            result = task.run(resolve_node_args(node_args))
             self.validate_result(task_name, result)
 
             storage = StoragePool.get_storage_name_by_task_name(task_name, graceful=True)
             if storage and not Config.storage_readonly[task_name]:
-                StoragePool.set(node_args, flow_name, task_name, self.request.id, result)
+                StoragePool.set(node_args, flow_name, task_name, self.request.id, result, dispatcher_id=dispatcher_id)
             elif result is not None:
                 Trace.log(Trace.TASK_DISCARD_RESULT, {'flow_name': flow_name,
                                                       'task_name': task_name,
@@ -129,7 +202,7 @@ class SelinonTaskEnvelope(Task):
         except Retry as retry:
             # we do not touch retried_count
             self.selinon_retry(task_name, flow_name, parent, node_args, retry.countdown, retried_count,
-                               dispatcher_id, user_retry=True)
+                               dispatcher_id, user_retry=True, meta=meta)
         except Exception as exc:  # pylint: disable=broad-except
             exc_info = sys.exc_info()
             max_retry = Config.max_retry.get(task_name, 0)
@@ -139,7 +212,7 @@ class SelinonTaskEnvelope(Task):
                 retried_count += 1
                 retry_countdown = Config.retry_countdown.get(task_name, 0)
                 self.selinon_retry(task_name, flow_name, parent, node_args, retry_countdown, retried_count,
-                                   dispatcher_id)
+                                   dispatcher_id, meta=meta)
             else:
                 Trace.log(Trace.TASK_FAILURE, {'flow_name': flow_name,
                                                'task_name': task_name,
@@ -154,7 +227,8 @@ class SelinonTaskEnvelope(Task):
                 storage = StoragePool.get_storage_name_by_task_name(task_name, graceful=True)
 
                 if storage and not Config.storage_readonly[task_name] \
-                        and not StoragePool.set_error(node_args, flow_name, task_name, self.request.id, exc_info):
+                        and not StoragePool.set_error(node_args, flow_name, task_name, self.request.id, exc_info,
+                                                      dispatcher_id=dispatcher_id):
                     # TODO: move conversion to string to enhanced JSON handler and rather pass objects in Trace.log()
                     Trace.log(Trace.STORAGE_OMIT_STORE_ERROR, {
                         'flow_name': flow_name,
@@ -106,8 +106,9 @@ A list of events that can be traced:
 |                            |                                     |                 |                                    |
 +----------------------------+-------------------------------------+-----------------+------------------------------------+
 |                            | Requested result of task was        |                 |                                    |
-|   `STORAGE_RETRIEVED`      | retrieved.                          | Dispatcher/Task |                                    |
-|                            |                                     |                 |                                    |
+|   `STORAGE_RETRIEVED`      | retrieved.                          | Dispatcher/Task | task_name, storage_task_name,      |
+|                            |                                     |                 | storage_name, flow_name, task_id,  |
+|                            |                                     |                 | elapsed                            |
 +----------------------------+-------------------------------------+-----------------+------------------------------------+
 |                            | Store result of task in the         |                 |                                    |
 |   `STORAGE_STORE`          | assigned storage.                   | Task            |                                    |
@@ -184,22 +185,72 @@ A list of events that can be traced:
 |                            | adapter or `store_error()` is not   |                 |                                    |
 |                            | implemented.                        |                 |                                    |
 +----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Task notified dispatcher handling   |                 | dispatcher_id, flow_name,          |
+|   `DISPATCHER_NOTIFY`      | the flow that task finished or      | Task            | task_name, task_id                 |
+|                            | failed (see DispatcherNotifier).    |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Dispatcher notifier raised an       |                 | dispatcher_id, flow_name, what     |
+| `DISPATCHER_NOTIFIER_ISSUE`| exception, dispatcher will be       | Dispatcher/Task |                                    |
+|                            | woken up based on sampling strategy.|                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Retrieve results of multiple tasks  |                 | flow_name, storage_name,           |
+|  `STORAGE_RETRIEVE_MANY`   | from storage at once (see           | Dispatcher      | task_names, task_ids               |
+|                            | StoragePool.prefetch()).            |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Large flow arguments were stored    |                 | flow_name, storage_name, digest,   |
+|     `NODE_ARGS_STORE`      | and replaced with a reference (see  | Dispatcher/Task | size                               |
+|                            | NodeArgsStore).                     |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Flow arguments passed as a          |                 | flow_name, storage_name, digest    |
+|    `NODE_ARGS_RETRIEVE`    | reference were not found in worker  | Dispatcher/Task |                                    |
+|                            | cache and are retrieved.            |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Finished nodes of a huge flow were  |                 | flow_name, dispatcher_id,          |
+|  `FINISHED_NODES_STORE`    | stored in chunks and replaced with  | Dispatcher      | storage_name, node_count,          |
+|                            | a handle (see FinishedNodesStore).  |                 | chunk_count                        |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | A chunk of finished nodes passed as |                 | flow_name, dispatcher_id,          |
+| `FINISHED_NODES_RETRIEVE`  | a handle is retrieved.              | Task            | storage_name, chunk_id             |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
+|                            | Results of multiple tasks were      |                 | flow_name, storage_name,           |
+| `STORAGE_RETRIEVED_MANY`   | retrieved from storage at once.     | Dispatcher      | task_names, task_ids, elapsed      |
+|                            |                                     |                 |                                    |
++----------------------------+-------------------------------------+-----------------+------------------------------------+
 
+Each trace function can be subscribed only to events it is interested in, events are stated by their value (e.g.
+`Trace.TASK_END`) or by their name (e.g. `'TASK_END'`):
+
+.. code-block:: python
+
+  Trace.trace_by_func(my_trace_func, events=(Trace.TASK_START, Trace.TASK_END))
+
+Messages of events nobody is subscribed to are not constructed at all. Parts of messages passed to `Trace.log()` can
+be callables returning dicts that are called only if there is a trace function subscribed to the event. Use
+`Trace.enabled()` to avoid expensive computation of message details otherwise.
 """
 
 import datetime
 import functools
+import inspect
 import json
 import logging
 import platform
 import sys
 
+from .span import NOOP_SPAN
+from .span import Span
+from .span import current_span
+
 
 class Trace(object):
     """Trace system flow actions."""
 
+    # A list of tuples - trace function and a frozenset of events it is subscribed to, None for all events
     _trace_functions = []
     _logger = None
+    _metrics_tracer = None
+    _span_exporter = None
+    _sampler = None
 
     DISPATCHER_WAKEUP, \
         FLOW_START, \
@@ -250,7 +301,15 @@ class Trace(object):
         MIGRATION_SKEW,\
         MIGRATION_TAINTED_FLOW, \
         MIGRATION_ERROR, \
-        EAGER_FAILURE = range(50)
+        EAGER_FAILURE, \
+        DISPATCHER_NOTIFY, \
+        DISPATCHER_NOTIFIER_ISSUE, \
+        STORAGE_RETRIEVE_MANY, \
+        NODE_ARGS_STORE, \
+        NODE_ARGS_RETRIEVE, \
+        FINISHED_NODES_STORE, \
+        FINISHED_NODES_RETRIEVE, \
+        STORAGE_RETRIEVED_MANY = range(58)
 
     WARN_EVENTS = (
         NODE_FAILURE,
@@ -266,7 +325,8 @@ class Trace(object):
         FLOW_RETRY,
         MIGRATION_SKEW,
         MIGRATION_ERROR,
-        EAGER_FAILURE
+        EAGER_FAILURE,
+        DISPATCHER_NOTIFIER_ISSUE
     )
 
     _event_strings = (
@@ -319,7 +379,15 @@ class Trace(object):
         'MIGRATION_SKEW',
         'MIGRATION_TAINTED_FLOW',
         'MIGRATION_ERROR',
-        'EAGER_FAILURE'
+        'EAGER_FAILURE',
+        'DISPATCHER_NOTIFY',
+        'DISPATCHER_NOTIFIER_ISSUE',
+        'STORAGE_RETRIEVE_MANY',
+        'NODE_ARGS_STORE',
+        'NODE_ARGS_RETRIEVE',
+        'FINISHED_NODES_STORE',
+        'FINISHED_NODES_RETRIEVE',
+        'STORAGE_RETRIEVED_MANY'
     )
 
     def __init__(self):
@@ -327,21 +395,44 @@ class Trace(object):
         raise NotImplementedError()
 
     @classmethod
-    def trace_by_logging(cls, logger=None):
+    def _subscribe(cls, func, events=None):
+        """Register a trace function for the given events.
+
+        :param func: trace function to be registered
+        :param events: events (or their names) the trace function is interested in, None for all events
+        """
+        if events is not None:
+            events = frozenset(cls.str2event(event) if isinstance(event, str) else event for event in events)
+
+        cls._trace_functions.append((func, events))
+
+    @classmethod
+    def trace_by_logging(cls, logger=None, events=None):
         """Trace by using Python's logging.
 
         :param logger: optional logger that should be used
+        :param events: events that should be traced, None for all events
         """
         if not logger and not cls._logger:
             logger = logging.getLogger(__name__)
 
         cls._logger = logger
-        cls._trace_functions.append(cls.logging_trace_func)
+        cls._subscribe(cls.logging_trace_func, events)
 
     @classmethod
-    def trace_by_json(cls):
-        """Trace by writing directly JSON trace points."""
-        cls._trace_functions.append(cls.json_trace_func)
+    def trace_by_json(cls, events=None, buffered=None):
+        """Trace by writing directly JSON trace points.
+
+        :param events: events that should be traced, None for all events
+        :param buffered: a dict with BufferedTracer configuration to write JSON trace points in a background thread,
+                         None to write trace points synchronously
+        """
+        if buffered is None:
+            cls._subscribe(cls.json_trace_func, events)
+            return
+
+        from .buffered_trace import BufferedTracer
+        cls._subscribe(BufferedTracer(**buffered), events)
 
     @classmethod
     def trace_by_sentry(cls, dsn=None):
@@ -355,34 +446,167 @@ class Trace(object):
             raise ImportError("Failed to import Raven for Sentry logging, install it using `pip3 install raven`")\
                 from exc
 
-        cls._trace_functions.append(functools.partial(cls.sentry_trace_func, Client(dsn)))
+        cls._subscribe(functools.partial(cls.sentry_trace_func, Client(dsn)), (cls.TASK_FAILURE,))
+
+    @classmethod
+    def trace_by_metrics(cls, metrics_tracer=None, events=None):
+        """Aggregate trace events to in-process metrics, see selinon.metrics.
+
+        :param metrics_tracer: an instance of MetricsTracer to be used, a new one is created if None
+        :param events: events that should be aggregated, None for all events
+        :return: registered metrics tracer
+        """
+        if metrics_tracer is None:
+            from .metrics import MetricsTracer
+            metrics_tracer = MetricsTracer()
+
+        cls._metrics_tracer = metrics_tracer
+        cls._subscribe(metrics_tracer, events)
+        return metrics_tracer
 
     @classmethod
-    def trace_by_func(cls, func):
+    def get_metrics_tracer(cls):
+        """Get metrics tracer registered using trace_by_metrics().
+
+        :return: registered metrics tracer, None if metrics are not computed
+        """
+        return cls._metrics_tracer
+
+    @classmethod
+    def trace_by_spans(cls, output=None, sink=None):
+        """Record nested timings of dispatcher wakeups and task execution, see selinon.span.
+
+        :param output: a path to file to append spans to, a file-like object or None for stdout
+        :param sink: a callable accepting a list of finished spans, used instead of output if provided
+        """
+        from .span import SpanExporter
+        cls._span_exporter = SpanExporter(output=output, sink=sink)
+
+    @classmethod
+    def span(cls, name, meta=None, **attributes):
+        """Create a span measuring an operation, use it as a context manager.
+
+        :param name: name of the operation
+        :param meta: message meta with trace id and parent span id to continue in, used for top-level spans
+        :param attributes: additional span information
+        :return: a span, a no-op span if span tracing is off
+        """
+        if cls._span_exporter is None:
+            return NOOP_SPAN
+
+        return Span(name, cls._span_exporter, meta, attributes)
+
+    @classmethod
+    def spanned(cls, name, attributes=None):
+        """Decorate a function so that each call is measured by a span, see span().
+
+        Message meta is taken from 'meta' argument of the decorated function, if any.
+
+        :param name: name of the operation
+        :param attributes: a callable computing additional span information, it is called with arguments of the
+                           decorated function passed as keyword arguments
+        :return: decorator
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if cls._span_exporter is None:
+                    return func(*args, **kwargs)
+
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                span_attributes = attributes(**arguments.arguments) if attributes else {}
+                with cls.span(name, arguments.arguments.get('meta'), **span_attributes):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @classmethod
+    def span_meta(cls, meta=None):
+        """Get message meta that propagates the current span to a scheduled message.
+
+        :param meta: meta of the message being processed, passed through if there is no open span
+        :return: a dict with trace id and parent span id, None if there is nothing to propagate
+        """
+        span = current_span() if cls._span_exporter is not None else None
+        if span is None:
+            return meta
+
+        return span.meta()
+
+    @classmethod
+    def add_span_meta(cls, kwargs, meta=None):
+        """Add message meta that propagates the current span to arguments of a scheduled message, see span_meta().
+
+        :param kwargs: arguments of the scheduled message, meta is added only if there is something to propagate
+        :param meta: meta of the message being processed, passed through if there is no open span
+        """
+        meta = cls.span_meta(meta)
+        if meta:
+            kwargs['meta'] = meta
+
+    @classmethod
+    def set_sampler(cls, sampler):
+        """Sample and rate limit traced events, see selinon.trace_sampler.
+
+        :param sampler: an instance of TraceSampler, None to record all events
+        """
+        cls._sampler = sampler
+
+    @classmethod
+    def trace_by_func(cls, func, events=None):
         """Trace by a custom function.
 
         :param func: function with a one single argument
+        :param events: events that should be traced, None for all events
         """
-        cls._trace_functions.append(func)
+        cls._subscribe(func, events)
+
+    @classmethod
+    def enabled(cls, event):
+        """Check whether there is any trace function subscribed to the given event.
+
+        :param event: tracing event
+        :return: True if the event should be traced
+        """
+        for _, events in cls._trace_functions:
+            if events is None or event in events:
+                return True
+
+        return False
 
     @classmethod
     def log(cls, event, *msg_dict, **msg_dict_kwargs):
         """Log an event.
 
         :param event: tracing event
-        :param msg_dict: message to be printed
+        :param msg_dict: message to be printed, a dict or a callable returning dict that is called only if needed
         :param msg_dict_kwargs: kwargs like dictionary for traced details
         """
         if not cls._trace_functions:
             return
 
+        trace_functions = [func for func, events in cls._trace_functions if events is None or event in events]
+        if not trace_functions:
+            return
+
         to_report = {}
         for msg in msg_dict:
-            to_report.update(msg)
+            to_report.update(msg() if callable(msg) else msg)
 
         to_report.update(msg_dict_kwargs)
 
-        for trace_func in cls._trace_functions:
+        if cls._sampler is not None and not cls._sampler.should_record(event, to_report):
+            # Metrics are computed from all events so they are not skewed by sampling
+            if cls._metrics_tracer is None or cls._metrics_tracer not in trace_functions:
+                return
+            trace_functions = (cls._metrics_tracer,)
+
+        for trace_func in trace_functions:
             trace_func(event, to_report)
 
     @classmethod
@@ -394,6 +618,18 @@ class Trace(object):
         """
         return cls._event_strings[event]
 
+    @classmethod
+    def str2event(cls, event_str):
+        """Translate string representation of an event to event.
+
+        :param event_str: string representation of event
+        :return: event
+        """
+        try:
+            return cls._event_strings.index(event_str)
+        except ValueError as exc:
+            raise ValueError("Unknown trace event %r" % event_str) from exc
+
     @classmethod
     def logging_trace_func(cls, event, msg_dict, logger=None):
         """Trace to Python's logging facilities.
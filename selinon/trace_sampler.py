@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+"""Sampling and rate limiting of traced events.
+
+Recording all events of all flows can be too expensive. TraceSampler decides which events are passed to trace
+functions:
+
+  * head-based sampling keyed by dispatcher id - the decision is computed from a hash of dispatcher id, so either all
+    events of a flow are recorded (on all workers) or none of them, including storage and task result cache events;
+    events that do not state dispatcher id (e.g. storage events caused outside of a flow) are sampled by task id or
+    randomly
+  * per-event rate limits - maximum number of events per second, computed per worker process
+  * events that are always recorded regardless of sampling and rate limits - warnings (Trace.WARN_EVENTS) and
+    dispatcher failures by default
+
+Sample rate and rate limits can be configured per flow:
+
+.. code-block:: python
+
+  from selinon import Trace
+  from selinon import TraceSampler
+
+  Trace.set_sampler(TraceSampler(sample_rate=0.01,
+                                 rate_limits={'NODE_STATE_CACHE_HIT': 100},
+                                 flows={'flow1': {'sample_rate': 1.0}}))
+
+Note that the metrics tracer (see selinon.metrics) aggregates all events, so metrics are not skewed by sampling.
+"""
+
+import random
+import threading
+import time
+import zlib
+
+from .errors import ConfigurationError
+from .trace import Trace
+
+
+class TraceSampler(object):
+    """Decide which traced events should be recorded."""
+
+    # Events recorded regardless of sampling and rate limits if not configured otherwise
+    DEFAULT_ALWAYS_RECORD = Trace.WARN_EVENTS + (Trace.DISPATCHER_FAILURE,)
+
+    _FLOW_CONF_OPTS = ('sample_rate', 'rate_limits')
+
+    def __init__(self, sample_rate=1.0, rate_limits=None, always_record=None, flows=None):
+        """Instantiate trace sampler.
+
+        :param sample_rate: fraction of flows which events are recorded, from 0.0 to 1.0
+        :param rate_limits: a dict mapping event (or its name) to maximum number of events recorded per second
+        :param always_record: events (or their names) recorded regardless of sampling and rate limits, None for
+                              DEFAULT_ALWAYS_RECORD
+        :param flows: a dict mapping flow name to a dict with sample_rate and rate_limits overriding the defaults
+        """
+        self.sample_rate = self._check_sample_rate(sample_rate)
+        self.rate_limits = self._parse_rate_limits(rate_limits)
+
+        if always_record is None:
+            always_record = self.DEFAULT_ALWAYS_RECORD
+        self.always_record = frozenset(self._str2event(event) for event in always_record)
+
+        self.flows = {}
+        for flow_name, flow_conf in (flows or {}).items():
+            if not isinstance(flow_conf, dict):
+                raise ConfigurationError("Trace sampling configuration of flow %r should be a dict, got %r instead"
+                                         % (flow_name, flow_conf))
+
+            unknown_conf = set(flow_conf.keys()) - set(self._FLOW_CONF_OPTS)
+            if unknown_conf:
+                raise ConfigurationError("Unknown trace sampling configuration for flow %r supplied: %s"
+                                         % (flow_name, sorted(unknown_conf)))
+
+            rate_limits = dict(self.rate_limits)
+            rate_limits.update(self._parse_rate_limits(flow_conf.get('rate_limits')))
+            self.flows[flow_name] = (self._check_sample_rate(flow_conf.get('sample_rate', self.sample_rate)),
+                                     rate_limits)
+
+        self._lock = threading.Lock()
+        # (flow name or None, event) -> (tokens, last update)
+        self._buckets = {}
+
+    @staticmethod
+    def _str2event(event):
+        """Translate event name to event, check the event exists.
+
+        :param event: event or its name
+        :return: event
+        """
+        if not isinstance(event, str):
+            return event
+
+        try:
+            return Trace.str2event(event)
+        except ValueError as exc:
+            raise ConfigurationError("Unknown trace event %r supplied in trace sampling configuration"
+                                     % event) from exc
+
+    @staticmethod
+    def _check_sample_rate(sample_rate):
+        """Check sample rate is a number in range from 0.0 to 1.0.
+
+        :param sample_rate: sample rate to check
+        :return: sample rate
+        """
+        if isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float)) \
+                or not 0.0 <= sample_rate <= 1.0:
+            raise ConfigurationError("Trace sample rate has to be a number in range from 0.0 to 1.0, got %r"
+                                     % sample_rate)
+
+        return sample_rate
+
+    @classmethod
+    def _parse_rate_limits(cls, rate_limits):
+        """Parse rate limits, translate event names to events.
+
+        :param rate_limits: a dict mapping event (or its name) to maximum number of events per second
+        :return: a dict mapping event to maximum number of events per second
+        """
+        if rate_limits is None:
+            return {}
+
+        if not isinstance(rate_limits, dict):
+            raise ConfigurationError("Trace rate limits should be a dict mapping event name to maximum number of "
+                                     "events per second, got %r instead" % rate_limits)
+
+        result = {}
+        for event, limit in rate_limits.items():
+            if isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit <= 0:
+                raise ConfigurationError("Trace rate limit for event %r should be a positive number, got %r instead"
+                                         % (event, limit))
+            result[cls._str2event(event)] = limit
+
+        return result
+
+    @staticmethod
+    def is_sampled(key, sample_rate):
+        """Check whether events keyed by the given key are sampled, the decision is the same in all processes.
+
+        :param key: key to sample by, e.g. dispatcher id, None to decide randomly
+        :param sample_rate: fraction of keys that are sampled
+        :return: True if events keyed by the key should be recorded
+        """
+        if sample_rate >= 1.0:
+            return True
+
+        if key is None:
+            return random.random() < sample_rate
+
+        return zlib.crc32(str(key).encode()) < sample_rate * 0x100000000
+
+    def _acquire(self, bucket_key, limit):
+        """Take a token from token bucket that refills with limit tokens per second.
+
+        :param bucket_key: key of token bucket
+        :param limit: maximum number of events per second, also size of the bucket
+        :return: True if a token was taken
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last_update = self._buckets.get(bucket_key, (limit, now))
+            tokens = min(limit, tokens + (now - last_update) * limit)
+            if tokens < 1:
+                self._buckets[bucket_key] = (tokens, now)
+                return False
+
+            self._buckets[bucket_key] = (tokens - 1, now)
+            return True
+
+    def should_record(self, event, msg_dict):
+        """Decide whether the event should be recorded.
+
+        :param event: traced event
+        :param msg_dict: a dict holding additional trace information for event
+        :return: True if the event should be passed to trace functions
+        """
+        if event in self.always_record:
+            return True
+
+        flow_name = msg_dict.get('flow_name')
+        flow_conf = self.flows.get(flow_name)
+        if flow_conf is None:
+            sample_rate, rate_limits, bucket_flow = self.sample_rate, self.rate_limits, None
+        else:
+            sample_rate, rate_limits = flow_conf
+            bucket_flow = flow_name
+
+        if not self.is_sampled(msg_dict.get('dispatcher_id') or msg_dict.get('task_id'), sample_rate):
+            return False
+
+        limit = rate_limits.get(event)
+        if limit is not None:
+            return self._acquire((bucket_flow, event), limit)
+
+        return True
@@ -11,6 +11,7 @@ import logging
 from .config import Config
 from .dispatcher import Dispatcher
 from .errors import UnknownFlowError
+from .node_args_store import store_node_args
 from .selective import compute_selective_run
 
 _logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -27,6 +28,7 @@ def run_flow(flow_name, node_args=None):
         raise UnknownFlowError("No flow with name '%s' defined" % flow_name)
 
     queue = Config.dispatcher_queues[flow_name]
+    node_args = store_node_args(flow_name, node_args)
     _logger.debug("Scheduling flow '%s' with node_args '%s' on queue '%s'", flow_name, node_args, queue)
     return Dispatcher().apply_async(kwargs={'flow_name': flow_name,
                                             'node_args': node_args},
@@ -46,6 +48,7 @@ def run_flow_selective(flow_name, task_names, node_args, follow_subflows=False,
     """
     selective = compute_selective_run(flow_name, task_names, follow_subflows, run_subsequent)
     queue = Config.dispatcher_queues[flow_name]
+    node_args = store_node_args(flow_name, node_args)
 
     _logger.debug("Scheduling selective flow '%s' with node_args '%s' on queue '%s', computed selective run state: %s",
                   flow_name, node_args, queue, selective)
@@ -7,8 +7,14 @@
 
 import os
 import copy
+import shutil
 import pytest
+from selinon import CompactStateEncoder
+from selinon.migrations import MigrationChain
 from selinon.migrations import Migrator
+from selinon.migrations.migration_chain import ComposedMigration
+from selinon.migrations.migration_chain import MigrationStep
+from selinon.migrations.tainted_flow_strategy import TaintedFlowStrategy
 from selinon.errors import MigrationFlowFail
 from selinon.errors import MigrationFlowRetry
 from selinon.errors import MigrationSkew
@@ -153,6 +159,21 @@ class TestPerformMigration(SelinonTestCase):
         assert new_migration_version == 2
         assert tainted is True
 
+    def test_migration_compact_state(self):
+        """Test that migrations are performed on compactly encoded state."""
+        original_state = state_dict(active_nodes=[{'name': 'Task3', 'id': 'id3'}],
+                                    waiting_edges=[1, 2],
+                                    finished_nodes={'Task1': ['id1'], 'Task2': ['id2']})
+        migrator = Migrator(self.get_migration_dir('test_migration_chaining_tainted'))
+
+        migrated_state, new_migration_version, tainted = migrator.perform_migration(
+            'flow1', CompactStateEncoder().encode(original_state), 0
+        )
+
+        assert migrated_state == dict(original_state, waiting_edges=[1])
+        assert new_migration_version == 2
+        assert tainted is True
+
     @migrate_message_exception(MigrationSkew, 'flow1', 0, state_dict(active_nodes=[{'name': 'Task1', 'id': 'id1'}]))
     def test_migration_skew(self, _):
         """Test signalizing migration skew - migration version is from future i.e. version file not present."""
@@ -208,3 +229,55 @@ class TestPerformMigration(SelinonTestCase):
             'from': ['Task2'],
             'to': ['Task3']
         }
+
+    def test_migration_chain_cache(self, tmpdir):
+        """Test parsed migrations are reused until the migration directory changes."""
+        migration_dir = str(tmpdir.join('migrations'))
+        shutil.copytree(self.get_migration_dir('test_migration_chaining'), migration_dir)
+        original_state = state_dict(active_nodes=[{'name': 'Task2', 'id': 'id2'}],
+                                    waiting_edges=[1],
+                                    finished_nodes={'Task1': 'id1'})
+
+        migrated_state, new_migration_version, _ = Migrator(migration_dir).perform_migration(
+            'flow1', copy.deepcopy(original_state), 1
+        )
+        assert new_migration_version == 3
+
+        chain = MigrationChain.get(migration_dir)
+        composed = chain.compose('flow1', 1)
+        assert Migrator(migration_dir).perform_migration('flow1', copy.deepcopy(original_state), 1) == \
+            (migrated_state, 3, False)
+        assert MigrationChain.get(migration_dir) is chain
+        assert chain.compose('flow1', 1) is composed
+
+        # a new migration file is picked once the migration directory changes
+        shutil.copy(os.path.join(migration_dir, '3.json'), os.path.join(migration_dir, '4.json'))
+        mtime = os.stat(migration_dir).st_mtime_ns + 1000000000
+        os.utime(migration_dir, ns=(mtime, mtime))
+        assert MigrationChain.get(migration_dir).latest_migration_version == 4
+
+    def test_compose_translations(self):
+        """Test consecutive migrations that only translate edges are merged into a single translation."""
+        def step(version, translation, tainting_nodes=None):
+            return MigrationStep(version, TaintedFlowStrategy.IGNORE, {
+                'translation': translation,
+                'tainted_edges': {},
+                'tainting_nodes': tainting_nodes or {}
+            })
+
+        composed = ComposedMigration([
+            step(2, {'1': 2, '2': 1}),
+            step(3, {'1': None, '3': 4}),
+            step(4, {'2': 3}),
+            step(5, {'5': 6}, tainting_nodes={'7': ['Task1']}),
+            step(6, {'6': 0})
+        ], latest_migration_version=6)
+
+        assert composed.segments[0] == {1: 3, 2: None, 3: 4}
+        assert isinstance(composed.segments[1], MigrationStep)
+        assert composed.segments[2] == {6: 0}
+
+        state = state_dict(waiting_edges=[1, 2, 3, 5], active_nodes=[{'name': 'Task1', 'id': 'id1'}])
+        migrated_state, tainted = composed.apply(state)
+        assert migrated_state['waiting_edges'] == [3, 4, 0, 7]
+        assert tainted is False
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+class RedisPipelineMock(object):
+    def __init__(self, redis_mock):
+        self.redis_mock = redis_mock
+        self.commands = []
+
+    def __getattr__(self, item):
+        def command(*args, **kwargs):
+            self.commands.append((item, args, kwargs))
+            return self
+        return command
+
+    def execute(self):
+        self.redis_mock.round_trips += 1
+        result = [getattr(self.redis_mock, item)(*args, _round_trip=False, **kwargs)
+                  for item, args, kwargs in self.commands]
+        self.commands = []
+        return result
+
+
+class _ConnectionPoolMock(object):
+    def disconnect(self):
+        pass
+
+
+class RedisMock(object):
+    """An in-memory Redis connection replacement, counts round trips and bytes transferred."""
+
+    def __init__(self):
+        self.connection_pool = _ConnectionPoolMock()
+        self.data = {}
+        self.ttl = {}
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def _count(self, round_trip, sent=(), received=()):
+        self.round_trips += int(round_trip)
+        self.bytes_sent += sum(len(item) for item in sent if item is not None)
+        self.bytes_received += sum(len(item) for item in received if item is not None)
+
+    def pipeline(self, transaction=True):
+        return RedisPipelineMock(self)
+
+    def set(self, key, value, ex=None, _round_trip=True):
+        self.data[key] = _to_bytes(value)
+        self._count(_round_trip, sent=(self.data[key],))
+        if ex:
+            self.ttl[key] = ex
+        return True
+
+    def get(self, key, _round_trip=True):
+        value = self.data.get(key)
+        self._count(_round_trip, received=(value,))
+        return value
+
+    def mget(self, keys, _round_trip=True):
+        values = [self.data.get(key) for key in keys]
+        self._count(_round_trip, received=values)
+        return values
+
+    def hset(self, key, mapping, _round_trip=True):
+        values = {field: _to_bytes(value) for field, value in mapping.items()}
+        self.data.setdefault(key, {}).update(values)
+        self._count(_round_trip, sent=values.values())
+        return len(mapping)
+
+    def hmget(self, key, fields, _round_trip=True):
+        record = self.data.get(key, {})
+        values = [record.get(field) for field in fields]
+        self._count(_round_trip, received=values)
+        return values
+
+    def expire(self, key, seconds, _round_trip=True):
+        self._count(_round_trip)
+        self.ttl[key] = seconds
+        return key in self.data
@@ -71,6 +71,9 @@ class SelinonTestCase(object):
         SystemState._throttled_flows = {}
         # Make sure we restore tracing function in tests
         Trace._trace_functions = []
+        Trace._metrics_tracer = None
+        Trace._span_exporter = None
+        Trace._sampler = None
 
     def teardown_method(self, method):
         """Clean up resources and configuration after a test."""
@@ -85,6 +88,11 @@ class SelinonTestCase(object):
         Config.edge_table = edge_table
         flows = list(edge_table.keys())
 
+        Config.node2edge_idx = kwargs.pop('node2edge_idx', Config._compute_node2edge_idx(edge_table))
+
+        Config.selective_runs = kwargs.pop('selective_runs', {})
+        Config.selective_runs_cache = LRU(max_cache_size=Config.selective_runs_cache_size)
+
         Config.flows = kwargs.pop('flows', flows)
         Config.nowait_nodes = kwargs.pop('nowait_nodes', dict.fromkeys(flows, []))
         Config.eager_failures = kwargs.pop('eager_failures', dict.fromkeys(flows, []))
@@ -112,6 +120,12 @@ class SelinonTestCase(object):
         Config.output_schemas = kwargs.pop('output_schemas', {})
         Config.async_result_cache = kwargs.pop('async_result_cache', _AsyncResultCacheMock(Config.is_flow))
         Config.selective_run_task = kwargs.pop('selective_run_task', _SelectiveRunFunctionMock())
+        Config.result_backend_batcher = kwargs.pop('result_backend_batcher', None)
+        Config.dispatcher_notifier = kwargs.pop('dispatcher_notifier', None)
+        Config.node_args_store = kwargs.pop('node_args_store', None)
+        Config.state_encoder = kwargs.pop('state_encoder', None)
+        Config.finished_nodes_store = kwargs.pop('finished_nodes_store', None)
+        Config.output_schema_sample_rate = kwargs.pop('output_schema_sample_rate', None)
         Config.initialized = True
 
         if kwargs:
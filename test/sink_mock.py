@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+
+class ListSinkMock(object):
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+
+    @property
+    def items(self):
+        return [item for batch in self.batches for item in batch]
+
+    @property
+    def task_ids(self):
+        return [report['details']['task_id'] for report in self.items]
+
+    def by_name(self, name):
+        return [span for span in self.items if span['name'] == name]
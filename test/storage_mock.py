@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from selinon import DataStorage
+
+
+class DictStorageMock(DataStorage):
+    def __init__(self):
+        self.records = {}
+        self.store_calls = 0
+        self.retrieve_calls = 0
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def store(self, node_args, flow_name, task_name, task_id, result):
+        self.store_calls += 1
+        self.records[(flow_name, task_name, task_id)] = result
+        return task_id
+
+    def retrieve(self, flow_name, task_name, task_id):
+        self.retrieve_calls += 1
+        return self.records[(flow_name, task_name, task_id)]
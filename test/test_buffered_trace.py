@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import io
+import json
+
+import pytest
+from selinon_test_case import SelinonTestCase
+from sink_mock import ListSinkMock
+
+from selinon import BufferedTracer
+from selinon import ConfigurationError
+from selinon import Trace
+
+
+class TestBufferedTrace(SelinonTestCase):
+    def test_batches(self):
+        sink = ListSinkMock()
+        tracer = BufferedTracer(sink=sink, batch_size=2, flush_interval=60)
+        Trace.trace_by_func(tracer)
+
+        for idx in range(5):
+            Trace.log(Trace.TASK_START, {'task_id': idx})
+
+        assert tracer.flush(timeout=5)
+        assert sink.task_ids == list(range(5))
+        assert all(len(batch) <= 2 for batch in sink.batches)
+        assert sink.batches[0][0]['event'] == 'TASK_START'
+
+        tracer.close()
+        Trace.log(Trace.TASK_START, {'task_id': 5})
+        assert sink.task_ids == list(range(5))
+
+    def test_output(self):
+        output = io.StringIO()
+        tracer = BufferedTracer(output=output, flush_interval=60)
+
+        tracer(Trace.TASK_END, {'task_id': '<task-id>'})
+        tracer.close()
+
+        reports = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert len(reports) == 1
+        assert reports[0]['event'] == 'TASK_END'
+        assert reports[0]['details'] == {'task_id': '<task-id>'}
+
+    @pytest.mark.parametrize('drop_policy,expected', (
+        (BufferedTracer.DROP_NEWEST, [0, 1, 2]),
+        (BufferedTracer.DROP_OLDEST, [2, 3, 4]),
+    ))
+    def test_drop_policy(self, drop_policy, expected):
+        sink = ListSinkMock()
+        # the background thread waits for a full batch or for flush interval, so the queue is filled
+        tracer = BufferedTracer(sink=sink, batch_size=100, flush_interval=60, max_queue_size=3,
+                                drop_policy=drop_policy)
+
+        for idx in range(5):
+            tracer(Trace.TASK_START, {'task_id': idx})
+
+        assert tracer.dropped == 2
+        assert tracer.flush(timeout=5)
+        assert sink.task_ids == expected
+        tracer.close()
+
+    def test_block_policy(self):
+        sink = ListSinkMock()
+        tracer = BufferedTracer(sink=sink, batch_size=1, flush_interval=60, max_queue_size=1,
+                                drop_policy=BufferedTracer.BLOCK)
+
+        for idx in range(10):
+            tracer(Trace.TASK_START, {'task_id': idx})
+
+        tracer.close()
+        assert tracer.dropped == 0
+        assert sink.task_ids == list(range(10))
+
+    def test_sink_error(self):
+        def failing_sink(batch):
+            raise ValueError("Sink is not available")
+
+        tracer = BufferedTracer(sink=failing_sink, flush_interval=60)
+        tracer(Trace.TASK_START, {'task_id': 0})
+
+        # errors in sink are not propagated
+        assert tracer.flush(timeout=5)
+        tracer.close()
+
+    def test_configuration_error(self):
+        with pytest.raises(ConfigurationError):
+            BufferedTracer(drop_policy='unknown')
+
+        with pytest.raises(ConfigurationError):
+            BufferedTracer(max_queue_size=0)
@@ -6,8 +6,19 @@
 # ######################################################################
 
 import os
+import shutil
+
+import yaml
+from flexmock import flexmock
 from selinon import Config
+from selinon import StoragePool
+from selinon.config_cache import ConfigCache
+from selinon.global_config import GlobalConfig
+from selinon.lazy_mapping import LazyMapping
+from selinon.system import System
 from selinon_test_case import SelinonTestCase
+from testapp.storages import MySimpleStorage
+from testapp.tasks import Task1
 
 
 class TestConfig(SelinonTestCase):
@@ -45,6 +56,116 @@ class TestConfig(SelinonTestCase):
         assert {'task1'} == set(Config.nowait_nodes.get('flow1'))
         assert 'schema.json' == Config.output_schemas.get('task1')
 
+    def test_set_config_yaml_cached(self, tmpdir):
+        test_file = os.path.join(self.DATA_DIR, 'test_set_config.yaml')
+        cache_dir = str(tmpdir.join('cache'))
+
+        Config.set_config_yaml(test_file, flow_definition_files=[test_file], config_cache_dir=cache_dir)
+        task_queues = Config.task_queues
+        assert len([name for name in os.listdir(cache_dir) if name.endswith('.bin')]) == 1
+
+        Config.task_queues = None
+        # parsing and code generation is skipped once configuration is cached
+        flexmock(System).should_receive('from_files').never()
+        Config.set_config_yaml(test_file, flow_definition_files=[test_file], config_cache_dir=cache_dir)
+
+        assert Config.task_queues == task_queues
+        assert {'task1', 'task2', 'task3'} == set(Config.task_classes)
+        assert 'flow1' in Config.failures
+
+    def test_config_cache_key(self, tmpdir):
+        test_file = str(tmpdir.join('nodes.yaml'))
+        shutil.copy(os.path.join(self.DATA_DIR, 'test_set_config.yaml'), test_file)
+
+        key = ConfigCache.compute_key(test_file, [test_file])
+        assert key == ConfigCache.compute_key(test_file, test_file)
+
+        # environment variables referenced in configuration are part of the key
+        with open(test_file, 'a') as config_file:
+            config_file.write('\n# queue: {SELINON_TEST_QUEUE}\n')
+        key_changed = ConfigCache.compute_key(test_file, [test_file])
+        assert key_changed != key
+
+        os.environ['SELINON_TEST_QUEUE'] = 'queue1'
+        try:
+            assert ConfigCache.compute_key(test_file, [test_file]) != key_changed
+        finally:
+            del os.environ['SELINON_TEST_QUEUE']
+
+        # configuration restricted to queues is cached separately
+        key_queues = ConfigCache.compute_key(test_file, [test_file], queues=['queue1', 'queue2'])
+        assert key_queues != key_changed
+        assert key_queues == ConfigCache.compute_key(test_file, [test_file], queues=['queue2', 'queue1'])
+
+    def test_set_config_yaml_queues(self, tmpdir):
+        #
+        # flow1 (queue_flow1):   flow2 (queue_flow2):   flow3 (queue_flow3):
+        #
+        #      Task1                  task2                  task3
+        #        |                                             |
+        #      flow2                                         task4 (queue_task4)
+        #
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks', 'storage': 'MyStorage'},
+                {'name': 'task2', 'import': 'testapp.tasks'},
+                {'name': 'task3', 'import': 'testapp.tasks', 'storage': 'MyStorage'},
+                {'name': 'task4', 'classname': 'task3', 'import': 'testapp.tasks', 'queue': 'queue_task4'}
+            ],
+            'storages': [{
+                'name': 'MyStorage',
+                'classname': 'MySimpleStorage',
+                'import': 'testapp.storages',
+                'configuration': {'connection_string': 'foo'}
+            }],
+            'flows': ['flow1', 'flow2', 'flow3']
+        }
+        flows = {
+            'flow-definitions': [
+                {'name': 'flow1', 'queue': 'queue_flow1', 'edges': [{'from': None, 'to': 'Task1'},
+                                                                    {'from': 'Task1', 'to': 'flow2'}]},
+                {'name': 'flow2', 'queue': 'queue_flow2', 'edges': [{'from': None, 'to': 'task2'}]},
+                {'name': 'flow3', 'queue': 'queue_flow3', 'edges': [{'from': None, 'to': 'task3'},
+                                                                    {'from': 'task3', 'to': 'task4'}]}
+            ]
+        }
+        nodes_file = str(tmpdir.join('nodes.yaml'))
+        flow_file = str(tmpdir.join('flows.yaml'))
+        tmpdir.join('nodes.yaml').write(yaml.safe_dump(nodes))
+        tmpdir.join('flows.yaml').write(yaml.safe_dump(flows))
+
+        Config.set_config_yaml(nodes_file, [flow_file], queues=['queue_flow1', 'queue_task4'])
+
+        # sub-flows of served flows and tasks scheduled in them are configured as well
+        assert set(Config.edge_table) == {'flow1', 'flow2'}
+        assert set(Config.strategies) == {'flow1', 'flow2'}
+        assert set(Config.async_result_cache) == {'flow1', 'flow2'}
+        assert set(Config.task_classes) == {'Task1', 'task2', 'task4'}
+        assert set(Config.max_retry) == {'Task1', 'task2', 'task4', 'flow1', 'flow2'}
+        # results of any task can be retrieved and any node can be scheduled
+        assert set(Config.task2storage_mapping) == {'Task1', 'task2', 'task3', 'task4'}
+        assert set(Config.task_queues) == {'Task1', 'task2', 'task3', 'task4'}
+        assert set(Config.dispatcher_queues) == {'flow1', 'flow2', 'flow3'}
+        assert set(Config.storage_mapping) == {'MyStorage'}
+        # flows are recognized even if they are not served by the worker
+        assert set(Config.flows) == {'flow1', 'flow2', 'flow3'}
+
+        Config.set_config_yaml(nodes_file, [flow_file], queues=['queue_flow3'])
+        assert set(Config.edge_table) == {'flow3'}
+        assert set(Config.task_classes) == {'task3', 'task4'}
+        assert Config.is_flow('flow1')
+
+    def test_config_cache_broken_entry(self, tmpdir):
+        config_cache = ConfigCache(str(tmpdir))
+        code = config_cache.put('<key>', 'answer = 42\n')
+
+        assert config_cache.run(config_cache.get('<key>'))['answer'] == 42
+        assert config_cache.run(code)['answer'] == 42
+        assert config_cache.get('<unknown-key>') is None
+
+        tmpdir.join('selinon_config_<key>.bin').write('broken')
+        assert config_cache.get('<key>') is None
+
     def test_set_config_dict_simple(self):
         nodes = {
             'tasks': [
@@ -83,3 +204,140 @@ class TestConfig(SelinonTestCase):
         ]
 
         Config.set_config_dict(nodes, [flows])
+
+    def test_node2edge_idx(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks'},
+                {'name': 'task2', 'import': 'testapp.tasks'},
+                {'name': 'task3', 'import': 'testapp.tasks'}
+            ],
+            'flows': ['flow1']
+        }
+
+        flows = {
+            'flow-definitions': [{
+                'name': 'flow1',
+                'edges': [
+                    {'from': None, 'to': ['Task1', 'task2']},
+                    {'from': 'Task1', 'to': 'task3'},
+                    {'from': ['Task1', 'task2'], 'to': 'task3'}
+                ]
+            }]
+        }
+
+        Config.set_config_dict(nodes, [flows])
+
+        assert Config.node2edge_idx == {'flow1': {'Task1': [1, 2], 'task2': [2]}}
+
+    def test_set_config_py_without_precomputed(self, tmpdir):
+        # configuration generated by older Selinon versions that did not dump precomputed values
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks'},
+                {'name': 'task2', 'import': 'testapp.tasks'}
+            ],
+            'flows': ['flow1']
+        }
+
+        flows = {
+            'flow-definitions': [{
+                'name': 'flow1',
+                'edges': [
+                    {'from': None, 'to': 'Task1'},
+                    {'from': 'Task1', 'to': 'task2'}
+                ]
+            }]
+        }
+
+        flexmock(System).should_receive('_dump_node2edge_idx').and_return(None)
+        flexmock(System).should_receive('_dump_selective_runs').and_return(None)
+        System.from_dict(nodes, [flows]).dump2file(str(tmpdir.join('config.py')))
+        assert 'node2edge_idx' not in tmpdir.join('config.py').read()
+
+        Config.set_config_py(str(tmpdir.join('config.py')))
+
+        assert Config.node2edge_idx == {'flow1': {'Task1': [1]}}
+        assert Config.selective_runs == {}
+
+    def test_selective_runs(self):
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks'},
+                {'name': 'task2', 'import': 'testapp.tasks'}
+            ],
+            'flows': ['flow1', 'flow2']
+        }
+
+        flows = {
+            'flow-definitions': [{
+                'name': 'flow1',
+                'edges': [
+                    {'from': None, 'to': 'flow2', 'selective': {'tasks': ['task2']}}
+                ]
+            }, {
+                'name': 'flow2',
+                'edges': [
+                    {'from': None, 'to': 'Task1'},
+                    {'from': 'Task1', 'to': 'task2'}
+                ]
+            }]
+        }
+
+        Config.set_config_dict(nodes, [flows])
+
+        key = ('flow2', ('task2',), False, False)
+        assert Config.selective_runs == {
+            key: {'task_names': ['task2'], 'waiting_edges_subset': {'flow2': {0: ['Task1'], 1: ['task2']}}}
+        }
+
+    def test_lazy_imports(self):
+        nodes = {
+            'tasks': [
+                {'name': 'task1', 'classname': 'Task1', 'import': 'testapp.tasks', 'storage': 'MyStorage'},
+                {'name': 'task2', 'import': 'testapp.tasks'}
+            ],
+            'storages': [{
+                'name': 'MyStorage',
+                'classname': 'MySimpleStorage',
+                'import': 'testapp.storages',
+                'configuration': {'connection_string': 'foo'}
+            }],
+            'flows': ['flow1'],
+            'global': {'lazy_imports': True, 'trace': [{'storage': {'name': 'MyStorage'}}]}
+        }
+
+        flows = {
+            'flow-definitions': [{
+                'name': 'flow1',
+                'edges': [
+                    {'from': None, 'to': 'task1'},
+                    {'from': 'task1', 'to': 'task2'}
+                ]
+            }]
+        }
+
+        try:
+            Config.set_config_dict(nodes, [flows])
+        finally:
+            GlobalConfig.lazy_imports = False
+            GlobalConfig._trace_storage = []
+
+        assert isinstance(Config.task_classes, LazyMapping)
+        assert {'task1', 'task2'} == set(Config.task_classes)
+        assert Config.is_task('task2')
+        assert not Config.task_classes.is_resolved('task1')
+        assert not Config.async_result_cache.is_resolved('flow1')
+        # the storage is used for tracing so it was instantiated on initialization
+        assert Config.storage_mapping.is_resolved('MyStorage')
+        assert not Config.storage2storage_cache.is_resolved('MyStorage')
+
+        assert Config.task_classes['task1'] is Task1
+        assert Config.task_classes.is_resolved('task1')
+        assert not Config.task_classes.is_resolved('task2')
+
+        storage = StoragePool.get_connected_storage('MyStorage')
+        assert isinstance(storage, MySimpleStorage)
+        assert storage.connection_string == 'foo'
+        assert StoragePool.get_connected_storage('MyStorage') is storage
+        assert Config.storage2storage_cache['MyStorage'] is Config.storage2storage_cache['MyStorage']
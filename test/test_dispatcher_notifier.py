@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+
+from selinon import Dispatcher
+from selinon import Trace
+from selinon.dispatcher_notifier import LocalDispatcherNotifier
+from selinon.executor import Executor
+from selinon.executor.celery_mocks import SimulateRequest
+from selinon.system_state import SystemState
+from selinon.task_envelope import SelinonTaskEnvelope
+
+
+class _FailingNotifier(LocalDispatcherNotifier):
+    def notify(self, dispatcher_id, flow_name, node_name, node_id):
+        raise ConnectionError("Notifier is not available")
+
+
+class TestDispatcherNotifier(SelinonTestCase):
+    def test_local_notifier(self):
+        woken_up = []
+        notifier = LocalDispatcherNotifier(woken_up.append)
+
+        # not subscribed, nothing to wake up
+        notifier.notify('<dispatcher-id>', 'flow1', 'Task1', '<task1-id>')
+        assert woken_up == []
+
+        notifier.subscribe('<dispatcher-id>', 'flow1', 10)
+        assert notifier.is_subscribed('<dispatcher-id>')
+
+        notifier.notify('<dispatcher-id>', 'flow1', 'Task1', '<task1-id>')
+        assert woken_up == ['<dispatcher-id>']
+        assert not notifier.is_subscribed('<dispatcher-id>')
+
+        # dispatcher was already woken up, notifications are coalesced until it subscribes again
+        notifier.notify('<dispatcher-id>', 'flow1', 'Task2', '<task2-id>')
+        assert woken_up == ['<dispatcher-id>']
+
+    def test_task_notify(self):
+        woken_up = []
+        notifier = LocalDispatcherNotifier(woken_up.append)
+        notifier.subscribe('<dispatcher-id>', 'flow1', 10)
+        self.init({}, dispatcher_notifier=notifier)
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        task.notify_dispatcher('Task1', 'flow1', '<dispatcher-id>')
+
+        assert woken_up == ['<dispatcher-id>']
+
+    def test_task_notify_state_stored(self):
+        woken_up = []
+        notifier = LocalDispatcherNotifier(woken_up.append)
+        notifier.subscribe('<dispatcher-id>', 'flow1', 10)
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, dispatcher_notifier=notifier,
+                  get_task_instance=lambda **kwargs: flexmock(run=lambda node_args: None))
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        kwargs = {'task_name': 'Task1', 'flow_name': 'flow1', 'parent': {}, 'node_args': None,
+                  'dispatcher_id': '<dispatcher-id>'}
+        task.run(**kwargs)
+
+        # Celery stores task state once run() returns, dispatcher is notified afterwards
+        assert woken_up == []
+        task.on_success(None, task.request.id, (), kwargs)
+        assert woken_up == ['<dispatcher-id>']
+
+        notifier.subscribe('<dispatcher-id>', 'flow1', 10)
+        task.on_failure(ValueError(), task.request.id, (), kwargs, None)
+        assert woken_up == ['<dispatcher-id>', '<dispatcher-id>']
+
+    def test_task_notify_issue(self):
+        events = []
+        Trace.trace_by_func(lambda event, msg_dict: events.append(event))
+        self.init({}, dispatcher_notifier=_FailingNotifier(lambda dispatcher_id: None))
+
+        task = SelinonTaskEnvelope()
+        task.request = RequestMock()
+        # notifier errors are not fatal
+        task.notify_dispatcher('Task1', 'flow1', '<dispatcher-id>')
+
+        assert events == [Trace.DISPATCHER_NOTIFIER_ISSUE]
+
+    def test_dispatcher_subscribe(self):
+        def my_retry(args, kwargs, countdown, queue):
+            raise ValueError()
+
+        flow_name = 'flow1'
+        edge_table = {
+            flow_name: [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        notifier = LocalDispatcherNotifier(lambda dispatcher_id: None)
+        self.init(edge_table, dispatcher_notifier=notifier)
+        state_dict = {'finished_nodes': {}, 'failed_nodes': {}, 'active_nodes': []}
+
+        flexmock(SystemState).should_receive('update').and_return(2)
+        flexmock(SystemState).should_receive('to_dict').and_return(state_dict)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(ValueError):
+            dispatcher.run(flow_name)
+
+        assert notifier.is_subscribed('<id>')
+
+    def test_executor_wakeup(self):
+        dispatcher = Dispatcher()
+        dispatcher.request = SimulateRequest(dispatcher)
+        celery_kwargs = {'kwargs': {'flow_name': 'flow1'}, 'countdown': 100, 'queue': 'flow1_queue'}
+
+        try:
+            Executor.schedule(dispatcher, celery_kwargs)
+            Executor.wakeup_dispatcher(dispatcher.request.id)
+
+            # the rescheduled message is popped first
+            _, record = Executor.executor_queues.pop()
+            assert record[0] is dispatcher
+            assert record[1]['countdown'] == 0
+            assert id(record) not in Executor._stale_records
+
+            # the original message is marked as stale
+            _, record = Executor.executor_queues.pop()
+            assert record[1] is celery_kwargs
+            assert id(record) in Executor._stale_records
+            assert Executor.executor_queues.is_empty()
+        finally:
+            Executor._dispatcher_records.clear()
+            Executor._stale_records.clear()
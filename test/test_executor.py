@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import copy
+from datetime import datetime
+from datetime import timedelta
+import json
+import pickle
+import threading
+
+import pytest
+import yaml
+from selinon import Config
+from selinon import RequestError
+from selinon.celery import Task as CeleryTask
+from selinon.executor import Executor
+from selinon.errors import MessageMutatedError
+from selinon.executor.celery_mocks import SimulateAsyncResult
+from selinon.executor.lazy_copy import lazy_copy
+from selinon.executor.lazy_copy import LazyCopyDict
+from selinon.executor.queue_pool import QueuePool
+from selinon.executor.simulation import FixedDuration
+from selinon.executor.simulation import SampledDuration
+from selinon.executor.simulation import TraceDuration
+from selinon.system_state import SystemState
+from selinon_test_case import SelinonTestCase
+from testapp.tasks import FlakyTask
+from testapp.tasks import MutatingTask
+from testapp.tasks import ParallelTask
+
+# other tests replace Config.get_task_instance with a mock
+_GET_TASK_INSTANCE = Config.__dict__['get_task_instance']
+
+
+class _InlineExecutor(Executor):
+    """Executor which workers finish tasks before executor starts to wait for them."""
+
+    def _executor_run(self):
+        def submit(pool, record):
+            future = Future()
+            future.set_result(self._run_record(record))
+            return future
+
+        self._serve_pool(ThreadPoolExecutor(max_workers=self.concurrency), submit=submit, finish=lambda _: None)
+
+
+class TestExecutor(SelinonTestCase):
+    _TASK_COUNT = 3
+
+    @pytest.fixture
+    def config_files(self, tmpdir):
+        nodes = {
+            'tasks': [{'name': 'Task%d' % idx, 'classname': 'ParallelTask', 'import': 'testapp.tasks'}
+                      for idx in range(self._TASK_COUNT)] +
+                     [{'name': 'MutatingTask%d' % idx, 'classname': 'MutatingTask', 'import': 'testapp.tasks'}
+                      for idx in range(2)] +
+                     [{'name': 'FlakyTask', 'import': 'testapp.tasks', 'max_retry': 1, 'retry_countdown': 10}],
+            'flows': ['flow1', 'flow2', 'flow3', 'flow4']
+        }
+        flows = {
+            'flow-definitions': [{
+                'name': 'flow1',
+                'sampling': {'name': 'constant', 'args': {'retry': 0.01}},
+                'edges': [{'from': None, 'to': ['Task%d' % idx for idx in range(self._TASK_COUNT)]}]
+            }, {
+                'name': 'flow2',
+                'sampling': {'name': 'constant', 'args': {'retry': 0.01}},
+                'propagate_node_args': True,
+                'edges': [{'from': None, 'to': ['MutatingTask0', 'MutatingTask1']}]
+            }, {
+                'name': 'flow3',
+                'sampling': {'name': 'constant', 'args': {'retry': 0.01}},
+                'edges': [{'from': None, 'to': ['FlakyTask']}]
+            }, {
+                # dispatcher relies on notifications, it is retried after a long time otherwise
+                'name': 'flow4',
+                'sampling': {'name': 'constant', 'args': {'retry': 30}},
+                'edges': [{'from': None, 'to': ['Task%d' % idx for idx in range(self._TASK_COUNT)]}]
+            }]
+        }
+        tmpdir.join('nodes.yaml').write(yaml.safe_dump(nodes))
+        tmpdir.join('flows.yaml').write(yaml.safe_dump(flows))
+
+        Config.get_task_instance = _GET_TASK_INSTANCE
+        # executor replaces Celery related functions with its own implementation
+        patched = (CeleryTask.apply_async, CeleryTask.retry, SystemState._get_async_result)
+        try:
+            yield str(tmpdir.join('nodes.yaml')), [str(tmpdir.join('flows.yaml'))]
+        finally:
+            CeleryTask.apply_async, CeleryTask.retry, SystemState._get_async_result = patched
+            SimulateAsyncResult.clear()
+            Config.set_dispatcher_notifier(None)
+            ParallelTask.barrier = None
+            MutatingTask.seen_node_args.clear()
+            FlakyTask.run_count = 0
+            Executor._strict_arguments = False
+            Executor._record_fingerprints.clear()
+            # messages left in queues by failed runs
+            Executor.executor_queues = QueuePool()
+            Executor._dispatcher_records.clear()
+            Executor._stale_records.clear()
+            Executor._clock = SimulateAsyncResult.clock = None
+            SystemState._get_current_datetime = staticmethod(datetime.now)
+
+    @pytest.mark.parametrize('notify_dispatcher', (False, True))
+    def test_run_threads(self, config_files, notify_dispatcher):
+        # tasks wait for each other, they would never finish if run one by one
+        ParallelTask.barrier = threading.Barrier(self._TASK_COUNT, timeout=10)
+
+        executor = Executor(*config_files, concurrency=self._TASK_COUNT, sleep_time=0, show_progressbar=False,
+                            notify_dispatcher=notify_dispatcher)
+        executor.run('flow1')
+
+        # all tasks and the dispatcher finished
+        assert len(SimulateAsyncResult.task_successes) == self._TASK_COUNT + 1
+        assert not SimulateAsyncResult.task_failures
+        assert Executor.executor_queues.is_empty()
+
+    @pytest.mark.parametrize('pool', (Executor.POOL_THREADS, Executor.POOL_PROCESSES))
+    def test_run_notify_dispatcher(self, config_files, pool):
+        executor = Executor(*config_files, concurrency=self._TASK_COUNT, sleep_time=0, show_progressbar=False,
+                            notify_dispatcher=True, pool=pool)
+        for _ in range(5):
+            started = datetime.now()
+            executor.run('flow4')
+
+            # dispatcher is woken up once results of tasks are available, no fallback retry is needed
+            assert (datetime.now() - started).total_seconds() < 10
+            assert len(SimulateAsyncResult.task_successes) == self._TASK_COUNT + 1
+            SimulateAsyncResult.clear()
+
+    def test_run_finished_before_wait(self, config_files):
+        executor = _InlineExecutor(*config_files, concurrency=2, sleep_time=0, show_progressbar=False)
+        thread = threading.Thread(target=executor.run, args=('flow1',), daemon=True)
+        thread.start()
+        thread.join(10)
+
+        # executor does not wait for tasks that have already finished
+        assert not thread.is_alive()
+        assert len(SimulateAsyncResult.task_successes) == self._TASK_COUNT + 1
+
+    @pytest.mark.parametrize('notify_dispatcher', (False, True))
+    def test_run_processes(self, config_files, notify_dispatcher):
+        executor = Executor(*config_files, concurrency=2, sleep_time=0, show_progressbar=False,
+                            notify_dispatcher=notify_dispatcher, pool=Executor.POOL_PROCESSES)
+        executor.run('flow1')
+
+        # results are collected from worker processes
+        assert isinstance(SimulateAsyncResult.task_successes, dict)
+        assert len(SimulateAsyncResult.task_successes) == self._TASK_COUNT + 1
+        assert not SimulateAsyncResult.task_failures
+        assert Executor.executor_queues.is_empty()
+
+    def test_unknown_pool(self, config_files):
+        with pytest.raises(RequestError):
+            Executor(*config_files, concurrency=2, pool='greenlets')
+
+    def test_queue_pool_order(self):
+        now = datetime.now()
+        queue_pool = QueuePool()
+        queue_pool.push('queue1', now + timedelta(seconds=2), 'record1')
+        queue_pool.push('queue2', now + timedelta(seconds=3), 'record2')
+        # a new head of queue2 invalidates the previous one
+        queue_pool.push('queue2', now + timedelta(seconds=1), 'record3')
+        queue_pool.push('queue3', now, 'record4')
+
+        assert queue_pool.top() == (now, 'record4')
+        records = []
+        while not queue_pool.is_empty():
+            top = queue_pool.top()
+            assert queue_pool.pop() == top
+            records.append(top[1])
+
+        assert records == ['record4', 'record3', 'record1', 'record2']
+        assert not queue_pool.queue_exists('queue1')
+
+    def test_queue_pool_round_robin(self):
+        now = datetime.now()
+        queue_pool = QueuePool()
+        for queue_name in ('queue1', 'queue2', 'queue3'):
+            for idx in range(3):
+                queue_pool.push(queue_name, now, '%s-%d' % (queue_name, idx))
+
+        # messages scheduled for the same time are served from queues in turns
+        queue_names = [queue_pool.pop()[1].split('-')[0] for _ in range(9)]
+        assert queue_names[:3] == queue_names[3:6] == queue_names[6:]
+        assert set(queue_names[:3]) == {'queue1', 'queue2', 'queue3'}
+        assert queue_pool.is_empty()
+
+    def test_lazy_copy(self):
+        original = {'a': {'b': [1, {'c': 2}]}, 'd': [{'e': 3}], 'f': 'g'}
+        original_copy = copy.deepcopy(original)
+
+        copied = lazy_copy(original)
+        assert isinstance(copied, LazyCopyDict)
+        assert copied == original
+
+        copied['a']['b'][1]['c'] = 42
+        copied['a']['b'].append(43)
+        copied.get('d')[0]['e'] = 44
+        copied.setdefault('h', []).append(45)
+        copied['f'] = 'i'
+        for value in copied.values():
+            if isinstance(value, list):
+                value.append(46)
+
+        # the original dict is untouched
+        assert original == original_copy
+        assert copied == {'a': {'b': [1, {'c': 42}, 43]}, 'd': [{'e': 44}, 46], 'f': 'i', 'h': [45, 46]}
+
+        # lazy copy of a lazy copy does not modify its origin
+        copied_copy = lazy_copy(copied)
+        copied_copy['a']['b'].clear()
+        assert copied['a']['b'] == [1, {'c': 42}, 43]
+
+        # serialized as plain dicts
+        assert json.loads(json.dumps(copied)) == copied
+        assert type(pickle.loads(pickle.dumps(copied))) is dict
+        assert type(copy.deepcopy(copied)) is dict
+
+    def test_lazy_copy_to_dict(self):
+        original = {'a': {'b': [1, {'c': 2}]}, 'd': [{'e': 3}]}
+        original_copy = copy.deepcopy(original)
+
+        # converting to a plain dict does not expose values shared with the original dict
+        dict(lazy_copy(original))['a']['b'].append(4)
+        {**lazy_copy(original)}['d'][0]['e'] = 5
+        plain = {}
+        plain.update(lazy_copy(original))
+        plain['a']['b'][1]['c'] = 6
+        (lambda **kwargs: kwargs['a'].clear())(**lazy_copy(original))
+
+        assert original == original_copy
+
+    def test_run_arguments_copied(self, config_files):
+        executor = Executor(*config_files, sleep_time=0, show_progressbar=False)
+        executor.run('flow2', {'tasks': []})
+
+        # tasks do not see modifications done by other tasks
+        assert MutatingTask.seen_node_args == [{'tasks': []}, {'tasks': []}]
+        assert not SimulateAsyncResult.task_failures
+
+    def test_run_strict_arguments(self, config_files):
+        executor = Executor(*config_files, sleep_time=0, show_progressbar=False, strict_arguments=True)
+
+        # the first task modifies flow arguments shared with a message of the second task
+        with pytest.raises(MessageMutatedError):
+            executor.run('flow2', {'tasks': []})
+
+        assert len(MutatingTask.seen_node_args) == 1
+
+    def test_simulate(self, config_files):
+        executor = Executor(*config_files, concurrency=2, show_progressbar=False,
+                            duration_model=FixedDuration({'Task0': 10}, default=5))
+        started = datetime.now()
+        executor.run('flow1')
+
+        # no waiting for dispatcher retries in real time
+        assert (datetime.now() - started).total_seconds() < 5
+        assert len(SimulateAsyncResult.task_successes) == self._TASK_COUNT + 1
+        assert Executor.executor_queues.is_empty()
+
+        # Task0 runs on one worker, Task1 and Task2 one after another on the other worker, dispatcher is retried
+        # once both workers are free
+        stats = executor.simulation_stats.to_dict()
+        assert stats['makespan'] == 10
+        assert stats['flow_makespans'] == {'flow1': [10]}
+        assert stats['dispatcher_messages'] == {'flow1': 2}
+        assert stats['task_messages'] == {'Task0': 1, 'Task1': 1, 'Task2': 1}
+        assert stats['task_busy_time'] == {'Task0': 10, 'Task1': 5, 'Task2': 5}
+
+    def test_simulate_retry(self, config_files):
+        executor = Executor(*config_files, show_progressbar=False, duration_model=FixedDuration(default=1))
+        started = datetime.now()
+        executor.run('flow3')
+
+        # the task is retried after retry countdown in virtual time
+        assert (datetime.now() - started).total_seconds() < 5
+        assert FlakyTask.run_count == 2
+        assert not SimulateAsyncResult.task_failures
+        stats = executor.simulation_stats.to_dict()
+        assert stats['makespan'] == 12
+        assert stats['task_messages'] == {'FlakyTask': 2}
+        assert stats['task_busy_time'] == {'FlakyTask': 2}
+
+    def test_duration_models(self):
+        assert FixedDuration({'Task1': 2}, default=1).get_duration('Task1') == 2
+        assert FixedDuration({'Task1': 2}, default=1).get_duration('Task2') == 1
+
+        # samples are reproducible and never negative
+        distributions = {'Task1': ('gauss', 1, 10)}
+        samples = [SampledDuration(distributions, seed=42).get_duration('Task1') for _ in range(2)]
+        assert samples[0] == samples[1]
+        sampled_duration = SampledDuration(distributions, default=3, seed=42)
+        assert all(sampled_duration.get_duration('Task1') >= 0 for _ in range(100))
+        assert sampled_duration.get_duration('Task2') == 3
+
+        with pytest.raises(ValueError):
+            SampledDuration({'Task1': ('unknown', 1)})
+
+    def test_trace_duration(self):
+        def trace_point(event, time, task_id, task_name='Task1'):
+            return json.dumps({'event': event, 'time': time, 'details': {'task_id': task_id, 'task_name': task_name}})
+
+        trace = [
+            trace_point('TASK_START', '2017-01-01 10:00:00', 'id1'),
+            trace_point('TASK_START', '2017-01-01 10:00:01', 'id2', 'Task2'),
+            # trace points logged using logging
+            'worker: ' + trace_point('TASK_END', '2017-01-01 10:00:03.500000', 'id1'),
+            trace_point('TASK_FAILURE', '2017-01-01 10:00:02', 'id2', 'Task2'),
+            trace_point('TASK_START', '2017-01-01 10:00:04', 'id3'),
+            trace_point('TASK_END', '2017-01-01 10:00:05', 'id3'),
+            # task end without its start
+            trace_point('TASK_END', '2017-01-01 10:00:05', 'id4', 'Task3'),
+            'not a trace point {'
+        ]
+
+        trace_duration = TraceDuration.from_trace(trace, default=7)
+        # durations are replayed in turns
+        assert [trace_duration.get_duration('Task1') for _ in range(3)] == [3.5, 1, 3.5]
+        assert trace_duration.get_duration('Task2') == 1
+        assert trace_duration.get_duration('Task3') == 7
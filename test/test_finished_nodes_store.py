@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+import yaml
+from selinon_test_case import SelinonTestCase
+from storage_mock import DictStorageMock
+
+from selinon import Config
+from selinon import ConfigurationError
+from selinon import Dispatcher
+from selinon import FinishedNodesStore
+from selinon import SelinonTask
+from selinon import SystemState
+from selinon.finished_nodes_store import iter_finished_nodes
+from selinon.finished_nodes_store import resolve_finished_nodes_refs
+from selinon.finished_nodes_store import store_finished_nodes
+
+_FINISHED_NODES = {
+    'Task1': ['<task1-id%d>' % i for i in range(5)],
+    'Task2': ['<task2-id%d>' % i for i in range(3)]
+}
+
+
+class _MyTask(SelinonTask):
+    def run(self, node_args):
+        pass
+
+
+class TestFinishedNodesStore(SelinonTestCase):
+    def _init_store(self, edge_table=None, **kwargs):
+        storage = DictStorageMock()
+        self.init(edge_table or {}, storage_mapping={'Storage1': storage},
+                  finished_nodes_store=FinishedNodesStore('Storage1', threshold=4, chunk_size=3), **kwargs)
+        return storage
+
+    def test_store_iter(self):
+        storage = self._init_store()
+
+        # not enough nodes to be stored
+        assert store_finished_nodes('flow1', '<dispatcher-id>', {'Task1': ['<id>']}) == {'Task1': ['<id>']}
+        assert not storage.records
+
+        handle = store_finished_nodes('flow1', '<dispatcher-id>', _FINISHED_NODES)
+        assert FinishedNodesStore.is_handle(handle)
+        assert handle['chunk_count'] == 3
+        assert all(len(sum(chunk.values(), [])) <= 3 for chunk in storage.records.values())
+
+        iterated = {}
+        for node_name, node_ids in iter_finished_nodes(handle):
+            iterated.setdefault(node_name, []).extend(node_ids)
+
+        assert iterated == _FINISHED_NODES
+        assert storage.retrieve_calls == 3
+
+    def test_iter_not_configured(self):
+        self._init_store()
+        handle = store_finished_nodes('flow1', '<dispatcher-id>', _FINISHED_NODES)
+
+        self.init({})
+        assert dict(iter_finished_nodes(_FINISHED_NODES)) == _FINISHED_NODES
+        with pytest.raises(ConfigurationError):
+            list(iter_finished_nodes(handle))
+
+    def test_chunk_size(self):
+        with pytest.raises(ConfigurationError):
+            FinishedNodesStore('Storage1', chunk_size=0)
+
+    @pytest.mark.parametrize('compound', (False, True))
+    def test_propagate_handle(self, compound):
+        #
+        # flow1:
+        #
+        #     flow2
+        #       |
+        #     TaskX
+        #
+        # flow2:
+        #    Run explicitly, finished nodes are stored, its flow3 subflow returns finished nodes as they are
+        #
+        edge_table = {
+            'flow1': [{'from': ['flow2'], 'to': ['TaskX'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['flow2'], 'condition': self.cond_true}],
+            'flow2': [],
+            'flow3': []
+        }
+        self._init_store(edge_table, propagate_parent={'flow1': True},
+                         propagate_finished={'flow1': not compound},
+                         propagate_compound_finished={'flow1': compound})
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        flow3 = Dispatcher().apply_async(kwargs={'flow_name': 'flow3'}, queue=Config.dispatcher_queues['flow3'])
+        self.get_task_instance.register_node(flow3)
+        self.set_finished(flow3, {'finished_nodes': {'Task4': ['<task4-id>']}, 'failed_nodes': {}})
+
+        flow2 = self.get_flow('flow2')
+        flow2_finished_nodes = dict(_FINISHED_NODES, flow3=[flow3.task_id])
+        self.set_finished(flow2, {
+            'finished_nodes': store_finished_nodes('flow2', flow2.task_id, flow2_finished_nodes),
+            'failed_nodes': {}
+        })
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        system_state.update()
+
+        task_x = self.get_task('TaskX')
+        # dispatcher passes only handle, it does not retrieve stored finished nodes
+        assert list(task_x.parent['flow2'].keys()) == [FinishedNodesStore.REFS_KEY]
+
+        task = _MyTask('flow1', 'TaskX', task_x.parent, task_x.task_id, '<dispatcher-id>')
+        assert task._selinon_dereference_task_id('flow2', 'Task1', -1) == '<task1-id4>'
+        assert task._selinon_dereference_task_id('flow2', 'Task2', 0) == '<task2-id0>'
+        if compound:
+            assert task._selinon_dereference_task_id('flow2', 'Task4', 0) == '<task4-id>'
+        else:
+            assert task._selinon_dereference_task_id(['flow2', 'flow3'], 'Task4', 0) == '<task4-id>'
+
+        # resolved only once
+        assert FinishedNodesStore.REFS_KEY not in task.parent['flow2']
+
+    def test_resolve_task_queue_worker(self, tmpdir):
+        #
+        # flow1 (queue_flow1):   flow2 (queue_flow2):
+        #
+        #      Task1                  task2
+        #        |
+        #      flow2
+        #        |
+        #      task3 (queue_task3)
+        #
+        # Worker serves only queue_task3, it does not run dispatcher for any flow.
+        #
+        nodes = {
+            'tasks': [
+                {'name': 'Task1', 'import': 'testapp.tasks'},
+                {'name': 'task2', 'import': 'testapp.tasks'},
+                {'name': 'task3', 'import': 'testapp.tasks', 'queue': 'queue_task3'}
+            ],
+            'flows': ['flow1', 'flow2']
+        }
+        flows = {
+            'flow-definitions': [
+                {'name': 'flow1', 'queue': 'queue_flow1', 'edges': [{'from': None, 'to': 'Task1'},
+                                                                    {'from': 'Task1', 'to': 'flow2'},
+                                                                    {'from': 'flow2', 'to': 'task3'}]},
+                {'name': 'flow2', 'queue': 'queue_flow2', 'edges': [{'from': None, 'to': 'task2'}]}
+            ]
+        }
+        tmpdir.join('nodes.yaml').write(yaml.safe_dump(nodes))
+        tmpdir.join('flows.yaml').write(yaml.safe_dump(flows))
+        Config.set_config_yaml(str(tmpdir.join('nodes.yaml')), [str(tmpdir.join('flows.yaml'))],
+                               queues=['queue_task3'])
+        Config.storage_mapping = {'Storage1': DictStorageMock()}
+        Config.set_finished_nodes_store(FinishedNodesStore('Storage1', threshold=4, chunk_size=3))
+
+        assert 'flow2' not in Config.edge_table
+        finished_nodes = {'Task1': ['<task1-id%d>' % i for i in range(4)], 'flow2': ['<flow2-id>']}
+        parent_flow = {}
+        FinishedNodesStore.add_ref(parent_flow, store_finished_nodes('flow1', '<dispatcher-id>', finished_nodes),
+                                   compound=False)
+
+        def get_finished_nodes(flow_name, flow_id):
+            assert (flow_name, flow_id) == ('flow2', '<flow2-id>')
+            return {'task2': ['<task2-id>']}
+
+        result = resolve_finished_nodes_refs(parent_flow, get_finished_nodes)
+        assert result == {'Task1': finished_nodes['Task1'], 'flow2': {'task2': ['<task2-id>']}}
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from selinon_test_case import SelinonTestCase
+from storage_mock import DictStorageMock
+
+from selinon import ConfigurationError
+from selinon import MetricsTracer
+from selinon import StoragePool
+from selinon import Trace
+from selinon.global_config import GlobalConfig
+
+
+class TestMetrics(SelinonTestCase):
+    def test_event_counters(self):
+        metrics = Trace.trace_by_metrics()
+        assert Trace.get_metrics_tracer() is metrics
+
+        Trace.log(Trace.DISPATCHER_RETRY, {'flow_name': 'flow1'})
+        Trace.log(Trace.DISPATCHER_RETRY, {'flow_name': 'flow1'})
+        Trace.log(Trace.DISPATCHER_RETRY, {'flow_name': 'flow2'})
+
+        assert metrics.event_count(Trace.DISPATCHER_RETRY) == 3
+        assert metrics.event_count('DISPATCHER_RETRY', flow_name='flow1') == 2
+        assert metrics.counter_value('selinon_events_total', flow_name='flow2') == 1
+
+        metrics.reset()
+        assert metrics.event_count(Trace.DISPATCHER_RETRY) == 0
+
+    def test_cache_hit_ratio(self):
+        metrics = Trace.trace_by_metrics()
+        assert metrics.cache_hit_ratio('node_state') is None
+
+        for event in (Trace.NODE_STATE_CACHE_HIT, Trace.NODE_STATE_CACHE_HIT, Trace.NODE_STATE_CACHE_HIT,
+                      Trace.NODE_STATE_CACHE_MISS):
+            Trace.log(event, {'flow_name': 'flow1', 'node_name': 'Task1'})
+
+        Trace.log(Trace.TASK_RESULT_CACHE_MISS, {'flow_name': 'flow1', 'storage_name': 'Storage1'})
+
+        assert metrics.cache_hit_ratio('node_state') == 0.75
+        assert metrics.cache_hit_ratio('node_state', flow_name='flow2') is None
+        assert metrics.cache_hit_ratio('task_result', storage_name='Storage1') == 0.0
+
+    def test_histograms(self):
+        metrics = Trace.trace_by_metrics(MetricsTracer(buckets=(0.1, 1.0)))
+
+        Trace.log(Trace.TASK_START, {'flow_name': 'flow1', 'task_name': 'Task1', 'task_id': '<task1-id>'})
+        Trace.log(Trace.TASK_END, {'flow_name': 'flow1', 'task_name': 'Task1', 'task_id': '<task1-id>'})
+        # end of a task which start was not seen
+        Trace.log(Trace.TASK_FAILURE, {'flow_name': 'flow1', 'task_name': 'Task1', 'task_id': '<task2-id>'})
+
+        task_duration = metrics.histogram_value('selinon_task_duration_seconds', task_name='Task1')
+        assert task_duration['count'] == 1
+        assert task_duration['buckets'][-1] == (float('inf'), 1)
+
+        Trace.log(Trace.STORAGE_RETRIEVED, {'storage_name': 'Storage1', 'elapsed': 0.5})
+        Trace.log(Trace.STORAGE_RETRIEVED, {'storage_name': 'Storage1', 'elapsed': 5.0})
+
+        retrieve_duration = metrics.histogram_value('selinon_storage_retrieve_duration_seconds',
+                                                    storage_name='Storage1')
+        assert retrieve_duration == {'buckets': [(0.1, 0), (1.0, 1), (float('inf'), 2)], 'sum': 5.5, 'count': 2}
+
+        snapshot = metrics.snapshot()
+        assert len(snapshot['histograms']) == 2
+
+    def test_prefetch_duration(self):
+        storage = DictStorageMock()
+        storage.records = {('flow1', 'Task1', '<id1>'): '<result1>', ('flow1', 'Task2', '<id2>'): '<result2>'}
+        self.init({}, storage_mapping={'Storage1': storage},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage1'})
+        metrics = Trace.trace_by_metrics()
+
+        nodes = [('Task1', '<id1>'), ('Task2', '<id2>')]
+        assert StoragePool.prefetch('flow1', nodes) == {'<id1>': '<result1>', '<id2>': '<result2>'}
+
+        # one observation per storage call, not per retrieved result
+        assert metrics.event_count(Trace.STORAGE_RETRIEVED_MANY, storage_name='Storage1') == 1
+        retrieve_duration = metrics.histogram_value('selinon_storage_retrieve_duration_seconds',
+                                                    storage_name='Storage1')
+        assert retrieve_duration['count'] == 1
+
+    def test_prometheus_text(self):
+        metrics = Trace.trace_by_metrics(MetricsTracer(buckets=(1.0,)))
+        Trace.log(Trace.DISPATCHER_RETRY, {'flow_name': 'flow"1'})
+        Trace.log(Trace.STORAGE_RETRIEVED, {'storage_name': 'Storage1', 'elapsed': 0.5})
+
+        lines = metrics.prometheus_text().splitlines()
+        assert '# TYPE selinon_events_total counter' in lines
+        assert 'selinon_events_total{event="DISPATCHER_RETRY",flow_name="flow\\"1"} 1' in lines
+        assert '# TYPE selinon_storage_retrieve_duration_seconds histogram' in lines
+        assert 'selinon_storage_retrieve_duration_seconds_bucket{storage_name="Storage1",le="1.0"} 1' in lines
+        assert 'selinon_storage_retrieve_duration_seconds_bucket{storage_name="Storage1",le="+Inf"} 1' in lines
+        assert 'selinon_storage_retrieve_duration_seconds_sum{storage_name="Storage1"} 0.5' in lines
+        assert 'selinon_storage_retrieve_duration_seconds_count{storage_name="Storage1"} 1' in lines
+
+    def test_metrics_config(self):
+        try:
+            GlobalConfig._parse_trace_metrics(False)
+            assert GlobalConfig._trace_metrics is None
+
+            GlobalConfig._parse_trace_metrics({'buckets': [0.5, 1]})
+            assert GlobalConfig._trace_metrics == {'buckets': [0.5, 1]}
+
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_metrics(True)
+
+            GlobalConfig._trace_metrics = None
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_metrics({'buckets': []})
+
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_metrics({'unknown_option': 1})
+        finally:
+            GlobalConfig._trace_metrics = None
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from selinon_test_case import SelinonTestCase
+from storage_mock import DictStorageMock
+
+from selinon import ConfigurationError
+from selinon import NodeArgsStore
+from selinon import SystemState
+from selinon.node_args_store import resolve_node_args
+from selinon.node_args_store import store_node_args
+
+_LARGE_NODE_ARGS = {'manifest': ['entry-%d' % i for i in range(1000)]}
+
+
+class TestNodeArgsStore(SelinonTestCase):
+    def test_store_resolve(self):
+        storage = DictStorageMock()
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+
+        # small node args are passed as they are
+        assert store_node_args('flow1', {'foo': 'bar'}) == {'foo': 'bar'}
+        assert store_node_args('flow1', None) is None
+        assert storage.store_calls == 0
+
+        reference = store_node_args('flow1', _LARGE_NODE_ARGS)
+        assert NodeArgsStore.is_reference(reference)
+        # already a reference, passed as it is
+        assert store_node_args('flow1', reference) == reference
+        assert storage.store_calls == 1
+        # content addressed - the same record is written again
+        assert store_node_args('flow1', dict(_LARGE_NODE_ARGS)) == reference
+        assert storage.store_calls == 2
+        assert len(storage.records) == 1
+
+        resolved = resolve_node_args(reference)
+        assert resolved == _LARGE_NODE_ARGS
+        # cached instance is not exposed
+        resolved['manifest'].clear()
+        assert resolve_node_args(reference) == _LARGE_NODE_ARGS
+        assert storage.retrieve_calls == 0
+
+    def test_resolve_other_worker(self):
+        storage = DictStorageMock()
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+        reference = store_node_args('flow1', _LARGE_NODE_ARGS)
+
+        # a fresh worker with an empty cache
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+
+        assert resolve_node_args(reference) == _LARGE_NODE_ARGS
+        assert resolve_node_args(reference) == _LARGE_NODE_ARGS
+        assert storage.retrieve_calls == 1
+
+    def test_store_expired(self):
+        storage = DictStorageMock()
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+        store_node_args('flow1', _LARGE_NODE_ARGS)
+
+        # the record expired in the storage, but flow arguments are still cached in the worker
+        storage.records.clear()
+        reference = store_node_args('flow1', _LARGE_NODE_ARGS)
+
+        # a fresh worker with an empty cache
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+        assert resolve_node_args(reference) == _LARGE_NODE_ARGS
+
+    def test_resolve_multiple_flows(self):
+        storage = DictStorageMock()
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+        references = [store_node_args(flow_name, _LARGE_NODE_ARGS) for flow_name in ('flow1', 'flow2')]
+
+        # flow arguments are stored for each flow
+        assert references[0] != references[1]
+        assert storage.store_calls == 2
+
+        # a fresh worker with an empty cache
+        self.init({}, storage_mapping={'Storage1': storage}, node_args_store=NodeArgsStore('Storage1', threshold=1024))
+
+        for reference in references:
+            assert resolve_node_args(reference) == _LARGE_NODE_ARGS
+        assert storage.retrieve_calls == 2
+
+    def test_not_configured(self):
+        self.init({})
+
+        assert resolve_node_args({'foo': 'bar'}) == {'foo': 'bar'}
+        with pytest.raises(ConfigurationError):
+            resolve_node_args({NodeArgsStore.REFERENCE_KEY: '<digest>', 'flow_name': 'flow1'})
+
+    def test_flow_reference(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #       |
+        #     Task2
+        #
+        def _cond_node_args(db, node_args):
+            return node_args == _LARGE_NODE_ARGS
+
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': _cond_node_args},
+                      {'from': [], 'to': ['Task1'], 'condition': _cond_node_args}]
+        }
+        storage = DictStorageMock()
+        self.init(edge_table, storage_mapping={'Storage1': storage},
+                  propagate_node_args={'flow1': True},
+                  node_args_store=NodeArgsStore('Storage1', threshold=1024))
+        reference = store_node_args('flow1', _LARGE_NODE_ARGS)
+
+        system_state = SystemState(id(self), 'flow1', node_args=reference)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        assert 'Task1' in self.instantiated_tasks
+        # messages carry only reference
+        assert system_state.node_args == reference
+        assert self.get_task('Task1').node_args == reference
+
+        self.set_finished(self.get_task('Task1'))
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
+        system_state.update()
+
+        assert 'Task2' in self.instantiated_tasks
+        assert self.get_task('Task2').node_args == reference
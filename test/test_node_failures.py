@@ -1039,3 +1039,47 @@ class TestNodeFailures(SelinonTestCase):
         assert {node['name'] for node in reported_state['active_nodes']} == {'Task3'}
         assert set(reported_state['finished_nodes'].keys()) == {'Task1'}
         assert set(reported_state['failed_nodes'].keys()) == {'Task2'}
+
+    def test_many_failures_fallback(self):
+        #
+        # flow1:
+        #    Task0 X   Task1 X   ...   Task29 X
+        #
+        # Note:
+        #  All tasks fail, fallbacks are defined only for Task3, Task7 and for Task1. Only combinations present in
+        #  the failure graph should be inspected, otherwise there would be 2^30 combinations to check.
+        node_names = ['Task%d' % i for i in range(30)]
+        edge_table = {'flow1': [{'from': [], 'to': node_names, 'condition': self.cond_true}]}
+        task3_task7 = {'next': {}, 'fallback': [['Fallback1']],
+                       'conditions': [self.cond_true],
+                       'condition_strs': ['cond_true']}
+        failures = {
+            'flow1': {
+                'Task1': {'next': {}, 'fallback': [['Fallback2']],
+                          'conditions': [self.cond_true],
+                          'condition_strs': ['cond_true']},
+                'Task3': {'next': {'Task7': task3_task7}, 'fallback': [], 'conditions': [], 'condition_strs': []},
+                'Task7': {'next': {'Task3': task3_task7}, 'fallback': [], 'conditions': [], 'condition_strs': []}
+            }
+        }
+        self.init(edge_table, failures=failures)
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+
+        for node_name in node_names:
+            self.set_failed(self.get_task(node_name), ValueError("Some exception raised"))
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        assert 'Fallback1' in self.instantiated_tasks
+        assert 'Fallback2' in self.instantiated_tasks
+        # bigger combinations are handled first
+        assert self.instantiated_tasks.index('Fallback1') < self.instantiated_tasks.index('Fallback2')
+        assert set(state_dict['failed_nodes'].keys()) == set(node_names) - {'Task1', 'Task3', 'Task7'}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from redis_mock import RedisMock
+
+pytest.importorskip('redis')
+from selinon.storages.redis import Redis  # noqa
+
+
+_RESULT = {'items': [{'name': 'item-%d' % i, 'value': i} for i in range(100)]}
+
+
+def _connected_storage(**kwargs):
+    storage = Redis(**kwargs)
+    storage.conn = RedisMock()
+    return storage
+
+
+class TestRedisStorage(object):
+    def test_default_format(self):
+        storage = _connected_storage()
+        storage.store({'foo': 'bar'}, 'flow1', 'Task1', '<id>', _RESULT)
+
+        # plain JSON record is kept by default
+        assert storage.conn.data['<id>'].startswith(b'{')
+        assert storage.retrieve('flow1', 'Task1', '<id>') == _RESULT
+        assert storage.conn.ttl == {}
+
+    @pytest.mark.parametrize('serializer,compression', [
+        ('json', 'zlib'),
+        ('msgpack', None),
+        ('msgpack', 'zlib'),
+        ('msgpack', 'lz4'),
+        ('json', 'lz4'),
+    ])
+    def test_encoding(self, serializer, compression):
+        if serializer == 'msgpack':
+            pytest.importorskip('msgpack')
+        if compression == 'lz4':
+            pytest.importorskip('lz4')
+
+        storage = _connected_storage(serializer=serializer, compression=compression, compression_threshold=128)
+        storage.store(None, 'flow1', 'Task1', '<id1>', _RESULT)
+        storage.store(None, 'flow1', 'Task1', '<id2>', 'small')
+
+        assert storage.retrieve('flow1', 'Task1', '<id1>') == _RESULT
+        assert storage.retrieve('flow1', 'Task1', '<id2>') == 'small'
+
+        # records are readable regardless of configuration used for reading
+        assert _connected_storage()._decode(storage.conn.data['<id1>'])['result'] == _RESULT
+
+        if compression:
+            assert len(storage.conn.data['<id1>']) < len(_connected_storage()._encode({'result': _RESULT}))
+
+    def test_hash_fields(self):
+        storage = _connected_storage(hash_fields=True, ttl=3600)
+        storage.store({'foo': 'bar'}, 'flow1', 'Task1', '<id>', _RESULT)
+
+        assert set(storage.conn.data['<id>'].keys()) == {'task_name', 'result', 'metadata'}
+        assert storage.conn.ttl == {'<id>': 3600}
+
+        storage.conn.bytes_received = 0
+        assert storage.retrieve('flow1', 'Task1', '<id>') == _RESULT
+        # metadata are not transferred on retrieval
+        assert storage.conn.bytes_received == len(storage.conn.data['<id>']['result']) + len('Task1')
+
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve('flow1', 'Task1', '<unknown-id>')
+
+    def test_ttl(self):
+        storage = _connected_storage(ttl=60)
+        storage.store(None, 'flow1', 'Task1', '<id>', _RESULT)
+
+        assert storage.conn.ttl == {'<id>': 60}
+
+    @pytest.mark.parametrize('hash_fields', (True, False))
+    def test_retrieve_many(self, hash_fields):
+        storage = _connected_storage(hash_fields=hash_fields)
+        task_ids = [('Task%d' % i, '<id%d>' % i) for i in range(10)]
+        for task_name, task_id in task_ids:
+            storage.store(None, 'flow1', task_name, task_id, task_id)
+
+        storage.conn.round_trips = 0
+        assert storage.retrieve_many('flow1', task_ids) == {task_id: task_id for _, task_id in task_ids}
+        assert storage.conn.round_trips == 1
+
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve_many('flow1', [('Task1', '<unknown-id>')])
+
+    def test_unknown_configuration(self):
+        with pytest.raises(ValueError):
+            Redis(serializer='pickle')
+
+        with pytest.raises(ValueError):
+            Redis(compression='bz2')
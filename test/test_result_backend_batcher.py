@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import pytest
+from selinon_test_case import SelinonTestCase
+
+from selinon import SystemState
+from selinon import ResultBackendBatcher
+from selinon import Trace
+from selinon.errors import DispatcherRetry
+from selinon.result_backend_batcher import InMemoryResultBackend
+
+
+class _MultiGetCounter(object):
+    """Count calls of multi-get function."""
+
+    def __init__(self, multi_get):
+        self.multi_get = multi_get
+        self.calls = []
+
+    def __call__(self, node_ids):
+        self.calls.append(list(node_ids))
+        return self.multi_get(node_ids)
+
+
+class TestResultBackendBatcher(SelinonTestCase):
+    def test_in_memory_backend(self):
+        backend = InMemoryResultBackend()
+        backend.set_successful('id1', {'foo': 'bar'})
+        backend.set_failed('id2', ValueError('oops'), 'Traceback')
+
+        batcher = ResultBackendBatcher(backend.mget)
+        results = batcher.fetch(['id1', 'id2', 'id3'])
+
+        assert results['id1'].successful()
+        assert not results['id1'].failed()
+        assert results['id1'].result == {'foo': 'bar'}
+
+        assert results['id2'].failed()
+        assert not results['id2'].successful()
+        assert isinstance(results['id2'].result, ValueError)
+        assert results['id2'].traceback == 'Traceback'
+
+        assert not results['id3'].successful()
+        assert not results['id3'].failed()
+
+    def test_batch_size(self):
+        backend = InMemoryResultBackend()
+        multi_get = _MultiGetCounter(backend.mget)
+        batcher = ResultBackendBatcher(multi_get, batch_size=2)
+
+        results = batcher.fetch(['id1', 'id2', 'id3'])
+
+        assert set(results.keys()) == {'id1', 'id2', 'id3'}
+        assert multi_get.calls == [['id1', 'id2'], ['id3']]
+
+    def test_bulk_active_nodes(self):
+        #
+        # flow1:
+        #
+        #     Task1   Task2   Task3
+        #       |       |       |
+        #        ---------------
+        #               |
+        #             Task4
+        #
+        backend = InMemoryResultBackend()
+        multi_get = _MultiGetCounter(backend.mget)
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2', 'Task3'], 'to': ['Task4'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1', 'Task2', 'Task3'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, result_backend_batcher=ResultBackendBatcher(multi_get))
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+        assert len(state_dict['active_nodes']) == 3
+        assert multi_get.calls == []
+
+        backend.set_successful(self.get_task('Task1').task_id)
+        backend.set_successful(self.get_task('Task2').task_id)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        # all active nodes were resolved in a single call
+        assert len(multi_get.calls) == 1
+        assert len(multi_get.calls[0]) == 3
+        assert retry is not None
+        assert 'Task4' not in self.instantiated_tasks
+        assert len(state_dict['active_nodes']) == 1
+        assert set(state_dict['finished_nodes'].keys()) == {'Task1', 'Task2'}
+
+        backend.set_successful(self.get_task('Task3').task_id)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict)
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert len(multi_get.calls) == 2
+        assert multi_get.calls[1] == [self.get_task('Task3').task_id]
+        assert retry is not None
+        assert 'Task4' in self.instantiated_tasks
+
+    def test_result_backend_issue(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #
+        def multi_get(node_ids):
+            raise ValueError("Some error raised due to result backed issues")
+
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, result_backend_batcher=ResultBackendBatcher(multi_get))
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+
+        issues = []
+        Trace.trace_by_func(lambda event, msg_dict: issues.append(msg_dict), events=(Trace.RESULT_BACKEND_ISSUE,))
+
+        with pytest.raises(DispatcherRetry) as exc_info:
+            SystemState(id(self), 'flow1', state=state_dict).update()
+
+        assert exc_info.value.keep_state is True
+        assert exc_info.value.adjust_retry_count is False
+
+        assert len(issues) == 1
+        assert issues[0]['flow_name'] == 'flow1'
+        assert issues[0]['node_names'] == ['Task1']
+        assert issues[0]['node_ids'] == [self.get_task('Task1').task_id]
+        assert 'ValueError' in issues[0]['what']
@@ -8,6 +8,7 @@
 import pytest
 from selinon.selective import compute_selective_run
 from selinon_test_case import SelinonTestCase
+from selinon import Config
 from selinon import SelectiveNoPathError
 
 
@@ -266,3 +267,91 @@ class TestSelective(SelinonTestCase):
         self.init(edge_table)
         with pytest.raises(SelectiveNoPathError):
             compute_selective_run('flow1', ['TaskX'], follow_subflows=False, run_subsequent=True)
+
+    def test_compute_selective_run_cache(self):
+        #
+        # flow1:
+        #
+        #      |
+        #     T1
+        #      |
+        #     T2
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true},
+                      {'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true}],
+        }
+        self.init(edge_table)
+        selective = compute_selective_run('flow1', ['Task2'], follow_subflows=False, run_subsequent=False)
+
+        # computed selective runs are cached outside of the precomputed table
+        assert not Config.selective_runs
+        assert Config.selective_runs_cache.get(('flow1', ('Task2',), False, False)) is not None
+
+        # modification of the returned selective run does not affect the cached one
+        selective['waiting_edges_subset']['flow1'].pop(0)
+        selective = compute_selective_run('flow1', ['Task2'], follow_subflows=False, run_subsequent=False)
+        self._lists2sets(selective)
+
+        assert selective['waiting_edges_subset'] == {'flow1': {0: {'Task1'}, 1: {'Task2'}}}
+
+    def test_compute_selective_run_precomputed(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true},
+                      {'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true}],
+        }
+        key = ('flow1', ('Task2',), False, False)
+        precomputed = {'task_names': ['Task2'], 'waiting_edges_subset': {'flow1': {0: ['Task1'], 1: ['Task2']}}}
+        self.init(edge_table, selective_runs={key: precomputed})
+
+        selective = compute_selective_run('flow1', ['Task2'], follow_subflows=False, run_subsequent=False)
+
+        assert selective == precomputed
+        assert selective is not precomputed
+        assert Config.selective_runs_cache.current_cache_size == 0
+
+    def test_compute_selective_run_cache_size(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true},
+                      {'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true}],
+        }
+        self.init(edge_table)
+        Config.selective_runs_cache.max_cache_size = 1
+
+        compute_selective_run('flow1', ['Task1'], follow_subflows=False, run_subsequent=False)
+        compute_selective_run('flow1', ['Task2'], follow_subflows=False, run_subsequent=False)
+        compute_selective_run('flow1', ['Task2'], follow_subflows=False, run_subsequent=True)
+
+        assert Config.selective_runs_cache.current_cache_size == 1
+        assert not Config.selective_runs
+
+    def test_compute_selective_run_diamonds(self):
+        #
+        # flow1:
+        #
+        #      |
+        #     T0
+        #    /  \
+        #  T1a  T1b
+        #    \  /
+        #     T1
+        #    /  \
+        #   ..  ..
+        #    \  /
+        #    T30
+        #
+        # Note:
+        #  There are 2^30 paths from T0 to T30.
+        edge_table = {'flow1': [{'from': [], 'to': ['Task0'], 'condition': self.cond_true}]}
+        for i in range(30):
+            edge_table['flow1'].append({'from': ['Task%d' % i], 'to': ['Task%da' % i, 'Task%db' % i],
+                                        'condition': self.cond_true})
+            edge_table['flow1'].append({'from': ['Task%da' % i], 'to': ['Task%d' % (i + 1)],
+                                        'condition': self.cond_true})
+            edge_table['flow1'].append({'from': ['Task%db' % i], 'to': ['Task%d' % (i + 1)],
+                                        'condition': self.cond_true})
+        self.init(edge_table)
+
+        selective = compute_selective_run('flow1', ['Task30'], follow_subflows=False, run_subsequent=False)
+
+        assert set(selective['waiting_edges_subset']['flow1'].keys()) == set(range(len(edge_table['flow1'])))
@@ -5,11 +5,14 @@
 # This file is part of Selinon project.
 # ######################################################################
 
+import json
 import os
 import pytest
 from flexmock import flexmock
 from jsonschema import ValidationError
 from selinon_test_case import SelinonTestCase
+from selinon import Config
+from selinon import ConfigurationError
 from selinon.task_envelope import SelinonTaskEnvelope
 from request_mock import RequestMock
 
@@ -37,6 +40,39 @@ class TestSelinonTaskEnvelope(SelinonTestCase):
         with pytest.raises(ValidationError):
             SelinonTaskEnvelope.validate_result(task_name, result)
 
+    def test_validate_schema_cached(self, tmpdir):
+        schema_file = tmpdir.join('schema.json')
+        schema_file.write(json.dumps({'type': 'object', 'required': ['foo']}))
+        schema_path = str(schema_file)
+
+        self.init({}, output_schemas={'Task1': schema_path})
+
+        validator = SelinonTaskEnvelope.get_validator(schema_path)
+        assert SelinonTaskEnvelope.get_validator(schema_path) is validator
+        SelinonTaskEnvelope.validate_result('Task1', {'foo': 'bar'})
+
+        # schema was changed, it has to be loaded again
+        schema_file.write(json.dumps({'type': 'object', 'required': ['bar']}))
+        os.utime(schema_path, ns=(0, os.stat(schema_path).st_mtime_ns + 1))
+
+        assert SelinonTaskEnvelope.get_validator(schema_path) is not validator
+        with pytest.raises(ValidationError):
+            SelinonTaskEnvelope.validate_result('Task1', {'foo': 'bar'})
+
+    def test_validate_schema_sampled(self):
+        schema_path = os.path.join('test', 'data', 'validate_schema.json')
+        self.init({}, output_schemas={'Task1': schema_path}, output_schema_sample_rate=0.0)
+
+        # no result is validated
+        SelinonTaskEnvelope.validate_result('Task1', {'foo': 'bar'})
+
+        Config.set_output_schema_sample_rate(1.0)
+        with pytest.raises(ValidationError):
+            SelinonTaskEnvelope.validate_result('Task1', {'foo': 'bar'})
+
+        with pytest.raises(ConfigurationError):
+            Config.set_output_schema_sample_rate(2.0)
+
     def test_selinon_retry(self):
         task = SelinonTaskEnvelope()
         task.request = RequestMock()
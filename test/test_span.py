@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import io
+import json
+
+import pytest
+from flexmock import flexmock
+from celery.result import AsyncResult
+from request_mock import RequestMock
+from selinon_test_case import SelinonTestCase
+from sink_mock import ListSinkMock
+
+from selinon import ConfigurationError
+from selinon import Dispatcher
+from selinon import SpanExporter
+from selinon import SystemState
+from selinon import Trace
+from selinon.global_config import GlobalConfig
+from selinon.span import NOOP_SPAN
+
+
+class TestSpan(SelinonTestCase):
+    def test_span_off(self):
+        assert Trace.span('dispatcher') is NOOP_SPAN
+        assert Trace.span_meta() is None
+        assert Trace.span_meta({'trace_id': '<trace-id>'}) == {'trace_id': '<trace-id>'}
+
+    def test_nested_spans(self):
+        sink = ListSinkMock()
+        Trace.trace_by_spans(sink=sink)
+
+        with Trace.span('root', meta={'trace_id': '<trace-id>', 'parent_span_id': '<parent-id>'}, foo=1) as root:
+            with Trace.span('child') as child:
+                assert Trace.span_meta() == {'trace_id': '<trace-id>', 'parent_span_id': child.span_id}
+            # spans are exported once the top-level span finishes
+            assert sink.items == []
+
+        assert [span['name'] for span in sink.items] == ['child', 'root']
+        assert sink.items[1]['trace_id'] == '<trace-id>'
+        assert sink.items[1]['parent_span_id'] == '<parent-id>'
+        assert sink.items[1]['attributes'] == {'foo': 1}
+        assert sink.items[0]['trace_id'] == '<trace-id>'
+        assert sink.items[0]['parent_span_id'] == root.span_id
+        assert sink.items[0]['duration'] <= sink.items[1]['duration']
+
+    def test_span_error(self):
+        sink = ListSinkMock()
+        Trace.trace_by_spans(sink=sink)
+
+        with pytest.raises(ValueError):
+            with Trace.span('root'):
+                raise ValueError()
+
+        assert len(sink.items) == 1
+        assert sink.items[0]['error'] == 'ValueError'
+        # a new trace is started if there is no trace to continue in
+        assert sink.items[0]['trace_id']
+        assert sink.items[0]['parent_span_id'] is None
+
+    def test_spanned(self):
+        @Trace.spanned('compute', lambda x, **_: {'x': x})
+        def compute(x, y=1, meta=None):
+            return x + y
+
+        # span tracing is off, the function is just called
+        assert compute(1) == 2
+
+        sink = ListSinkMock()
+        Trace.trace_by_spans(sink=sink)
+
+        assert compute(1, meta={'trace_id': '<trace-id>', 'parent_span_id': '<parent-id>'}) == 2
+        assert len(sink.items) == 1
+        assert sink.items[0]['name'] == 'compute'
+        assert sink.items[0]['attributes'] == {'x': 1}
+        assert sink.items[0]['trace_id'] == '<trace-id>'
+        assert sink.items[0]['parent_span_id'] == '<parent-id>'
+
+    def test_add_span_meta(self):
+        kwargs = {}
+        Trace.add_span_meta(kwargs)
+        assert kwargs == {}
+
+        Trace.trace_by_spans(sink=ListSinkMock())
+        with Trace.span('root', meta={'trace_id': '<trace-id>'}) as root:
+            Trace.add_span_meta(kwargs)
+
+        assert kwargs == {'meta': {'trace_id': '<trace-id>', 'parent_span_id': root.span_id}}
+
+    def test_export_output(self):
+        output = io.StringIO()
+        Trace.trace_by_spans(output=output)
+
+        with Trace.span('root', node_id='<node-id>'):
+            pass
+
+        spans = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert len(spans) == 1
+        assert spans[0]['name'] == 'root'
+        assert spans[0]['attributes'] == {'node_id': '<node-id>'}
+        assert 'pid' in spans[0]
+        assert 'node' in spans[0]
+
+    def test_system_state_spans(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #     Task2
+        #
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true},
+                      {'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        sink = ListSinkMock()
+        Trace.trace_by_spans(sink=sink)
+        scheduled = []
+        Trace.trace_by_func(lambda event, msg_dict: scheduled.append(msg_dict), events=(Trace.TASK_SCHEDULE,))
+
+        system_state = SystemState(id(self), 'flow1')
+        system_state.update()
+        state_dict = system_state.to_dict()
+
+        AsyncResult.set_finished(self.get_task('Task1').task_id)
+
+        with Trace.span('dispatcher') as dispatcher_span:
+            # node states are retrieved when state is instantiated
+            system_state = SystemState(id(self), 'flow1', state=state_dict)
+            system_state.update()
+
+        assert len(sink.by_name('system_state_update')) == 2
+        second_update = sink.by_name('system_state_update')[1]
+        get_async_result = sink.by_name('get_async_result')[0]
+        edge_condition = sink.by_name('edge_condition')[0]
+
+        assert get_async_result['attributes']['node_name'] == 'Task1'
+        assert get_async_result['parent_span_id'] == dispatcher_span.span_id
+        assert second_update['parent_span_id'] == dispatcher_span.span_id
+        assert edge_condition['parent_span_id'] == second_update['span_id']
+
+        # trace id and parent span id are passed to scheduled tasks
+        assert [msg['task_name'] for msg in scheduled] == ['Task1', 'Task2']
+        assert scheduled[1]['meta'] == {'trace_id': second_update['trace_id'],
+                                        'parent_span_id': second_update['span_id']}
+
+    def test_dispatcher_spans(self):
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        sink = ListSinkMock()
+        Trace.trace_by_spans(sink=sink)
+
+        retried = []
+
+        def fake_retry(**kwargs):
+            retried.append(kwargs)
+            return RuntimeError()
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(fake_retry)
+
+        with pytest.raises(RuntimeError):
+            dispatcher.run('flow1', meta={'trace_id': '<trace-id>', 'parent_span_id': '<parent-id>'})
+
+        dispatcher_span = sink.by_name('dispatcher')[0]
+        assert dispatcher_span['trace_id'] == '<trace-id>'
+        assert dispatcher_span['parent_span_id'] == '<parent-id>'
+        assert dispatcher_span['error'] == 'RuntimeError'
+        assert sink.by_name('migrate_message')[0]['parent_span_id'] == dispatcher_span['span_id']
+        assert sink.by_name('system_state_update')[0]['parent_span_id'] == dispatcher_span['span_id']
+
+        # the next dispatcher wakeup continues in the trace
+        assert retried[0]['kwargs']['meta'] == {'trace_id': '<trace-id>', 'parent_span_id': dispatcher_span['span_id']}
+
+    def test_spans_config(self):
+        try:
+            GlobalConfig._parse_trace_spans(True)
+            assert GlobalConfig._trace_spans == {}
+
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_spans({'output': 'spans.json'})
+
+            GlobalConfig._trace_spans = None
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_spans({'unknown_option': True})
+
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_spans({'output': 1})
+        finally:
+            GlobalConfig._trace_spans = None
+
+    def test_exporter_sink(self):
+        sink = ListSinkMock()
+        exporter = SpanExporter(sink=sink)
+        exporter([{'name': 'root'}])
+        assert sink.items[0]['name'] == 'root'
+        assert 'pid' in sink.items[0]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import json
+import uuid
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from request_mock import RequestMock
+
+from selinon import CompactStateEncoder
+from selinon import Dispatcher
+from selinon import SystemState
+
+
+def _foreach_state(count):
+    return {
+        'active_nodes': [{'name': 'Task2', 'id': str(uuid.uuid4())} for _ in range(count)] +
+                        [{'name': 'flow2', 'id': str(uuid.uuid4())}],
+        'finished_nodes': {'Task1': [str(uuid.uuid4())], 'Task3': [str(uuid.uuid4()) for _ in range(count)]},
+        'failed_nodes': {'Task4': [str(uuid.uuid4())]},
+        'waiting_edges': [0, 3, 4]
+    }
+
+
+class TestStateEncoding(SelinonTestCase):
+    def test_encode_decode(self):
+        state = _foreach_state(100)
+        encoded = CompactStateEncoder().encode(state)
+
+        assert CompactStateEncoder.is_encoded(encoded)
+        assert not CompactStateEncoder.is_encoded(state)
+        # node names are stated only once, consecutive nodes are run-length encoded
+        assert encoded['names'] == ['Task2', 'flow2', 'Task1', 'Task3', 'Task4']
+        assert encoded['active'] == [0, 100, 1, 1]
+        assert len(json.dumps(encoded)) < len(json.dumps(state)) * 0.6
+
+        assert CompactStateEncoder.decode(encoded) == state
+        # plain state is passed as it is
+        assert CompactStateEncoder.decode(state) is state
+        assert CompactStateEncoder.decode(None) is None
+
+    def test_non_uuid_ids(self):
+        state = {
+            'active_nodes': [{'name': 'Task1', 'id': '<id1>'}, {'name': 'Task1', 'id': '<id2>'}],
+            'finished_nodes': {'Task2': [str(uuid.uuid4()).upper()]},
+            'failed_nodes': {},
+            'waiting_edges': []
+        }
+
+        encoded = json.loads(json.dumps(CompactStateEncoder().encode(state)))
+        assert CompactStateEncoder.decode(encoded) == state
+
+    def test_compression(self):
+        state = _foreach_state(1000)
+
+        compressed = CompactStateEncoder(compression_threshold=1024).encode(state)
+        assert 'zlib' in compressed
+        assert CompactStateEncoder.decode(compressed) == state
+
+        # small states are not compressed
+        assert 'zlib' not in CompactStateEncoder(compression_threshold=1024).encode(_foreach_state(1))
+
+    def test_unknown_version(self):
+        encoded = CompactStateEncoder().encode(_foreach_state(1))
+        encoded['selinon_state'] = 42
+
+        with pytest.raises(ValueError):
+            CompactStateEncoder.decode(encoded)
+
+    def test_system_state(self):
+        #
+        # flow1:
+        #
+        #     Task1
+        #       |
+        #       |
+        #     Task2
+        #
+        edge_table = {
+            'flow1': [{'from': ['Task1'], 'to': ['Task2'], 'condition': self.cond_true},
+                      {'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table)
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+
+        self.set_finished(self.get_task('Task1'))
+
+        encoded = CompactStateEncoder(compression_threshold=0).encode(state_dict)
+        system_state = SystemState(id(self), 'flow1', state=encoded)
+        retry = system_state.update()
+
+        assert retry is not None
+        assert 'Task2' in self.instantiated_tasks
+        assert system_state.to_dict()['finished_nodes'] == {'Task1': [self.get_task('Task1').task_id]}
+
+    def test_dispatcher_retry(self):
+        def my_retry(args, kwargs, countdown, queue):
+            raise ValueError(kwargs['state'])
+
+        edge_table = {
+            'flow1': [{'from': [], 'to': ['Task1'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, state_encoder=CompactStateEncoder())
+        state_dict = {'finished_nodes': {}, 'failed_nodes': {}, 'active_nodes': [{'name': 'Task1', 'id': '<id1>'}],
+                      'waiting_edges': []}
+
+        flexmock(SystemState).should_receive('update').and_return(2)
+        flexmock(SystemState).should_receive('to_dict').and_return(state_dict)
+
+        dispatcher = Dispatcher()
+        dispatcher.request = RequestMock()
+        flexmock(dispatcher).should_receive('retry').replace_with(my_retry)
+
+        with pytest.raises(ValueError) as exc_info:
+            dispatcher.run('flow1')
+
+        retry_state = exc_info.value.args[0]
+        assert CompactStateEncoder.is_encoded(retry_state)
+        assert CompactStateEncoder.decode(retry_state) == state_dict
@@ -5,12 +5,50 @@
 # This file is part of Selinon project.
 # ######################################################################
 
+import threading
+import time
+
 import pytest
 from selinon_test_case import SelinonTestCase
 
 from selinon import SystemState
 from selinon import DataStorage
+from selinon import StoragePool
+from selinon.caches import LRU
 from selinon.config import Config
+from selinon.storages.filesystem import Filesystem
+
+
+class _BlockingStorage(DataStorage):
+    def __init__(self, retrieve_func):
+        self.retrieve_func = retrieve_func
+        self.retrieve_calls = []
+
+    def connect(self):
+        raise NotImplementedError()
+
+    def disconnect(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def store(self, node_args, flow_name, task_name, task_id, result):
+        raise NotImplementedError()
+
+    def retrieve(self, flow_name, task_name, task_id):
+        self.retrieve_calls.append(task_id)
+        return self.retrieve_func(task_id)
+
+
+class _MultiGetStorage(_BlockingStorage):
+    def __init__(self, retrieve_func):
+        super().__init__(retrieve_func)
+        self.retrieve_many_calls = []
+
+    def retrieve_many(self, flow_name, task_ids):
+        self.retrieve_many_calls.append(list(task_ids))
+        return {task_id: self.retrieve_func(task_id) for _, task_id in task_ids}
 
 
 class TestStorageAccess(SelinonTestCase):
@@ -138,3 +176,140 @@ class TestStorageAccess(SelinonTestCase):
         with pytest.raises(ConnectionError):
             system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
             system_state.update()
+
+    def test_retrieve_concurrent(self):
+        # Both retrievals have to be in storage at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def retrieve_func(task_id):
+            barrier.wait()
+            return task_id
+
+        storage = _BlockingStorage(retrieve_func)
+        self.init({}, storage_mapping={'Storage1': storage}, task2storage_mapping={'Task1': 'Storage1'})
+
+        results = {}
+
+        def retrieve(task_id):
+            results[task_id] = StoragePool.retrieve('flow1', 'Task1', task_id)
+
+        threads = [threading.Thread(target=retrieve, args=(task_id,)) for task_id in ('<id1>', '<id2>')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {'<id1>': '<id1>', '<id2>': '<id2>'}
+        assert not barrier.broken
+
+    def test_retrieve_single_flight(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def retrieve_func(task_id):
+            entered.set()
+            assert release.wait(timeout=5)
+            return 0xDEADBEEF
+
+        storage = _BlockingStorage(retrieve_func)
+        self.init({}, storage_mapping={'Storage1': storage}, task2storage_mapping={'Task1': 'Storage1'})
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(StoragePool.retrieve('flow1', 'Task1', '<id>')))
+                   for _ in range(5)]
+        threads[0].start()
+        assert entered.wait(timeout=5)
+
+        for thread in threads[1:]:
+            thread.start()
+        # give threads some time to join the in-flight retrieval
+        time.sleep(0.2)
+        release.set()
+
+        for thread in threads:
+            thread.join()
+
+        assert results == [0xDEADBEEF] * 5
+        assert storage.retrieve_calls == ['<id>']
+        assert StoragePool._in_flight == {}
+
+    def test_retrieve_many_default(self):
+        storage = _BlockingStorage(lambda task_id: task_id.upper())
+
+        results = storage.retrieve_many('flow1', [('Task1', '<id1>'), ('Task2', '<id2>')])
+
+        assert results == {'<id1>': '<ID1>', '<id2>': '<ID2>'}
+        assert storage.retrieve_calls == ['<id1>', '<id2>']
+
+    def test_prefetch(self):
+        storage = _MultiGetStorage(lambda task_id: task_id.upper())
+        self.init({}, storage_mapping={'Storage1': storage},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage1'},
+                  storage2storage_cache={'Storage1': LRU(max_cache_size=10)})
+
+        # Task3 has no storage assigned, it is skipped
+        nodes = [('Task1', '<id1>'), ('Task2', '<id2>'), ('Task3', '<id3>')]
+        assert StoragePool.prefetch('flow1', nodes) == {'<id1>': '<ID1>', '<id2>': '<ID2>'}
+        assert storage.retrieve_many_calls == [[('Task1', '<id1>'), ('Task2', '<id2>')]]
+
+        # results are served from cache now
+        assert StoragePool.prefetch('flow1', nodes) == {'<id1>': '<ID1>', '<id2>': '<ID2>'}
+        assert StoragePool.retrieve('flow1', 'Task1', '<id1>') == '<ID1>'
+        assert len(storage.retrieve_many_calls) == 1
+        assert storage.retrieve_calls == []
+
+    def test_prefetch_condition(self):
+        #
+        # flow1:
+        #
+        #     Task1   Task2
+        #       |       |
+        #        -------
+        #           |
+        #         Task3
+        #
+        def _cond_access(db, node_args):
+            return db.get('Task1') == db.get('Task2')
+
+        storage = _MultiGetStorage(lambda task_id: 0xDEADBEEF)
+        edge_table = {
+            'flow1': [{'from': ['Task1', 'Task2'], 'to': ['Task3'], 'condition': _cond_access,
+                       'condition_nodes': ['Task1', 'Task2']},
+                      {'from': [], 'to': ['Task1', 'Task2'], 'condition': self.cond_true}]
+        }
+        self.init(edge_table, storage_mapping={'Storage1': storage},
+                  task2storage_mapping={'Task1': 'Storage1', 'Task2': 'Storage1'})
+
+        system_state = SystemState(id(self), 'flow1')
+        retry = system_state.update()
+        state_dict = system_state.to_dict()
+
+        assert retry is not None
+
+        task1 = self.get_task('Task1')
+        task2 = self.get_task('Task2')
+        self.set_finished(task1, 1)
+        self.set_finished(task2, 1)
+
+        system_state = SystemState(id(self), 'flow1', state=state_dict, node_args=system_state.node_args)
+        system_state.update()
+
+        assert 'Task3' in self.instantiated_tasks
+        # both results were retrieved in one round trip, nothing was retrieved one by one
+        assert len(storage.retrieve_many_calls) == 1
+        assert set(storage.retrieve_many_calls[0]) == {('Task1', task1.task_id), ('Task2', task2.task_id)}
+        assert storage.retrieve_calls == []
+
+    def test_filesystem_retrieve_many(self, tmpdir):
+        storage = Filesystem(path=str(tmpdir))
+        storage.connect()
+        task_ids = [('Task%d' % i, '<id%d>' % i) for i in range(10)]
+        for task_name, task_id in task_ids:
+            storage.store(None, 'flow1', task_name, task_id, {'task_id': task_id})
+
+        results = storage.retrieve_many('flow1', task_ids)
+
+        assert results == {task_id: {'task_id': task_id} for _, task_id in task_ids}
+
+        with pytest.raises(FileNotFoundError):
+            storage.retrieve_many('flow1', [('Task1', '<id1>'), ('Task1', '<unknown-id>')])
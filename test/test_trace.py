@@ -8,7 +8,9 @@
 import os
 import pytest
 from selinon import Config
+from selinon import ConfigurationError
 from selinon import Trace
+from selinon.global_config import GlobalConfig
 from selinon_test_case import SelinonTestCase
 
 
@@ -23,6 +25,59 @@ class TestTrace(SelinonTestCase):
         assert len(Trace._trace_functions) == 4
         assert Trace._logger is not None
 
+    def test_trace_subscription(self):
+        all_events = []
+        failures = []
+        Trace.trace_by_func(lambda event, msg_dict: all_events.append((event, msg_dict)))
+        Trace.trace_by_func(lambda event, msg_dict: failures.append(event), events=('TASK_FAILURE',))
+
+        Trace.log(Trace.TASK_START, {'task_name': 'Task1'}, task_id='<task-id>')
+        Trace.log(Trace.TASK_FAILURE, {'task_name': 'Task1'})
+
+        assert all_events == [(Trace.TASK_START, {'task_name': 'Task1', 'task_id': '<task-id>'}),
+                              (Trace.TASK_FAILURE, {'task_name': 'Task1'})]
+        assert failures == [Trace.TASK_FAILURE]
+
+    def test_trace_lazy_message(self):
+        failures = []
+        Trace.trace_by_func(lambda event, msg_dict: failures.append(msg_dict), events=(Trace.TASK_FAILURE,))
+
+        assert Trace.enabled(Trace.TASK_FAILURE)
+        assert not Trace.enabled(Trace.TASK_START)
+
+        def construct_msg():
+            raise AssertionError("Message of an event nobody is subscribed to was constructed")
+
+        Trace.log(Trace.TASK_START, construct_msg)
+        Trace.log(Trace.TASK_FAILURE, lambda: {'task_name': 'Task1'})
+
+        assert failures == [{'task_name': 'Task1'}]
+
+    def test_trace_unknown_event(self):
+        with pytest.raises(ValueError):
+            Trace.trace_by_func(lambda event, msg_dict: None, events=('UNKNOWN_EVENT',))
+
+    def test_trace_events_config(self):
+        assert GlobalConfig._parse_trace_events({'name': 'Storage1'}) is None
+        assert GlobalConfig._parse_trace_events({'events': ['TASK_END']}) == ['TASK_END']
+
+        with pytest.raises(ConfigurationError):
+            GlobalConfig._parse_trace_events({'events': ['UNKNOWN_EVENT']})
+
+        with pytest.raises(ConfigurationError):
+            GlobalConfig._parse_trace_events({'events': 'TASK_END'})
+
+    def test_trace_json_buffered_config(self):
+        try:
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_json({'unknown_option': True})
+
+            GlobalConfig._trace_json = None
+            GlobalConfig._parse_trace_json({'batch_size': 10})
+            assert GlobalConfig._trace_json == {'batch_size': 10}
+        finally:
+            GlobalConfig._trace_json = None
+
     @pytest.mark.skip(reason="trace calls are currently not tested")
     def test_trace_call(self):
         # TODO: add tests for actual trace call
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ######################################################################
+# Copyright (C) 2016-2017  Fridolin Pokorny, fridolin.pokorny@gmail.com
+# This file is part of Selinon project.
+# ######################################################################
+
+import io
+
+import pytest
+from flexmock import flexmock
+from selinon_test_case import SelinonTestCase
+from storage_mock import DictStorageMock
+
+from selinon import ConfigurationError
+from selinon import StoragePool
+from selinon import Trace
+from selinon import TraceSampler
+from selinon import trace_sampler
+from selinon.caches import LRU
+from selinon.global_config import GlobalConfig
+
+
+class TestTraceSampler(SelinonTestCase):
+    def test_head_sampling(self):
+        recorded = []
+        Trace.trace_by_func(lambda event, msg_dict: recorded.append(msg_dict['dispatcher_id']))
+        Trace.set_sampler(TraceSampler(sample_rate=0.5))
+
+        dispatcher_ids = ['<dispatcher-id-%d>' % idx for idx in range(200)]
+        for dispatcher_id in dispatcher_ids:
+            for event in (Trace.DISPATCHER_WAKEUP, Trace.TASK_SCHEDULE, Trace.TASK_START, Trace.TASK_END):
+                Trace.log(event, {'flow_name': 'flow1', 'dispatcher_id': dispatcher_id})
+
+        sampled = set(recorded)
+        assert 0 < len(sampled) < len(dispatcher_ids)
+        # either all events of a flow are recorded or none
+        assert all(recorded.count(dispatcher_id) == 4 for dispatcher_id in sampled)
+        # the decision does not depend on the process
+        assert sampled == {dispatcher_id for dispatcher_id in dispatcher_ids
+                           if TraceSampler.is_sampled(dispatcher_id, 0.5)}
+
+    def test_storage_events(self):
+        storage = DictStorageMock()
+        self.init({}, storage_mapping={'Storage1': storage}, task2storage_mapping={'Task1': 'Storage1'},
+                  storage2storage_cache={'Storage1': LRU(max_cache_size=10)})
+        recorded = []
+        Trace.trace_by_func(lambda event, msg_dict: recorded.append((event, msg_dict.get('dispatcher_id'))))
+        Trace.set_sampler(TraceSampler(sample_rate=0.5))
+
+        ids = ['<id-%d>' % idx for idx in range(100)]
+        sampled_id = next(id_ for id_ in ids if TraceSampler.is_sampled(id_, 0.5))
+        not_sampled_id = next(id_ for id_ in ids if not TraceSampler.is_sampled(id_, 0.5))
+
+        # storage events are sampled by dispatcher id, not by task id
+        for dispatcher_id, task_id in ((sampled_id, not_sampled_id), (not_sampled_id, sampled_id)):
+            StoragePool.set(None, 'flow1', 'Task1', task_id, '<result>', dispatcher_id=dispatcher_id)
+            StoragePool.retrieve('flow1', 'Task1', task_id, dispatcher_id=dispatcher_id)
+            StoragePool.prefetch('flow1', [('Task1', task_id)], dispatcher_id=dispatcher_id)
+
+        events = {event for event, _ in recorded}
+        assert {Trace.STORAGE_STORE, Trace.STORAGE_RETRIEVE, Trace.STORAGE_RETRIEVED,
+                Trace.TASK_RESULT_CACHE_GET, Trace.TASK_RESULT_CACHE_HIT}.issubset(events)
+        assert all(dispatcher_id == sampled_id for _, dispatcher_id in recorded)
+
+    def test_always_record(self):
+        recorded = []
+        Trace.trace_by_func(lambda event, msg_dict: recorded.append(event))
+        Trace.set_sampler(TraceSampler(sample_rate=0.0))
+
+        Trace.log(Trace.TASK_START, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+        Trace.log(Trace.TASK_FAILURE, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+        Trace.log(Trace.DISPATCHER_FAILURE, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+
+        assert recorded == [Trace.TASK_FAILURE, Trace.DISPATCHER_FAILURE]
+
+        recorded.clear()
+        Trace.set_sampler(TraceSampler(sample_rate=0.0, always_record=['TASK_START']))
+        Trace.log(Trace.TASK_START, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+        Trace.log(Trace.TASK_FAILURE, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+        assert recorded == [Trace.TASK_START]
+
+    def test_rate_limits(self):
+        now = [100.0]
+        flexmock(trace_sampler.time).should_receive('monotonic').replace_with(lambda: now[0])
+
+        sampler = TraceSampler(rate_limits={'NODE_STATE_CACHE_HIT': 2}, flows={'flow2': {'rate_limits': {
+            'NODE_STATE_CACHE_HIT': 1
+        }}})
+
+        msg = {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'}
+        assert [sampler.should_record(Trace.NODE_STATE_CACHE_HIT, msg) for _ in range(3)] == [True, True, False]
+        # events without rate limit are not affected
+        assert sampler.should_record(Trace.NODE_STATE_CACHE_MISS, msg)
+
+        # flows with their own configuration have their own limits
+        msg_flow2 = {'flow_name': 'flow2', 'dispatcher_id': '<dispatcher-id>'}
+        assert [sampler.should_record(Trace.NODE_STATE_CACHE_HIT, msg_flow2) for _ in range(2)] == [True, False]
+
+        now[0] += 0.5
+        assert [sampler.should_record(Trace.NODE_STATE_CACHE_HIT, msg) for _ in range(2)] == [True, False]
+
+    def test_flow_sample_rate(self):
+        sampler = TraceSampler(sample_rate=0.0, flows={'flow2': {'sample_rate': 1.0}})
+
+        assert not sampler.should_record(Trace.TASK_START, {'flow_name': 'flow1', 'dispatcher_id': '<id>'})
+        assert sampler.should_record(Trace.TASK_START, {'flow_name': 'flow2', 'dispatcher_id': '<id>'})
+
+    def test_metrics_not_sampled(self):
+        recorded = []
+        Trace.trace_by_func(lambda event, msg_dict: recorded.append(event))
+        metrics = Trace.trace_by_metrics()
+        Trace.set_sampler(TraceSampler(sample_rate=0.0))
+
+        Trace.log(Trace.TASK_START, {'flow_name': 'flow1', 'dispatcher_id': '<dispatcher-id>'})
+
+        assert recorded == []
+        assert metrics.event_count(Trace.TASK_START) == 1
+
+    @pytest.mark.parametrize('sampling_conf', (
+        {'sample_rate': 2},
+        {'rate_limits': {'UNKNOWN_EVENT': 1}},
+        {'rate_limits': {'TASK_START': 0}},
+        {'always_record': 'TASK_FAILURE'},
+        {'flows': {'flow1': {'unknown_option': 1}}},
+        {'flows': {'flow1': {'sample_rate': -1}}},
+        {'unknown_option': 1},
+        'sample_rate'
+    ))
+    def test_sampling_config_error(self, sampling_conf):
+        try:
+            with pytest.raises(ConfigurationError):
+                GlobalConfig._parse_trace_sampling(sampling_conf)
+        finally:
+            GlobalConfig._trace_sampling = None
+
+    def test_sampling_config(self):
+        sampling_conf = {'sample_rate': 0.1, 'flows': {'flow1': {'sample_rate': 1.0}}}
+        try:
+            GlobalConfig._parse_trace_sampling(sampling_conf)
+            output = io.StringIO()
+            GlobalConfig.dump_trace(output, 'config')
+        finally:
+            GlobalConfig._trace_sampling = None
+
+        assert "config.set_trace_sampling(**%r)" % sampling_conf in output.getvalue().splitlines()
@@ -5,6 +5,8 @@
 # This file is part of Selinon project.
 # ######################################################################
 
+import copy
+
 from selinon import SelinonTask
 
 
@@ -23,3 +25,31 @@ class task3(SelinonTask):
     # class name left lowercase intentionally
     def run(self, node_args):
         pass
+
+
+class ParallelTask(SelinonTask):
+    # if set, all tasks wait for each other so they finish only if run in parallel
+    barrier = None
+
+    def run(self, node_args):
+        if self.barrier is not None:
+            self.barrier.wait()
+
+
+class MutatingTask(SelinonTask):
+    # node_args as seen by tasks before they were modified
+    seen_node_args = []
+
+    def run(self, node_args):
+        self.seen_node_args.append(copy.deepcopy(node_args))
+        node_args['tasks'].append(self.task_name)
+
+
+class FlakyTask(SelinonTask):
+    # number of runs of the task, the first run fails
+    run_count = 0
+
+    def run(self, node_args):
+        FlakyTask.run_count += 1
+        if FlakyTask.run_count == 1:
+            raise ValueError("The first run fails")